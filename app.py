@@ -1,21 +1,141 @@
-from fastapi import FastAPI
-from webhook import api_router, bot, WEBHOOK_URL, WEBHOOK_PATH
+import asyncio
+import hmac
+import os
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from webhook import api_router, dp, pool, dedup, register_webhook, WEBHOOK_MODE
 from loguru import logger
+from file_cache import file_cache
+from question_log import question_log
+from outbox import outbox
+from quota import quota
+from tracing import tracer, render
+from profiler import profiler, ProfilerBusy
+import clients
+import storage
+import metrics
+from handler import coalescer
+from assets import assets
+from prompts.core import answer_cache, memory, models, documents, breaker
+from prompts.catalog import catalog
+
+# Токен для /debug/*; без него отладочные эндпоинты не отвечают (404)
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
 
 app = FastAPI()
 app.include_router(api_router)
+app.state.ready = False
+
+# === Состояние компонентов в /metrics ===
+metrics.Stats("bot_update_queue", "Очередь обновлений", pool.stats)
+metrics.Stats("bot_dedup", "Дедупликация обновлений", dedup.stats)
+metrics.Stats("bot_answer_cache", "Кэш ответов GPT", answer_cache.stats)
+metrics.Stats("bot_memory", "Память диалогов", memory.stats)
+metrics.Stats("openai_tier", "Уровни моделей", models.stats)
+metrics.Stats("openai_quota", "Квоты на вопросы к GPT", quota.stats)
+metrics.Stats("openai_breaker", "Предохранитель OpenAI (state: 0 closed, 1 half-open, 2 open)", breaker.stats)
+metrics.Stats("bot_assets", "Медиафайлы", assets.stats)
+metrics.Stats("bot_file_ids", "Кэш file_id Telegram", file_cache.stats)
+metrics.Stats("bot_catalog", "Каталог объектов", catalog.stats)
+metrics.Stats("bot_question_log", "Журнал вопросов", question_log.stats)
+metrics.Stats("bot_lead_outbox", "Очередь заявок", outbox.stats)
+metrics.Stats("bot_coalesce", "Склейка сообщений", coalescer.stats)
+metrics.Stats("bot_traces", "Трассировка обновлений", tracer.stats)
+metrics.Stats("telegram_limiter", "Ограничитель исходящих запросов",
+              lambda: clients.limiter.stats() if clients.limiter else {})
 
 @app.get("/")
 async def root():
     return {"status": "ok"}
 
-@app.on_event("startup")
-async def startup():
+# Балансировщик шлёт трафик на воркер, только пока здесь 200
+@app.get("/ready")
+async def ready():
+    checks = {
+        "started": app.state.ready,
+        "queue": WEBHOOK_MODE != "queue" or pool.running,
+        "env": not clients.check_env(),
+    }
+    ok = all(checks.values())
+    return JSONResponse({"ready": ok, **checks}, status_code=200 if ok else 503)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# === Отладка: медленные обновления и профиль event loop ===
+# Токен — в заголовке X-Debug-Token или параметром ?token=
+def debug_allowed(request: Request) -> bool:
+    if not DEBUG_TOKEN:
+        return False
+    received = request.headers.get("x-debug-token") or request.query_params.get("token", "")
+    return hmac.compare_digest(received.encode(), DEBUG_TOKEN.encode())
+
+@app.get("/debug/traces")
+async def debug_traces(request: Request, limit: int = 20, min_ms: float = 0, format: str = "json"):
+    # Последние медленные (или упавшие) обновления, новые сначала; format=text — деревом
+    if not debug_allowed(request):
+        return Response(status_code=404)
+    traces = tracer.recent(limit, min_ms)
+    if format == "text":
+        return PlainTextResponse("\n\n".join(render(t) for t in traces) + "\n")
+    return {"slow_ms": tracer.slow * 1000, **tracer.stats(), "traces": [t.to_dict() for t in traces]}
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 5, interval_ms: float = 5):
+    # Снимает профиль event loop за seconds и отдаёт свёрнутые стеки
+    if not debug_allowed(request):
+        return Response(status_code=404)
     try:
-        webhook_url = WEBHOOK_URL + WEBHOOK_PATH
-        await bot.set_webhook(url=webhook_url, drop_pending_updates=True)
-        logger.info(f"✅ Webhook установлен: {webhook_url}")
+        return PlainTextResponse(await profiler.profile(seconds, interval_ms))
+    except ProfilerBusy as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=409)
+
+async def warm_up():
+    # Манифест медиафайлов — до готовности: «Получить КП» не должно ждать хэширования файлов
+    try:
+        await assets.start()
     except Exception as e:
-        logger.error(f"❌ Ошибка установки webhook: {e}")
+        logger.error(f"❌ Не удалось собрать манифест медиафайлов: {e}")
+    app.state.ready = True
+    logger.info("🚀 Воркер готов принимать трафик")
+
+@app.on_event("startup")
+async def startup():
+    for problem in clients.check_env():
+        logger.error(problem)
+    await clients.startup()
+    if WEBHOOK_MODE == "queue":
+        await pool.start()
+    # Заявки, не доставленные до перезапуска, уходят сразу
+    outbox.start()
+
+    # Тяжёлое — в фоне: воркер сразу открывает порт, а балансировщик ждёт /ready.
+    # Webhook регистрирует один воркер и только при изменении URL или секрета
+    app.state.warm_up = asyncio.create_task(warm_up())
+    app.state.webhook = asyncio.create_task(register_webhook())
+    # Сверка индекса документов с PDF; пересборка (если нужна) идёт в фоне
+    app.state.documents_refresh = asyncio.create_task(documents.refresh())
+
+    logger.info("🚀 FastAPI запущено, прогрев в фоне")
 
-    logger.info("🚀 FastAPI запущено и готово принимать webhook")
+@app.on_event("shutdown")
+async def shutdown():
+    # Сначала снимаем готовность, чтобы балансировщик перестал слать трафик
+    app.state.ready = False
+    for task in (app.state.warm_up, app.state.webhook):
+        task.cancel()
+    # Склеенные сообщения отвечают до закрытия клиентов; второй проход — за теми,
+    # что пул успел дообработать
+    await coalescer.stop()
+    await pool.stop()
+    await coalescer.stop()
+    await outbox.stop()
+    await assets.stop()
+    await file_cache.stop()
+    await question_log.stop()
+    await clients.shutdown()
+    documents.close()
+    await dp.storage.close()
+    storage.close_shared()
+    logger.info("🛑 FastAPI остановлено")
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from aiogram.types import BufferedInputFile, FSInputFile
+from loguru import logger
+
+from prompts.catalog import Property, catalog
+
+# === Медиафайлы бота ===
+# Манифест на каждый объект каталога собирается при старте (или заранее: python assets.py):
+# фиксированный порядок, готовые подписи, размеры и хэши. Папки и подписи задаются
+# в каталоге объектов. Фото пережимаются под Telegram (Pillow; без него — как есть)
+# и отдаются из памяти. Папки опрашиваются раз в ASSET_WATCH_INTERVAL секунд,
+# при изменениях пересобираются манифесты затронутых объектов.
+VARIANTS_DIR = Path(os.getenv("IMAGE_VARIANTS_DIR", "cache/images"))
+MANIFEST_PATH = Path(os.getenv("ASSET_MANIFEST_PATH", "cache/assets.json"))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1280"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "82"))
+ASSET_WATCH_INTERVAL = float(os.getenv("ASSET_WATCH_INTERVAL", "5"))
+# Вариант берётся, только если он заметно меньше исходника
+MIN_SAVING = 0.9
+
+DOC_EXTENSIONS = (".pdf",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+class Asset(NamedTuple):
+    name: str
+    path: Path  # файл, который уходит в Telegram (для фото — вариант, если он есть)
+    sha256: str
+    size: int
+    caption: Optional[str] = None
+    data: Optional[bytes] = None  # содержимое в памяти (только фото)
+
+    def upload(self):
+        if self.data is not None:
+            return BufferedInputFile(self.data, filename=self.path.name)
+        return FSInputFile(self.path)
+
+
+class Manifest(NamedTuple):
+    documents: List[Asset]
+    photos: List[Asset]
+    signature: Tuple
+
+
+def _files(folder: Path, extensions: Tuple[str, ...]) -> List[Path]:
+    if not folder.is_dir():
+        return []
+    return sorted(
+        (p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in extensions),
+        key=lambda p: p.name.lower(),
+    )
+
+
+def signature(prop: Property) -> Tuple:
+    # Дёшево: только имена, размеры и mtime — без чтения содержимого.
+    # Подписи к документам тоже входят: их меняют в каталоге
+    result = [(prop.document_base_caption, tuple(prop.document_titles))]
+    for folder, extensions in ((prop.documents_dir, DOC_EXTENSIONS), (prop.photos_dir, IMAGE_EXTENSIONS)):
+        for p in _files(folder, extensions):
+            st = p.stat()
+            result.append((str(p), st.st_size, st.st_mtime_ns))
+    return tuple(result)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Временный файл у каждого свой: воркеры, собирающие одно и то же одновременно,
+    # не пишут в общий .tmp, а os.replace подменяет файл целиком
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False) as f:
+        tmp = f.name
+        try:
+            f.write(data)
+        except BaseException:
+            f.close()
+            os.unlink(tmp)
+            raise
+    os.replace(tmp, path)
+
+
+@lru_cache(maxsize=None)
+def _pillow():
+    # Pillow есть в requirements.txt; если его всё же нет, фото уходят как есть (без вариантов)
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("⚠️ Pillow не установлен — фото уходят без пережатия (pip install -r requirements.txt)")
+        return None
+    return Image, ImageOps
+
+
+def make_variant(data: bytes) -> Optional[bytes]:
+    pillow = _pillow()
+    if pillow is None:
+        return None
+    Image, ImageOps = pillow
+    with Image.open(io.BytesIO(data)) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        im.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        out = io.BytesIO()
+        im.save(out, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    variant = out.getvalue()
+    return variant if len(variant) < len(data) * MIN_SAVING else None
+
+
+def _photo(source: Path) -> Asset:
+    data = source.read_bytes()
+    source_hash = _sha256(data)
+    # Имя варианта зависит от исходника и настроек — кэш на диске не устаревает молча
+    variant_path = VARIANTS_DIR / f"{source_hash[:16]}-{IMAGE_MAX_SIDE}-{IMAGE_QUALITY}.jpg"
+    if variant_path.exists():
+        data, path = variant_path.read_bytes(), variant_path
+    else:
+        try:
+            variant = make_variant(data)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось пережать {source.name}: {e}")
+            variant = None
+        path = source
+        if variant is not None:
+            try:
+                _write_atomic(variant_path, variant)
+            except OSError as e:
+                # Вариант всё равно уходит из памяти, на диск попадёт при следующей сборке
+                logger.warning(f"⚠️ Не удалось сохранить вариант {source.name}: {e}")
+            data, path = variant, variant_path
+    return Asset(source.name, path, _sha256(data), len(data), data=data)
+
+
+def build_manifests(properties: Iterable[Property], previous: Optional[Dict[str, Manifest]] = None) -> Dict[str, Manifest]:
+    # Неизменившиеся манифесты берутся из previous; фото из общей папки читаются один раз
+    previous = previous or {}
+    photos_by_dir: Dict[Path, List[Asset]] = {}
+    result = {}
+    for prop in properties:
+        sig = signature(prop)
+        old = previous.get(prop.slug)
+        if old is not None and old.signature == sig:
+            result[prop.slug] = old
+            continue
+        documents = [
+            Asset(p.name, p, _file_sha256(p), p.stat().st_size, caption=prop.document_caption(p.name))
+            for p in _files(prop.documents_dir, DOC_EXTENSIONS)
+        ]
+        if prop.photos_dir not in photos_by_dir:
+            photos_by_dir[prop.photos_dir] = [_photo(p) for p in _files(prop.photos_dir, IMAGE_EXTENSIONS)]
+        result[prop.slug] = Manifest(documents, photos_by_dir[prop.photos_dir], sig)
+    return result
+
+
+def save_manifests(manifests: Dict[str, Manifest]) -> None:
+    # Для просмотра и сверки между деплоями; бот читает манифесты из памяти
+    def describe(asset: Asset) -> dict:
+        return {"name": asset.name, "path": str(asset.path), "size": asset.size,
+                "sha256": asset.sha256, "caption": asset.caption}
+
+    try:
+        _write_atomic(MANIFEST_PATH, json.dumps({
+            slug: {
+                "documents": [describe(a) for a in manifest.documents],
+                "photos": [describe(a) for a in manifest.photos],
+            }
+            for slug, manifest in manifests.items()
+        }, ensure_ascii=False, indent=1).encode("utf-8"))
+    except Exception as e:
+        logger.error(f"❌ Не удалось сохранить манифест: {e}")
+
+
+class AssetStore:
+    def __init__(self):
+        self._manifests: Optional[Dict[str, Manifest]] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._building: Dict[str, asyncio.Lock] = {}
+        self.reloads = 0
+
+    async def manifest(self, prop: Property) -> Manifest:
+        manifests = self._manifests or {}
+        if prop.slug in manifests:
+            return manifests[prop.slug]
+        # start() не вызывался (например, в скриптах) или объект только что появился
+        # в каталоге и наблюдатель до него ещё не дошёл. Хэширование и пережатие фото —
+        # в потоке, чтобы не стоял весь бот; одновременные запросы ждут одну сборку
+        lock = self._building.setdefault(prop.slug, asyncio.Lock())
+        async with lock:
+            manifests = self._manifests or {}
+            if prop.slug not in manifests:
+                built = await asyncio.to_thread(build_manifests, [prop], manifests)
+                manifests = {**(self._manifests or {}), **built}
+                self._manifests = manifests
+                await asyncio.to_thread(save_manifests, manifests)
+        self._building.pop(prop.slug, None)
+        return manifests[prop.slug]
+
+    def _build(self, properties: List[Property]) -> Dict[str, Manifest]:
+        manifests = build_manifests(properties, self._manifests)
+        save_manifests(manifests)
+        return manifests
+
+    async def reload(self) -> None:
+        properties = catalog.all()
+        self._manifests = await asyncio.to_thread(self._build, properties)
+        self.reloads += 1
+        for slug, m in self._manifests.items():
+            in_memory = sum(p.size for p in m.photos)
+            logger.info(f"🗂 Манифест {slug}: {len(m.documents)} документов, {len(m.photos)} фото ({in_memory // 1024} КБ в памяти)")
+
+    def _stale(self, properties: List[Property]) -> bool:
+        manifests = self._manifests or {}
+        if set(manifests) != {p.slug for p in properties}:
+            return True
+        return any(signature(p) != manifests[p.slug].signature for p in properties)
+
+    async def start(self) -> None:
+        await self.reload()
+        if ASSET_WATCH_INTERVAL > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(ASSET_WATCH_INTERVAL)
+            try:
+                if await asyncio.to_thread(self._stale, catalog.all()):
+                    logger.info("🔄 Файлы или каталог изменились — пересобираем манифесты")
+                    await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка обновления манифеста: {e}")
+
+    def stats(self) -> dict:
+        manifests = list((self._manifests or {}).values())
+        # Общая папка с фото у нескольких объектов лежит в памяти один раз
+        photos = {id(p): p for m in manifests for p in m.photos}
+        return {
+            "properties": len(manifests),
+            "documents": sum(len(m.documents) for m in manifests),
+            "photos": len(photos),
+            "photo_bytes": sum(p.size for p in photos.values()),
+            "reloads": self.reloads,
+        }
+
+
+assets = AssetStore()
+
+
+if __name__ == "__main__":
+    manifests = build_manifests(catalog.all())
+    save_manifests(manifests)
+    for prop in catalog.all():
+        manifest = manifests[prop.slug]
+        original = sum(p.stat().st_size for p in _files(prop.photos_dir, IMAGE_EXTENSIONS))
+        variants = sum(a.size for a in manifest.photos)
+        print(f"{prop.slug}: документов {len(manifest.documents)}, фото {len(manifest.photos)}, "
+              f"{original // 1024} КБ → {variants // 1024} КБ")
+    print(f"Манифест: {MANIFEST_PATH}")
@@ -0,0 +1,93 @@
+"""Микро-бенчмарк приёма webhook: старый путь разбора против нового.
+
+    python benchmarks/bench_ingest.py [-n 20000]
+
+Старый путь: request.json() -> Update.model_validate -> f-строка в лог ->
+повторная валидация в feed_update (Update не был привязан к боту).
+Новый путь: webhook.parse_update (model_validate_json с контекстом бота)
+и ленивое логирование. Отдельно меряется отказ по неверному секрету.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("AGENT_BOT_TOKEN", "123456:BENCH")
+os.environ.setdefault("TG_CHAT_LEAD", "-100123")
+os.environ.setdefault("WEBHOOK_URL", "http://127.0.0.1")
+os.environ.setdefault("SHARED_STORAGE_URL", "memory://")
+
+from aiogram import types  # noqa: E402
+from loguru import logger  # noqa: E402
+
+import webhook  # noqa: E402
+from clients import get_bot  # noqa: E402
+
+BODY = json.dumps({
+    "update_id": 123456789,
+    "message": {
+        "message_id": 42,
+        "date": 1716280000,
+        "chat": {"id": 555000111, "type": "private", "first_name": "Иван", "username": "ivan"},
+        "from": {"id": 555000111, "is_bot": False, "first_name": "Иван", "username": "ivan", "language_code": "ru"},
+        "text": "Здравствуйте! Какая доходность у объекта и кто арендатор?",
+    },
+}, ensure_ascii=False).encode()
+
+
+def old_path(body: bytes) -> types.Update:
+    payload = json.loads(body)
+    update = types.Update.model_validate(payload)
+    logger.info(f"📩 Обновление от Telegram: {payload.get('message', {}).get('text', 'нет текста')}")
+    # feed_update пересобирал Update, привязывая его к боту
+    return types.Update.model_validate(update.model_dump(), context={"bot": get_bot()})
+
+
+def new_path(body: bytes) -> types.Update:
+    update = webhook.parse_update(body)
+    logger.opt(lazy=True).debug("📩 Обновление от Telegram {}", lambda: webhook.describe_update(update))
+    return update
+
+
+class _Request:
+    def __init__(self, secret: str):
+        self.headers = {"x-telegram-bot-api-secret-token": secret}
+
+
+def rejected_path(_: bytes) -> bool:
+    return webhook.secret_ok(_Request("wrong"))
+
+
+def bench(name: str, fn, n: int) -> float:
+    for _ in range(min(n, 500)):
+        fn(BODY)
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(BODY)
+    elapsed = time.perf_counter() - start
+    rate = n / elapsed
+    print(f"{name:<22} {rate:>12,.0f} обн/с   {elapsed / n * 1e6:8.1f} мкс/обн")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Лог пишется в пустой приёмник уровня INFO, как в продакшене
+    logger.remove()
+    logger.add(lambda _: None, level="INFO")
+    webhook.WEBHOOK_SECRET = "bench-secret"
+
+    old = bench("старый путь", old_path, args.n)
+    new = bench("новый путь", new_path, args.n)
+    bench("отказ по секрету", rejected_path, args.n)
+    print(f"ускорение разбора: x{new / old:.2f}")
+
+
+if __name__ == "__main__":
+    main()
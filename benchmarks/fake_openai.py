@@ -0,0 +1,97 @@
+"""Заглушка OpenAI Chat Completions для нагрузочных тестов.
+
+Поддерживает обычный и потоковый (SSE) ответ, задержку до первого токена,
+задержку между токенами и долю ошибок (500 или зависание дольше таймаута).
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+ANSWER = (
+    "✳️ Объект в Калуге сдан в долгосрочную аренду на 10 лет, арендная плата 700 тыс ₽ в месяц "
+    "с ежегодной индексацией. 📄 Готовы отправить КП, техплан и оценку. ❓ Рассматриваете покупку?"
+)
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        token_ms: float = 20,
+        error_rate: float = 0.0,
+        hang_rate: float = 0.0,
+    ):
+        self.latency = latency_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.calls: Counter = Counter()
+        self.errors = 0
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self.handle)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/v1"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "unknown")
+        self.calls[model] += 1
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+
+        if self.hang_rate and random.random() < self.hang_rate:
+            self.errors += 1
+            await asyncio.sleep(3600)
+        await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "fake upstream error", "type": "server_error"}}, status=500)
+
+        words = ANSWER.split(" ")
+        created = int(time.time())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.token_delay * len(words))
+            return web.json_response({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": ANSWER}}],
+                "usage": usage,
+            })
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                             "finish_reason": None}],
+            }
+            await resp.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            await asyncio.sleep(self.token_delay)
+        final = {
+            "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+        }
+        await resp.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await resp.write_eof()
+        return resp
@@ -0,0 +1,113 @@
+"""Заглушка Telegram Bot API для нагрузочных тестов.
+
+Отвечает на методы, которые вызывает бот, правдоподобными объектами,
+с настраиваемой задержкой и долей ошибок (429 с retry_after или 500).
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+
+class FakeTelegram:
+    def __init__(self, latency_ms: float = 30, jitter_ms: float = 10, error_rate: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes_in = 0
+        self.webhook_url = ""
+        self._ids = itertools.count(1)
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        form = await request.post()
+        fields: Dict[str, Any] = {}
+        for key, value in form.items():
+            if isinstance(value, str):
+                fields[key] = value
+            else:
+                # Загруженный файл: считаем объём, чтобы видеть повторные загрузки
+                value.file.seek(0, 2)
+                self.bytes_in += value.file.tell()
+
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors[method] += 1
+            if random.random() < 0.5:
+                return web.json_response(
+                    {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                     "parameters": {"retry_after": 1}},
+                    status=429,
+                )
+            return web.json_response(
+                {"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500
+            )
+
+        return web.json_response({"ok": True, "result": self.result(method, fields)})
+
+    def _message(self, fields: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+        chat_id = fields.get("chat_id", "1")
+        try:
+            chat_id = int(chat_id)
+        except ValueError:
+            pass
+        return {
+            "message_id": int(fields.get("message_id") or next(self._ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "group"},
+            **extra,
+        }
+
+    def _file_id(self, prefix: str) -> str:
+        return f"{prefix}{next(self._ids)}"
+
+    def result(self, method: str, fields: Dict[str, Any]) -> Any:
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(fields, text=fields.get("text", ""))
+        if method == "sendDocument":
+            return self._message(fields, document={"file_id": self._file_id("doc"), "file_unique_id": "u"})
+        if method == "sendPhoto":
+            return self._message(fields, photo=[{"file_id": self._file_id("ph"), "file_unique_id": "u",
+                                                 "width": 1280, "height": 960}])
+        if method == "sendMediaGroup":
+            media = json.loads(fields.get("media", "[]"))
+            group = str(next(self._ids))
+            return [
+                self._message(fields, media_group_id=group, photo=[
+                    {"file_id": self._file_id("ph"), "file_unique_id": "u", "width": 1280, "height": 960}
+                ])
+                for _ in media
+            ]
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method == "setWebhook":
+            self.webhook_url = fields.get("url", "")
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0}
+        return True
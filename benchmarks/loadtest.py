@@ -0,0 +1,261 @@
+"""Нагрузочный прогон FastAPI-приложения без сети и без реальных ключей.
+
+    python benchmarks/loadtest.py --users 50 --rounds 3
+    python benchmarks/loadtest.py --mode queue --oai-latency 3000 --oai-error-rate 0.1
+    python benchmarks/loadtest.py --traces /tmp/traces.txt --profile /tmp/loop.folded
+
+Поднимает заглушки Telegram Bot API и OpenAI на локальных портах, импортирует
+app.py с окружением, указывающим на них, и гоняет синтетические обновления
+в /webhook/agent: /start, кнопки меню, анкету и вопросы в свободной форме.
+В режиме inline задержка — полное время обработки обновления, в режиме queue —
+время подтверждения webhook, а пропускная способность считается до опустошения очереди.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_openai import FakeOpenAI  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+
+FAQ_QUESTIONS = ["Какой срок аренды?", "Есть обременение?", "Какая окупаемость?", "Что с индексацией?"]
+GPT_QUESTIONS = [
+    "Сколько стоит объект?",
+    "Я агент, у меня клиент ищет коммерческую недвижимость в Калуге",
+    "Какая площадь участка и здания?",
+    "Можно посмотреть объект на следующей неделе?",
+    "Почему цена именно такая?",
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def user_script(rounds: int, rnd: random.Random) -> List[tuple]:
+    script = [("start", "/start"), ("kp", "📁 Получить КП"), ("photos", "📷 Фото объекта")]
+    for _ in range(rounds):
+        script.append(("faq", rnd.choice(FAQ_QUESTIONS)))
+        script.append(("gpt", rnd.choice(GPT_QUESTIONS)))
+    script += [("form", "📝 Оставить заявку"), ("form", "Иван Петров"), ("form", "+7 900 000-00-00")]
+    return script
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    tg = FakeTelegram(args.tg_latency, args.tg_jitter, args.tg_error_rate)
+    oai = FakeOpenAI(args.oai_latency, args.oai_token_ms, args.oai_error_rate, args.oai_hang_rate)
+    tg_url = await tg.start()
+    oai_url = await oai.start()
+
+    tmp = Path(tempfile.mkdtemp(prefix="tg-bench-"))
+    os.environ.update({
+        "AGENT_BOT_TOKEN": "123456:BENCH-TOKEN",
+        "TG_CHAT_LEAD": "-100500",
+        "WEBHOOK_URL": "http://127.0.0.1",
+        "TELEGRAM_API_URL": tg_url,
+        "OPENAI_BASE_URL": oai_url,
+        "OPENAI_API_KEY": "sk-bench",
+        "WEBHOOK_MODE": args.mode,
+        "SHARED_STORAGE_URL": f"sqlite:///{tmp / 'state.db'}",
+        "FILE_ID_CACHE_PATH": str(tmp / "file_ids.json"),
+        "QUESTION_LOG_PATH": str(tmp / "questions.jsonl"),
+        "COALESCE_WINDOW_MS": "0",
+        "STREAM_ANSWERS": "1" if args.stream else "0",
+        "DEBUG_TOKEN": "bench",
+    })
+    os.chdir(ROOT)
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    import httpx
+    import app as app_module
+    import webhook
+
+    app = app_module.app
+    boot = time.perf_counter()
+    await app.router.startup()
+    startup_s = time.perf_counter() - boot
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures = 0
+    update_ids = itertools.count(int(time.time() * 1000))
+    rnd = random.Random(args.seed)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Как балансировщик: трафик только после 200 от /ready
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.01)
+        ready_s = time.perf_counter() - boot
+
+        async def send(user_id: int, kind: str, text: str) -> None:
+            nonlocal failures
+            update = {
+                "update_id": next(update_ids),
+                "message": {
+                    "message_id": rnd.randint(1, 10**6), "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                    "text": text,
+                },
+            }
+            started = time.perf_counter()
+            resp = await client.post(webhook.WEBHOOK_PATH, content=json.dumps(update, ensure_ascii=False),
+                                     headers={"content-type": "application/json"})
+            latencies[kind].append(time.perf_counter() - started)
+            if resp.status_code != 200 or not resp.json().get("ok"):
+                failures += 1
+
+        async def user(user_id: int) -> None:
+            for kind, text in user_script(args.rounds, random.Random(args.seed + user_id)):
+                await send(user_id, kind, text)
+                if args.think_ms:
+                    await asyncio.sleep(rnd.uniform(0, args.think_ms) / 1000)
+
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited(user_id: int) -> None:
+            async with semaphore:
+                await user(user_id)
+
+        async def profile() -> None:
+            # Профиль event loop под нагрузкой — первые секунды прогона
+            resp = await client.get("/debug/profile", params={"seconds": args.profile_seconds},
+                                    headers={"x-debug-token": "bench"}, timeout=args.profile_seconds + 30)
+            Path(args.profile_path).write_text(resp.text, encoding="utf-8")
+
+        load = [limited(10_000 + i) for i in range(args.users)]
+        if args.profile_path:
+            load.append(profile())
+        await asyncio.gather(*load)
+        if args.mode == "queue":
+            while webhook.pool.stats()["depth"]:
+                await asyncio.sleep(0.01)
+        wall = time.perf_counter() - started
+
+        if args.metrics_path:
+            resp = await client.get("/metrics")
+            Path(args.metrics_path).write_text(resp.text, encoding="utf-8")
+        if args.traces_path:
+            resp = await client.get("/debug/traces", params={"format": "text", "limit": 50},
+                                    headers={"x-debug-token": "bench"})
+            Path(args.traces_path).write_text(resp.text, encoding="utf-8")
+
+    peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else 0
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    await app.router.shutdown()
+    await tg.stop()
+    await oai.stop()
+
+    total = sum(len(v) for v in latencies.values())
+    every = [x for v in latencies.values() for x in v]
+
+    def summary(values: List[float]) -> Dict[str, float]:
+        return {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(values) * 1000, 1) if values else 0.0,
+        }
+
+    return {
+        "mode": args.mode,
+        "users": args.users,
+        "updates": total,
+        "failures": failures,
+        "wall_s": round(wall, 3),
+        "startup_s": round(startup_s, 3),
+        "ready_s": round(ready_s, 3),
+        "throughput_ups": round(total / wall, 1) if wall else 0.0,
+        "latency": summary(every),
+        "by_kind": {kind: summary(values) for kind, values in sorted(latencies.items())},
+        "memory": {
+            "max_rss_mb": round(rss_after / 1024, 1),
+            "rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+            "traced_peak_mb": round(peak_traced / 1024 / 1024, 1),
+        },
+        "telegram_calls": dict(tg.calls),
+        "telegram_errors": dict(tg.errors),
+        "telegram_upload_mb": round(tg.bytes_in / 1024 / 1024, 1),
+        "openai_calls": dict(oai.calls),
+        "openai_errors": oai.errors,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"режим {report['mode']}: {report['users']} пользователей, {report['updates']} обновлений "
+          f"за {report['wall_s']} с — {report['throughput_ups']} обн/с, ошибок {report['failures']}")
+    lat = report["latency"]
+    print(f"старт: startup {report['startup_s']} с, /ready через {report['ready_s']} с")
+    print(f"задержка: p50 {lat['p50_ms']} мс, p95 {lat['p95_ms']} мс, p99 {lat['p99_ms']} мс")
+    print(f"{'тип':<8}{'кол-во':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for kind, s in report["by_kind"].items():
+        print(f"{kind:<8}{s['count']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    mem = report["memory"]
+    print(f"память: max RSS {mem['max_rss_mb']} МБ (+{mem['rss_growth_mb']}), tracemalloc пик {mem['traced_peak_mb']} МБ")
+    print(f"Telegram: {report['telegram_calls']}, ошибки {report['telegram_errors']}, "
+          f"загружено {report['telegram_upload_mb']} МБ")
+    print(f"OpenAI: {report['openai_calls']}, ошибки {report['openai_errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=2, help="пар FAQ/GPT-вопросов на пользователя")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременно активных пользователей")
+    parser.add_argument("--think-ms", type=float, default=0, help="пауза между сообщениями пользователя")
+    parser.add_argument("--mode", choices=["inline", "queue"], default="inline")
+    parser.add_argument("--stream", action="store_true", help="потоковые ответы GPT")
+    parser.add_argument("--tg-latency", type=float, default=30)
+    parser.add_argument("--tg-jitter", type=float, default=10)
+    parser.add_argument("--tg-error-rate", type=float, default=0.0)
+    parser.add_argument("--oai-latency", type=float, default=800)
+    parser.add_argument("--oai-token-ms", type=float, default=10)
+    parser.add_argument("--oai-error-rate", type=float, default=0.0)
+    parser.add_argument("--oai-hang-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="точный пик памяти (замедляет прогон)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", dest="json_path", help="сохранить отчёт в JSON")
+    parser.add_argument("--metrics", dest="metrics_path", help="сохранить вывод /metrics после прогона")
+    parser.add_argument("--traces", dest="traces_path", help="сохранить медленные обновления из /debug/traces")
+    parser.add_argument("--profile", dest="profile_path", help="снять профиль event loop под нагрузкой")
+    parser.add_argument("--profile-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+from typing import List, Optional
+
+import aiohttp
+import httpx
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.enums import ParseMode
+from loguru import logger
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from ratelimit import OutboundLimiter
+from metrics import TelegramMetrics
+from tracing import TelegramSpans
+
+# === Настройки соединений ===
+TG_POOL_SIZE = int(os.getenv("TG_POOL_SIZE", "100"))
+TG_KEEPALIVE = float(os.getenv("TG_KEEPALIVE", "30"))
+TG_CONNECT_TIMEOUT = float(os.getenv("TG_CONNECT_TIMEOUT", "5"))
+TG_READ_TIMEOUT = float(os.getenv("TG_READ_TIMEOUT", "60"))
+# Свой Bot API (локальный сервер или заглушка из benchmarks/)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "50"))
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE = float(os.getenv("OPENAI_KEEPALIVE", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+# Повторы SDK с backoff съедают срок ответа; повтор делает маршрутизатор моделей (в другой уровень)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+
+class PooledAiohttpSession(AiohttpSession):
+    def __init__(self):
+        api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+        super().__init__(api=api, limit=TG_POOL_SIZE)
+        self._connector_init["keepalive_timeout"] = TG_KEEPALIVE
+        # aiogram передаёт timeout прямо в aiohttp, поэтому можно задать раздельные таймауты
+        self.timeout = aiohttp.ClientTimeout(
+            total=None, connect=TG_CONNECT_TIMEOUT, sock_read=TG_READ_TIMEOUT
+        )
+
+
+# === Общие клиенты приложения ===
+# Один Bot (одна aiohttp-сессия) и один OpenAI-клиент (один пул httpx) на процесс.
+_bot: Optional[Bot] = None
+_openai: Optional[AsyncOpenAI] = None
+limiter: Optional[OutboundLimiter] = None
+
+
+def lead_chat_id():
+    # Читается при обращении, а не при импорте: воркер поднимается и без него, заявки — нет
+    value = os.getenv("TG_CHAT_LEAD")
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return value
+
+
+def check_env() -> List[str]:
+    # Проверка настроек без падения: ошибки пишутся в лог при старте и видны в /ready
+    problems = []
+    if not os.getenv("AGENT_BOT_TOKEN"):
+        problems.append("❌ Переменная окружения AGENT_BOT_TOKEN не найдена")
+    if not os.getenv("WEBHOOK_URL"):
+        problems.append("❌ Переменная WEBHOOK_URL не задана")
+    if not os.getenv("TG_CHAT_LEAD"):
+        problems.append("❌ TG_CHAT_LEAD не задан")
+    elif not isinstance(lead_chat_id(), int):
+        problems.append("❌ TG_CHAT_LEAD должен быть целым числом (user_id или -100xxx...)")
+    return problems
+
+
+def get_bot() -> Bot:
+    global _bot, limiter
+    if _bot is None:
+        token = os.getenv("AGENT_BOT_TOKEN")
+        if not token:
+            raise EnvironmentError("❌ Переменная окружения AGENT_BOT_TOKEN не найдена")
+        _bot = Bot(
+            token=token,
+            session=PooledAiohttpSession(),
+            default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN),
+        )
+        # Все исходящие запросы проходят через общий ограничитель скорости
+        limiter = OutboundLimiter(lead_chat_id=lead_chat_id())
+        _bot.session.middleware(limiter)
+        # Зарегистрирован после ограничителя, значит внутри него: меряется сам HTTP-запрос
+        # (каждая попытка отдельно), без ожидания токенов
+        _bot.session.middleware(TelegramMetrics())
+        _bot.session.middleware(TelegramSpans())
+    return _bot
+
+
+def get_openai() -> AsyncOpenAI:
+    global _openai
+    if _openai is None:
+        _openai = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_POOL_SIZE,
+                    max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE,
+                ),
+                timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            ),
+        )
+    return _openai
+
+
+async def startup() -> None:
+    get_bot()
+    get_openai()
+    logger.info("🔌 Клиенты Telegram и OpenAI созданы")
+
+
+async def shutdown() -> None:
+    global _bot, _openai
+    if _bot is not None:
+        await _bot.session.close()
+        _bot = None
+    if _openai is not None:
+        await _openai.close()
+        _openai = None
+    logger.info("🔌 Соединения Telegram и OpenAI закрыты")
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.types import Message
+from loguru import logger
+
+import tracing
+
+# Окно добавляется к времени ответа на каждый вопрос к GPT, поэтому короткое:
+# его хватает, чтобы догнать сообщение, отправленное следом
+COALESCE_WINDOW_MS = int(os.getenv("COALESCE_WINDOW_MS", "400"))
+
+
+class _Pending:
+    __slots__ = ("messages", "timer", "task", "context")
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        # Передаётся в reply вместе с ответом (например, выбранный объект каталога)
+        self.context: Optional[str] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+# === Склейка сообщений, отправленных подряд ===
+# Сообщения пользователя, пришедшие в пределах окна, склеиваются в один вопрос.
+# Если пока готовится ответ приходит новое сообщение, генерация отменяется,
+# а её сообщения уходят в следующую склейку — на пользователя всегда один ответ.
+# Обработчик не ждёт ответа, поэтому очередь обновлений чата не блокируется.
+# Окна живут в памяти процесса: при нескольких воркерах сообщения одной серии могут
+# попасть в разные процессы, и тогда пользователь получит несколько ответов.
+class MessageCoalescer:
+    def __init__(
+        self,
+        reply: Callable[[Message, str, Optional[str]], Awaitable[None]],
+        window_ms: int = COALESCE_WINDOW_MS,
+    ):
+        self._reply = reply
+        self.window = window_ms / 1000
+        self._pending: Dict[int, _Pending] = {}
+        self._closing = False
+        self.merged = 0
+        self.superseded = 0
+
+    def pending(self, user_id: int) -> bool:
+        return user_id in self._pending
+
+    def submit(self, msg: Message, context: Optional[str] = None) -> None:
+        user_id = msg.from_user.id
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = self._pending[user_id] = _Pending()
+        elif pending.task is not None and not pending.task.done():
+            # Новое сообщение вытесняет начатую генерацию
+            pending.task.cancel()
+            pending.task = None
+            self.superseded += 1
+        if pending.messages:
+            self.merged += 1
+        pending.messages.append(msg)
+        pending.context = context
+
+        if pending.timer is not None:
+            pending.timer.cancel()
+        loop = asyncio.get_running_loop()
+        # При остановке новые сообщения не ждут окна
+        pending.timer = loop.call_later(0 if self._closing else self.window, self._fire, user_id, pending)
+
+    def _fire(self, user_id: int, pending: _Pending) -> None:
+        pending.timer = None
+        pending.task = asyncio.get_running_loop().create_task(
+            self._run(user_id, pending), name=f"answer-{user_id}"
+        )
+
+    async def _run(self, user_id: int, pending: _Pending) -> None:
+        messages = list(pending.messages)
+        text = "\n".join(m.text.strip() for m in messages if m.text)
+        try:
+            # Отдельная трассировка с тем же trace id, что у последнего сообщения:
+            # обновление уже обработано, а ответ готовится здесь
+            with tracing.trace("answer", trace_id=tracing.trace_id(), messages=len(messages)):
+                await self._reply(messages[-1], text, pending.context)
+        except asyncio.CancelledError:
+            # Сообщения остаются в pending и войдут в следующую склейку
+            return
+        except Exception as e:
+            logger.error(f"❌ Ошибка ответа на склеенные сообщения {user_id}: {e}")
+
+        # Ответили — забываем эти сообщения, если за время ответа не пришли новые
+        if pending.timer is None and self._pending.get(user_id) is pending:
+            del self._pending[user_id]
+        else:
+            del pending.messages[: len(messages)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # Окна, которые ещё не истекли, отвечают сразу; начатые ответы дожидаемся,
+        # пока живы сессия Bot и клиент OpenAI
+        self._closing = True
+        for user_id, pending in list(self._pending.items()):
+            if pending.timer is not None:
+                pending.timer.cancel()
+                self._fire(user_id, pending)
+        tasks = [p.task for p in self._pending.values() if p.task is not None and not p.task.done()]
+        if not tasks:
+            return
+        _, late = await asyncio.wait(tasks, timeout=timeout)
+        if late:
+            logger.warning(f"⚠️ Остановка склейки: не дождались {len(late)} ответов")
+            for task in late:
+                task.cancel()
+            await asyncio.wait(late)
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self._pending), "merged": self.merged, "superseded": self.superseded}
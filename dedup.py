@@ -0,0 +1,132 @@
+import os
+import time
+from typing import Dict, Optional
+
+from loguru import logger
+
+from storage import SQLiteDB, redis_url, shared_db
+
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "8192"))
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", "86400"))
+
+
+# === Окно последних update_id ===
+# update_id у Telegram растут, поэтому хватает «водяного знака» (максимального id)
+# и битовой карты на size последних id: size/8 байт памяти на любой поток.
+# Скачок назад больше окна — не повтор, а новая нумерация (Telegram начинает её заново
+# после недели без обновлений или после перерегистрации webhook): окно сбрасывается.
+class UpdateWindow:
+    def __init__(self, size: int = DEDUP_WINDOW):
+        self.size = size
+        self._bits = bytearray((size + 7) // 8)
+        self._high: Optional[int] = None
+
+    def _test_and_set(self, update_id: int) -> bool:
+        i = update_id % self.size
+        byte, mask = i >> 3, 1 << (i & 7)
+        seen = bool(self._bits[byte] & mask)
+        self._bits[byte] |= mask
+        return seen
+
+    def _clear(self, update_id: int) -> None:
+        i = update_id % self.size
+        self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def add(self, update_id: int) -> bool:
+        # True — id новый, False — уже был (или слишком старый)
+        if self._high is None:
+            self._high = update_id
+        elif update_id > self._high:
+            if update_id - self._high >= self.size:
+                self._bits = bytearray(len(self._bits))
+            else:
+                for old in range(self._high + 1, update_id + 1):
+                    self._clear(old)
+            self._high = update_id
+        elif update_id <= self._high - self.size:
+            self._bits = bytearray(len(self._bits))
+            self._high = update_id
+        return not self._test_and_set(update_id)
+
+    def discard(self, update_id: int) -> None:
+        if self._high is not None and self._high - self.size < update_id <= self._high:
+            self._clear(update_id)
+
+
+# === Защита от повторной доставки ===
+# Сначала локальное окно процесса, затем (если настроено) общее хранилище,
+# чтобы повтор, попавший на другой воркер, тоже отсеялся.
+class UpdateDeduplicator:
+    def __init__(self, window: int = DEDUP_WINDOW):
+        self.window = window
+        self.local = UpdateWindow(window)
+        self.dropped = 0
+        self._db: Optional[SQLiteDB] = None
+        self._redis = None
+        self._inserted = 0
+
+        db = shared_db()
+        if db is not None:
+            self._db = db
+            db.call(lambda c: c.execute(
+                "CREATE TABLE IF NOT EXISTS seen_updates (update_id INTEGER PRIMARY KEY, seen_at REAL NOT NULL)"
+            ))
+        elif redis_url():
+            from redis.asyncio import Redis
+
+            self._redis = Redis.from_url(redis_url())
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        duplicate = not self.local.add(update_id)
+        if not duplicate:
+            try:
+                duplicate = not await self._shared_add(update_id)
+            except Exception as e:
+                # Общее хранилище недоступно — полагаемся на локальное окно
+                logger.warning(f"⚠️ Дедупликация через хранилище недоступна: {e}")
+        if duplicate:
+            self.dropped += 1
+            logger.info(f"♻️ Повтор обновления {update_id} отброшен")
+        return duplicate
+
+    async def unmark(self, update_id: int) -> None:
+        # Обновление не приняли в обработку (очередь полна, ошибка) — повторная доставка
+        # от Telegram не должна считаться дублем
+        self.local.discard(update_id)
+        try:
+            if self._db is not None:
+                await self._db.run(lambda c: c.execute(
+                    "DELETE FROM seen_updates WHERE update_id = ?", (update_id,)
+                ))
+            elif self._redis is not None:
+                await self._redis.delete(f"tg:update:{update_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось снять отметку обновления {update_id}: {e}")
+
+    async def _shared_add(self, update_id: int) -> bool:
+        if self._db is not None:
+            self._inserted += 1
+            prune = self._inserted % 1000 == 0
+            window = self.window
+
+            def insert(c) -> bool:
+                added = c.execute(
+                    "INSERT OR IGNORE INTO seen_updates (update_id, seen_at) VALUES (?, ?)",
+                    (update_id, time.time()),
+                ).rowcount == 1
+                if prune:
+                    # По возрасту тоже: после смены нумерации старый максимум не держит записи вечно
+                    c.execute(
+                        "DELETE FROM seen_updates WHERE update_id < (SELECT MAX(update_id) FROM seen_updates) - ?"
+                        " OR seen_at < ?",
+                        (window, time.time() - DEDUP_TTL),
+                    )
+                return added
+
+            return await self._db.run(insert)
+        if self._redis is not None:
+            return bool(await self._redis.set(f"tg:update:{update_id}", 1, nx=True, ex=DEDUP_TTL))
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"duplicates_dropped": self.dropped, "window": self.window}
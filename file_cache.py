@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputMediaPhoto, Message
+from loguru import logger
+
+# === Настройки ===
+FILE_ID_CACHE_PATH = Path(os.getenv("FILE_ID_CACHE_PATH", "cache/file_ids.json"))
+# Новые file_id копятся в памяти и пишутся на диск не чаще раза в столько секунд
+FILE_ID_FLUSH_SECONDS = float(os.getenv("FILE_ID_FLUSH_SECONDS", "1.0"))
+
+
+# === Кэш file_id ===
+# Ключ — "<bot_id>:<тип>:<sha256 содержимого>". file_id привязан к боту и к типу
+# отправки (документ и фото — разные id), поэтому оба входят в ключ.
+# Если файл изменился, у него новый хэш: запись не найдётся, а при сохранении
+# нового id старая запись для того же пути удаляется.
+# На диск кэш пишется в фоне и в отдельном потоке, чтобы отправка файлов не ждала
+# json.dump посреди event loop; при остановке stop() дописывает последние изменения.
+# Загрузки по одному ключу не дублируются: пока файл грузится, остальные отправители
+# ждут (wait_uploads) и берут его file_id — на холодном старте PDF уходит в Telegram один раз.
+class FileIdCache:
+    def __init__(self, path: Path, flush_interval: float = FILE_ID_FLUSH_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        # key -> {"file_id": ..., "path": ...}
+        self._ids: Optional[Dict[str, Dict[str, str]]] = None
+        # path -> (size, mtime_ns, sha256), чтобы не хэшировать файл на каждый запрос
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._dirty = False
+        self._flush: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        # key -> Future, завершается, когда загрузка (успешная или нет) закончилась
+        self._uploads: Dict[str, asyncio.Future] = {}
+        self.upload_waits = 0
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if self._ids is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._ids = json.load(f)
+            except FileNotFoundError:
+                self._ids = {}
+            except Exception as e:
+                logger.warning(f"⚠️ Кэш file_id повреждён, начинаем заново: {e}")
+                self._ids = {}
+        return self._ids
+
+    def _save(self) -> None:
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop (скрипты) — пишем сразу
+            self.flush_now()
+            return
+        if self._flush is None:
+            self._flush = loop.create_task(self._flush_later(), name="file-id-cache")
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await self.flush()
+        finally:
+            self._flush = None
+
+    async def flush(self) -> None:
+        # Изменения, пришедшие во время записи, уходят следующим проходом
+        while self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, dict(self._ids))
+
+    def flush_now(self) -> None:
+        if self._dirty:
+            self._dirty = False
+            self._write(dict(self._ids))
+
+    async def stop(self) -> None:
+        if self._flush is not None:
+            self._wake.set()
+            await self._flush
+            self._wake.clear()
+        await self.flush()
+
+    def _write(self, ids: Dict[str, Dict[str, str]]) -> None:
+        # Файл общий для воркеров: у каждой записи свой временный файл, а os.replace
+        # подменяет кэш целиком
+        tmp = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.path.parent, prefix=f"{self.path.name}.", suffix=".tmp", delete=False
+            ) as f:
+                tmp = f.name
+                json.dump(ids, f, ensure_ascii=False, indent=0)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            if tmp is not None and os.path.exists(tmp):
+                os.unlink(tmp)
+            logger.error(f"❌ Не удалось сохранить кэш file_id: {e}")
+
+    def file_hash(self, path: Path) -> str:
+        st = path.stat()
+        cached = self._hashes.get(str(path))
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self._hashes[str(path)] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def key(self, bot_id: int, kind: str, path: Path, digest: Optional[str] = None) -> str:
+        # digest можно передать готовым (из манифеста), тогда файл не трогаем
+        return f"{bot_id}:{kind}:{digest or self.file_hash(path)}"
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._load().get(key)
+        return entry["file_id"] if entry else None
+
+    def put(self, key: str, file_id: str, path: Path) -> None:
+        self.put_many([(key, file_id, path)])
+
+    def put_many(self, items: Sequence[Tuple[str, str, Path]]) -> None:
+        ids = self._load()
+        changed = False
+        for key, file_id, path in items:
+            if self.get(key) == file_id:
+                continue
+            prefix = key.rsplit(":", 1)[0]
+            for stale in [k for k, v in ids.items() if v["path"] == str(path) and k != key and k.startswith(prefix)]:
+                del ids[stale]
+            ids[key] = {"file_id": file_id, "path": str(path)}
+            changed = True
+        if changed:
+            self._save()
+
+    async def wait_uploads(self, keys: Sequence[str]) -> None:
+        pending = {self._uploads[k] for k in keys if k in self._uploads}
+        if pending:
+            self.upload_waits += 1
+            # asyncio.wait не отменяет чужие загрузки, если отменят нас
+            await asyncio.wait(pending)
+
+    @contextmanager
+    def uploading(self, keys: Sequence[str]) -> Iterator[None]:
+        # Ключи, которые никто не грузит, помечаются как загружаемые на время блока
+        loop = asyncio.get_running_loop()
+        mine = {k: loop.create_future() for k in keys if k not in self._uploads}
+        self._uploads.update(mine)
+        try:
+            yield
+        finally:
+            for key, future in mine.items():
+                if self._uploads.get(key) is future:
+                    del self._uploads[key]
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"ids": len(self._load()), "uploading": len(self._uploads), "upload_waits": self.upload_waits}
+
+    def drop(self, *keys: str) -> None:
+        ids = self._load()
+        removed = [k for k in keys if ids.pop(k, None) is not None]
+        if removed:
+            logger.info(f"🗑 Удалено устаревших file_id: {len(removed)}")
+            self._save()
+
+
+file_cache = FileIdCache(FILE_ID_CACHE_PATH)
+
+
+# === Отправка с переиспользованием file_id ===
+# Принимают Asset из assets.py (path, sha256, caption, upload()).
+async def send_document(msg: Message, asset) -> Message:
+    key = file_cache.key(msg.bot.id, "document", asset.path, asset.sha256)
+    await file_cache.wait_uploads([key])
+    file_id = file_cache.get(key)
+    if file_id:
+        try:
+            return await msg.answer_document(file_id, caption=asset.caption)
+        except TelegramBadRequest as e:
+            logger.warning(f"⚠️ Telegram отклонил file_id для {asset.name}, загружаем заново: {e}")
+            file_cache.drop(key)
+
+    with file_cache.uploading([key]):
+        sent = await msg.answer_document(asset.upload(), caption=asset.caption)
+        if sent.document:
+            file_cache.put(key, sent.document.file_id, asset.path)
+    return sent
+
+
+async def send_photo_group(msg: Message, photos: Sequence) -> List[Message]:
+    keys = [file_cache.key(msg.bot.id, "photo", a.path, a.sha256) for a in photos]
+    paths = [a.path for a in photos]
+    await file_cache.wait_uploads(keys)
+    cached = [file_cache.get(k) for k in keys]
+
+    if any(cached):
+        media = [
+            InputMediaPhoto(media=file_id or a.upload())
+            for a, file_id in zip(photos, cached)
+        ]
+        try:
+            with file_cache.uploading([k for k, file_id in zip(keys, cached) if not file_id]):
+                sent = await msg.answer_media_group(media)
+                _remember_photos(keys, paths, sent)
+            return sent
+        except TelegramBadRequest as e:
+            # Не знаем, какой именно id отклонён, — сбрасываем все из этой группы
+            logger.warning(f"⚠️ Telegram отклонил file_id в альбоме, загружаем заново: {e}")
+            file_cache.drop(*[k for k, file_id in zip(keys, cached) if file_id])
+
+    with file_cache.uploading(keys):
+        sent = await msg.answer_media_group([InputMediaPhoto(media=a.upload()) for a in photos])
+        _remember_photos(keys, paths, sent)
+    return sent
+
+
+def _remember_photos(keys: Sequence[str], paths: Sequence[Path], sent: Sequence[Message]) -> None:
+    # Берём самый большой размер — его id отправляет фото в исходном качестве
+    file_cache.put_many([
+        (key, m.photo[-1].file_id, p) for key, p, m in zip(keys, paths, sent) if m.photo
+    ])
@@ -1,29 +1,17 @@
-import os
-from aiogram import Router, F, Bot, types
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
+from aiogram import Router, F, types
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 from loguru import logger
-
-# === Переменные окружения ===
-AGENT_BOT_TOKEN = os.getenv("AGENT_BOT_TOKEN")
-TG_CHAT_LEAD = os.getenv("TG_CHAT_LEAD")
-
-if not AGENT_BOT_TOKEN:
-    raise EnvironmentError("❌ AGENT_BOT_TOKEN не задан")
-
-if not TG_CHAT_LEAD:
-    raise EnvironmentError("❌ TG_CHAT_LEAD не задан")
+from metrics import HandlerMetrics
+from tracing import HandlerSpans
+from outbox import outbox
+from prompts.catalog import PROPERTY_KEY, catalog, keep_selection
 
 # === Инициализация ===
 router = Router()
-bot = Bot(
-    token=AGENT_BOT_TOKEN,
-    default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
-)
-ADMIN_CHAT_ID = int(TG_CHAT_LEAD)
+router.message.middleware(HandlerMetrics())
+router.message.middleware(HandlerSpans())
 
 # === Состояния формы ===
 class Form(StatesGroup):
@@ -63,9 +51,11 @@ async def form_phone(msg: Message, state: FSMContext):
 async def form_comment(msg: Message, state: FSMContext):
     await state.update_data(comment=msg.text.strip())
     data = await state.get_data()
+    prop = catalog.get(data.get(PROPERTY_KEY))
 
     text = (
         f"📥 *Новая заявка от агента*\n\n"
+        f"🏠 Объект: {prop.title}\n"
         f"👤 Имя: {data.get('name')}\n"
         f"📱 Телефон: {data.get('phone')}\n"
         f"💬 Комментарий: {data.get('comment')}\n"
@@ -73,11 +63,13 @@ async def form_comment(msg: Message, state: FSMContext):
     )
 
     try:
-        await bot.send_message(ADMIN_CHAT_ID, text)
-        logger.info(f"✅ Заявка отправлена от {msg.from_user.id}")
-        await msg.answer("✅ Спасибо! Ваша заявка отправлена.")
+        lead_id = await outbox.put(text)
+        logger.info(f"✅ Заявка {lead_id} от {msg.from_user.id} поставлена в очередь")
     except Exception as e:
-        logger.error(f"❌ Ошибка отправки заявки: {e}")
+        logger.error(f"❌ Не удалось сохранить заявку: {e}")
         await msg.answer("⚠️ Не удалось отправить заявку. Попробуйте позже.")
-
-    await state.clear()
+    else:
+        await msg.answer("✅ Спасибо! Ваша заявка отправлена.")
+    finally:
+        await state.set_state(None)
+        await state.set_data(keep_selection(data))
@@ -1,31 +1,31 @@
 import os
-from aiogram import Router, F, Bot
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
-from aiogram.types import (
-    Message, ReplyKeyboardMarkup, KeyboardButton, FSInputFile, InputMediaPhoto
-)
+from aiogram import Router, F
+from aiogram.filters import CommandObject, CommandStart, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from loguru import logger
-from pathlib import Path
-from prompts.core import get_answer
+from prompts.core import get_answer, stream_answer, memory
+from prompts.catalog import PROPERTY_KEY, Property, catalog, keep_selection
+from file_cache import send_document, send_photo_group
+from assets import assets
+from streaming import stream_reply
+from coalesce import MessageCoalescer
+from metrics import HandlerMetrics
+from tracing import HandlerSpans
+from outbox import outbox
 
 
-AGENT_BOT_TOKEN = os.getenv("AGENT_BOT_TOKEN")
-TG_CHAT_LEAD = os.getenv("TG_CHAT_LEAD")
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "1") == "1"
 
-if not AGENT_BOT_TOKEN:
-    raise EnvironmentError("❌ AGENT_BOT_TOKEN не задан")
-if not TG_CHAT_LEAD:
-    raise EnvironmentError("❌ TG_CHAT_LEAD не задан")
-
-try:
-    TG_CHAT_LEAD = int(TG_CHAT_LEAD)
-except ValueError:
-    raise ValueError("❌ TG_CHAT_LEAD должен быть целым числом (user_id или -100xxx...)")
-
-bot = Bot(token=AGENT_BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN))
 router = Router()
-user_states = {}
+router.message.middleware(HandlerMetrics())
+router.message.middleware(HandlerSpans())
+
+# === Состояния короткой заявки (хранятся в общем FSM-хранилище) ===
+class Lead(StatesGroup):
+    name = State()
+    phone = State()
 
 def get_main_keyboard():
     return ReplyKeyboardMarkup(
@@ -37,33 +37,32 @@ def get_main_keyboard():
         ]
     )
 
-def get_document_caption(filename: str) -> str:
-    name = filename.lower()
-    base_caption = (
-        "ℹ️ Примечание: данный документ является частью комплекта документации, "
-        "связанной с объектом недвижимости по адресу: г. Калуга, пер. Сельский, д. 8А. "
-        "Подробнее — в отчёте №008/25 от 16.04.2025 и документации УФИЦ ООО \"Ваш Дом\".\n\n"
-    )
-
-    if "otchet" in name:
-        return f"📎 [Отчёт об оценке]\n\n{base_caption}"
-    elif "svod" in name:
-        return f"📎 [Свод правил проектирования СП 308]\n\n{base_caption}"
-    elif "plan" in name:
-        return f"📎 [Поэтажный план объекта]\n\n{base_caption}"
-    elif "egrn" in name:
-        return f"📎 [Выписка из ЕГРН]\n\n{base_caption}"
-    elif "resume" in name:
-        return f"📎 [Резюме объекта / Коммерческое предложение]\n\n{base_caption}"
-    else:
-        return f"📎 [Документ]\n\n{base_caption}"
+# === Объект, о котором спрашивает пользователь ===
+# Выбирается ссылкой t.me/<бот>?start=<слаг> и хранится в данных FSM (общее хранилище),
+# без выбора — объект каталога по умолчанию
+async def current_property(state: FSMContext) -> Property:
+    data = await state.get_data()
+    return catalog.get(data.get(PROPERTY_KEY))
+
+@router.message(CommandStart())
+async def start_handler(msg: Message, command: CommandObject, state: FSMContext):
+    logger.info(f"▶️ /start от {msg.from_user.id}" + (f" ({command.args})" if command.args else ""))
+
+    selected = ""
+    prop = catalog.find(command.args)
+    if prop is not None:
+        data = await state.get_data()
+        if data.get(PROPERTY_KEY) != prop.slug:
+            # Диалог о прежнем объекте к новому не относится
+            memory.forget(msg.from_user.id)
+            await state.update_data({PROPERTY_KEY: prop.slug})
+        selected = f"🏠 Объект: *{prop.title}*\n\n"
+    elif command.args:
+        logger.warning(f"⚠️ /start с неизвестным объектом: {command.args}")
 
-@router.message(F.text.lower() == "/start")
-async def start_handler(msg: Message):
-    logger.info(f"▶️ /start от {msg.from_user.id}")
-    
     welcome_text = (
         f"👋 Добро пожаловать, *{msg.from_user.full_name}*!\n\n"
+        f"{selected}"
         "Я — *Telegram-ассистент* и готов ответить на любые вопросы по недвижимости в свободной форме.\n\n"
         "📎 Вы можете воспользоваться меню:\n"
         "• *Получить КП* — получить комплект документов\n"
@@ -78,81 +77,90 @@ async def start_handler(msg: Message):
 
 
 @router.message(F.text == "📁 Получить КП")
-async def send_presentation(msg: Message):
-    folder = "templates"
+async def send_presentation(msg: Message, state: FSMContext):
     try:
-        files = sorted(Path(folder).glob("*.pdf"))
-        if not files:
+        manifest = await assets.manifest(await current_property(state))
+        documents = manifest.documents
+        if not documents:
             await msg.answer("❌ Документы не найдены.")
             return
         await msg.answer("📎 Отправляю документы:")
-        for doc in files:
-            caption = get_document_caption(doc.name)
-            await msg.answer_document(FSInputFile(doc), caption=caption)
+        for doc in documents:
+            await send_document(msg, doc)
     except Exception as e:
         logger.error(f"Ошибка отправки КП: {e}")
         await msg.answer("⚠️ Не удалось отправить документы.")
 
 @router.message(F.text == "📷 Фото объекта")
-async def send_photos(msg: Message):
-    folder = "images"
+async def send_photos(msg: Message, state: FSMContext):
     try:
-        if not os.path.exists(folder):
-            await msg.answer("❌ Папка с фото не найдена.")
-            return
-
-        media = []
-        for f in os.listdir(folder):
-            if f.lower().endswith((".jpg", ".jpeg", ".png")):
-                photo = FSInputFile(os.path.join(folder, f))
-                media.append(InputMediaPhoto(media=photo))
-
-        if not media:
+        manifest = await assets.manifest(await current_property(state))
+        photos = manifest.photos
+        if not photos:
             await msg.answer("📂 Фото не найдены.")
             return
 
-        for i in range(0, len(media), 10):
-            await msg.answer_media_group(media[i:i+10])
+        for i in range(0, len(photos), 10):
+            await send_photo_group(msg, photos[i:i+10])
     except Exception as e:
         logger.error(f"Ошибка отправки фото: {e}")
         await msg.answer("⚠️ Ошибка при отправке фото.")
 
 @router.message(F.text == "📝 Оставить заявку")
-async def start_form(msg: Message):
-    user_states[msg.from_user.id] = {"step": "name"}
+async def start_form(msg: Message, state: FSMContext):
+    await state.set_state(Lead.name)
     await msg.answer("✍️ Введите ваше ФИО:")
 
-@router.message(F.text)
-async def handle_message(msg: Message):
-    user_id = msg.from_user.id
-    state = user_states.get(user_id)
-
-    if state:
-        if state["step"] == "name":
-            state["name"] = msg.text.strip()
-            state["step"] = "phone"
-            await msg.answer("📞 Введите номер телефона:")
-            return
-        elif state["step"] == "phone":
-            phone = msg.text.strip()
-            state["phone"] = phone
-            try:
-                await bot.send_message(
-                    TG_CHAT_LEAD,
-                    f"📥 Новая заявка:\n\n👤 ФИО: {state['name']}\n📞 Телефон: {phone}"
-                )
-                await msg.answer("✅ Спасибо! Заявка отправлена.")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при отправке заявки в TG_CHAT_LEAD: {e}")
-                await msg.answer("⚠️ Не удалось отправить заявку. Мы уже разбираемся.")
-            finally:
-                user_states.pop(user_id, None)
-            return
+@router.message(Lead.name, F.text)
+async def lead_name(msg: Message, state: FSMContext):
+    await state.update_data(name=msg.text.strip())
+    await state.set_state(Lead.phone)
+    await msg.answer("📞 Введите номер телефона:")
+
+@router.message(Lead.phone, F.text)
+async def lead_phone(msg: Message, state: FSMContext):
+    phone = msg.text.strip()
+    data = await state.get_data()
+    prop = catalog.get(data.get(PROPERTY_KEY))
+    try:
+        # Заявка сохраняется в очередь на диске, в TG_CHAT_LEAD её доставит фоновая задача
+        await outbox.put(
+            f"📥 Новая заявка:\n\n🏠 Объект: {prop.title}\n👤 ФИО: {data.get('name')}\n📞 Телефон: {phone}"
+        )
+    except Exception as e:
+        logger.error(f"❌ Не удалось сохранить заявку: {e}")
+        await msg.answer("⚠️ Не удалось отправить заявку. Мы уже разбираемся.")
+    else:
+        await msg.answer("✅ Спасибо! Заявка отправлена.")
+    finally:
+        await state.set_state(None)
+        await state.set_data(keep_selection(data))
+
+# Свободный текст вне анкет; сообщения в состояниях form.Form уходят в роутер формы
+@router.message(StateFilter(None), F.text)
+async def handle_message(msg: Message, state: FSMContext):
+    # GPT-ответ: сообщения, отправленные подряд, склеиваются в один вопрос.
+    # Ответ из FAQ уходит сразу, если у пользователя нет начатой склейки
+    slug = (await state.get_data()).get(PROPERTY_KEY)
+    if coalescer.window > 0 and (
+        coalescer.pending(msg.from_user.id) or not catalog.get(slug).matcher.scan(msg.text).faq
+    ):
+        coalescer.submit(msg, slug)
+    else:
+        await answer_question(msg, msg.text, slug)
 
-    # GPT-ответ
+async def answer_question(msg: Message, question: str, slug: str = None):
+    user_id = msg.from_user.id
+    # Объект фиксируется на весь ответ, даже если каталог перечитают посреди генерации
+    prop = catalog.get(slug)
     try:
-        answer = await get_answer(msg.text, user_id=user_id)
+        if STREAM_ANSWERS:
+            await stream_reply(msg, stream_answer(question, user_id=user_id, prop=prop), suffix=prop.contact_info)
+            return
+        answer = await get_answer(question, user_id=user_id, prop=prop)
         await msg.answer(answer)
     except Exception as e:
         logger.error(f"GPT error: {e}")
         await msg.answer("🤖 Временно не могу ответить.")
+
+coalescer = MessageCoalescer(answer_question)
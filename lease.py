@@ -0,0 +1,131 @@
+import asyncio
+import fcntl
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from storage import SQLiteDB, redis_url, shared_db
+
+LEASE_TTL = float(os.getenv("LEASE_TTL", "60"))
+# Без общего хранилища — lock-файлы: работают между воркерами одной машины
+LEASE_DIR = Path(os.getenv("LEASE_DIR", "data"))
+
+_REDIS_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+
+# === Аренда на одну задачу для всех воркеров ===
+# Кто взял аренду, тот и выполняет задачу (например, регистрацию webhook), остальные
+# пропускают. Аренда истекает через ttl, так что упавший владелец не держит её вечно.
+# Рядом с арендой хранится значение, переживающее перезапуски (что уже сделано).
+# Хранилище то же, что у FSM и дедупликации: SQLite, Redis или lock-файл.
+class Lease:
+    def __init__(self, name: str, ttl: float = LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        self._db: Optional[SQLiteDB] = None
+        self._redis = None
+        self._file = None
+
+        db = shared_db()
+        if db is not None:
+            self._db = db
+            db.call(lambda c: c.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " name TEXT PRIMARY KEY, owner TEXT, expires REAL NOT NULL, value TEXT)"
+            ))
+        elif redis_url():
+            from redis.asyncio import Redis
+
+            self._redis = Redis.from_url(redis_url())
+        self.path = LEASE_DIR / f"{name}.lock"
+
+    async def acquire(self) -> bool:
+        if self._db is not None:
+            now = time.time()
+            self.held = await self._db.run(lambda c: c.execute(
+                "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.expires < ? OR leases.owner = excluded.owner",
+                (self.name, self.owner, now + self.ttl, now),
+            ).rowcount == 1)
+        elif self._redis is not None:
+            self.held = bool(await self._redis.set(
+                f"lease:{self.name}", self.owner, nx=True, px=int(self.ttl * 1000)
+            ))
+        else:
+            self.held = await asyncio.to_thread(self._lock_file)
+        return self.held
+
+    def _lock_file(self) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a+", encoding="utf-8")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    async def release(self) -> None:
+        if not self.held:
+            return
+        self.held = False
+        try:
+            if self._db is not None:
+                await self._db.run(lambda c: c.execute(
+                    "UPDATE leases SET expires = 0 WHERE name = ? AND owner = ?", (self.name, self.owner)
+                ))
+            elif self._redis is not None:
+                await self._redis.eval(_REDIS_RELEASE, 1, f"lease:{self.name}", self.owner)
+            elif self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
+        except Exception as e:
+            # Не страшно: аренда сама истечёт через ttl
+            logger.warning(f"⚠️ Не удалось освободить аренду {self.name}: {e}")
+
+    async def get_value(self) -> Optional[str]:
+        if self._db is not None:
+            row = await self._db.run(lambda c: c.execute(
+                "SELECT value FROM leases WHERE name = ?", (self.name,)
+            ).fetchone())
+            return row[0] if row else None
+        if self._redis is not None:
+            value = await self._redis.get(f"lease:{self.name}:value")
+            return value.decode() if value is not None else None
+        try:
+            return self.path.read_text(encoding="utf-8") or None
+        except FileNotFoundError:
+            return None
+
+    async def set_value(self, value: str) -> None:
+        if self._db is not None:
+            await self._db.run(lambda c: c.execute(
+                "UPDATE leases SET value = ? WHERE name = ?", (value, self.name)
+            ))
+        elif self._redis is not None:
+            await self._redis.set(f"lease:{self.name}:value", value)
+        elif self._file is not None:
+            # Пишем под замком, поэтому файл не переименовываем — только перезаписываем
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(value)
+            self._file.flush()
+
+    async def __aenter__(self) -> bool:
+        return await self.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
@@ -0,0 +1,206 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+# === Метрики в формате Prometheus ===
+# Без внешних зависимостей: запись — это поиск по словарю и сложение,
+# так что метрики можно держать включёнными в продакшене.
+# Каждый процесс отдаёт свои значения; при нескольких воркерах суммируйте в Prometheus.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    # Значение считается в момент выдачи /metrics
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {value}"]
+
+
+class Stats(_Metric):
+    # Числовые поля из stats() компонентов (очередь, кэш, дедуп...) как {prefix}_{поле}.
+    # Среди них есть и счётчики, и текущие значения, поэтому тип — untyped.
+    kind = "untyped"
+
+    def __init__(self, prefix: str, documentation: str, fn: Callable[[], dict]):
+        super().__init__(prefix, documentation)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        lines = []
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"{self.name}_{key}"
+                lines += [f"# HELP {name} {self.documentation}: {key}", f"# TYPE {name} untyped", f"{name} {value}"]
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self._data: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        data = self._data.get(labels)
+        if data is None:
+            data = self._data[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        data[0][bisect_left(self.buckets, value)] += 1
+        data[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        for labels, (counts, total) in self._data.items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# === Метрики приложения ===
+UPDATES = Counter("bot_updates_total", "Обработанные обновления по обработчикам", ["handler"])
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время работы обработчика", ["handler"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в обработчиках", ["handler"])
+FEED_UPDATE_SECONDS = Histogram("bot_feed_update_seconds", "Время dp.feed_update на одно обновление")
+SPAN_SECONDS = Histogram("bot_span_seconds", "Время этапов обработки из трассировки", ["span"])
+WEBHOOK_ERRORS = Counter("bot_webhook_errors_total", "Ошибки приёма webhook", ["reason"])
+
+QUESTIONS = Counter("bot_questions_total", "Вопросы по источнику ответа (faq, gpt, fallback, breaker, quota)", ["source"])
+ANSWER_SECONDS = Histogram("bot_get_answer_seconds", "Время подготовки ответа", ["source"])
+
+OPENAI_SECONDS = Histogram("openai_request_seconds", "Время запроса к OpenAI", ["model"])
+OPENAI_TOKENS = Counter("openai_tokens_total", "Токены OpenAI из usage", ["model", "kind"])
+OPENAI_ERRORS = Counter("openai_errors_total", "Ошибки запросов к OpenAI", ["model", "error"])
+
+TELEGRAM_SECONDS = Histogram("telegram_request_seconds", "Время исходящего запроса к Bot API", ["method"])
+TELEGRAM_ERRORS = Counter("telegram_errors_total", "Ошибки исходящих запросов к Bot API", ["method", "error"])
+
+
+def _faq_ratio() -> float:
+    total = QUESTIONS.total()
+    return QUESTIONS.value("faq") / total if total else 0.0
+
+
+Gauge("bot_faq_hit_ratio", "Доля вопросов, закрытых ответом из FAQ", _faq_ratio)
+
+
+def record_openai(model: str, started: float, usage: Optional[object]) -> None:
+    OPENAI_SECONDS.observe(time.monotonic() - started, model)
+    if usage is not None:
+        OPENAI_TOKENS.inc(model, "prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+        OPENAI_TOKENS.inc(model, "completion", amount=getattr(usage, "completion_tokens", 0) or 0)
+
+
+# === Middleware ===
+class HandlerMetrics(BaseMiddleware):
+    # Вешается как inner-middleware на router.message: к этому моменту обработчик уже выбран
+    async def __call__(self, handler, event, data):
+        callback = data.get("handler")
+        name = getattr(getattr(callback, "callback", None), "__name__", "unknown")
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            UPDATES.inc(name)
+            HANDLER_SECONDS.observe(time.monotonic() - started, name)
+
+
+class TelegramMetrics(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.monotonic()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.monotonic() - started, name)
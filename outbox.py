@@ -0,0 +1,233 @@
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from loguru import logger
+
+from clients import get_bot, lead_chat_id
+from storage import SQLiteDB, open_db, sqlite_path
+
+# === Настройки ===
+# По умолчанию — та же SQLite, что у FSM (общая для воркеров машины), иначе отдельный файл
+OUTBOX_PATH = os.getenv("OUTBOX_PATH") or sqlite_path() or "data/outbox.db"
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "20"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "900"))
+# 0 — каждая заявка отдельным сообщением; N — заявки копятся до N секунд и уходят одной сводкой
+OUTBOX_DIGEST_SECONDS = float(os.getenv("OUTBOX_DIGEST_SECONDS", "0"))
+OUTBOX_KEEP_SECONDS = float(os.getenv("OUTBOX_KEEP_SECONDS", str(7 * 86400)))
+# Сколько запись остаётся за воркером, который взял её на отправку
+CLAIM_SECONDS = 60
+# После стольких неудачных попыток — ошибка в лог, но попытки продолжаются
+ALERT_ATTEMPTS = 5
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n———\n\n"
+
+Row = Tuple[int, str, int, float]  # id, text, attempts, created
+
+
+def backoff(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** attempts)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def digest_chunks(rows: List[Row]) -> List[List[Row]]:
+    # Сводки режутся по лимиту длины сообщения Telegram; заявка не делится между частями
+    chunks: List[List[Row]] = []
+    size = 0
+    for row in rows:
+        extra = len(row[1]) + len(DIGEST_SEPARATOR)
+        if not chunks or size + extra > MESSAGE_LIMIT - 100:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(row)
+        size += extra
+    return chunks
+
+
+# === Очередь заявок на диске ===
+# Обработчик только записывает заявку в SQLite и сразу отвечает пользователю.
+# Фоновая задача забирает готовые к отправке записи пачкой и шлёт их в TG_CHAT_LEAD;
+# при ошибке запись откладывается с экспоненциальной задержкой. Заявки переживают
+# перезапуск и сбои Telegram; при нескольких воркерах запись забирает один из них.
+# Если воркер остановили посреди отправки, запись вернётся в очередь через CLAIM_SECONDS —
+# в редком случае заявка придёт дважды, но не потеряется.
+class Outbox:
+    def __init__(
+        self,
+        path: str = OUTBOX_PATH,
+        batch: int = OUTBOX_BATCH,
+        digest_seconds: float = OUTBOX_DIGEST_SECONDS,
+        poll_seconds: float = OUTBOX_POLL_SECONDS,
+    ):
+        self.path = path
+        self.batch = batch
+        self.digest_seconds = digest_seconds
+        self.poll_seconds = poll_seconds
+        self._db: Optional[SQLiteDB] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._last_cleanup = 0.0
+        self.queued = 0
+        self.sent = 0
+        self.failures = 0
+        self.pending = 0
+        self.oldest = 0.0
+
+    @property
+    def db(self) -> SQLiteDB:
+        if self._db is None:
+            db = open_db(self.path)
+            db.call(lambda c: c.executescript(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, created REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL,"
+                " claimed_until REAL NOT NULL DEFAULT 0, sent REAL, error TEXT);"
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (sent, next_at);"
+            ))
+            self._db = db
+        return self._db
+
+    async def put(self, text: str) -> int:
+        # Возвращается после записи на диск: дальше заявка не потеряется
+        now = time.time()
+        lead_id = await self.db.run(lambda c: c.execute(
+            "INSERT INTO outbox (text, created, next_at) VALUES (?, ?, ?)", (text, now, now)
+        ).lastrowid)
+        self.queued += 1
+        self.start()
+        self._wake.set()
+        return lead_id
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="lead-outbox")
+
+    async def stop(self) -> None:
+        # Неотправленные заявки остаются в базе и уйдут после перезапуска
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self.deliver_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка очереди заявок: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self, c: sqlite3.Connection, now: float) -> List[Row]:
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            pending, oldest = c.execute("SELECT COUNT(*), MIN(created) FROM outbox WHERE sent IS NULL").fetchone()
+            self.pending, self.oldest = pending, oldest or 0.0
+            rows = c.execute(
+                "SELECT id, text, attempts, created FROM outbox"
+                " WHERE sent IS NULL AND next_at <= ? AND claimed_until < ? ORDER BY id LIMIT ?",
+                (now, now, self.batch),
+            ).fetchall()
+            # Сводка: ждём, пока самой старой заявке не исполнится digest_seconds или не наберётся пачка
+            if rows and self.digest_seconds and len(rows) < self.batch:
+                if now - min(r[3] for r in rows) < self.digest_seconds:
+                    rows = []
+            if rows:
+                c.executemany(
+                    "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                    [(now + CLAIM_SECONDS, r[0]) for r in rows],
+                )
+            if now - self._last_cleanup > 3600:
+                self._last_cleanup = now
+                c.execute("DELETE FROM outbox WHERE sent IS NOT NULL AND sent < ?", (now - OUTBOX_KEEP_SECONDS,))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return rows
+
+    async def deliver_due(self) -> int:
+        rows = await self.db.run(lambda c: self._claim(c, time.time()))
+        if not rows:
+            return 0
+        groups = digest_chunks(rows) if self.digest_seconds else [[row] for row in rows]
+        delivered = 0
+        for group in groups:
+            try:
+                await self._send(self._format(group))
+            except Exception as e:
+                await self._failed(group, e)
+            else:
+                await self._done(group)
+                delivered += len(group)
+        return delivered
+
+    def _format(self, group: List[Row]) -> str:
+        if len(group) == 1:
+            return group[0][1]
+        header = f"📦 Заявок: {len(group)}"
+        return header + DIGEST_SEPARATOR + DIGEST_SEPARATOR.join(r[1] for r in group)
+
+    async def _send(self, text: str) -> None:
+        chat_id = lead_chat_id()
+        if chat_id is None:
+            raise EnvironmentError("TG_CHAT_LEAD не задан")
+        bot = get_bot()
+        try:
+            await bot.send_message(chat_id, text)
+        except TelegramBadRequest as e:
+            if "parse entities" not in str(e):
+                raise
+            # Разметку сломали данные из анкеты (например, «_» в имени) — шлём простым текстом
+            await bot.send_message(chat_id, text, parse_mode=None)
+
+    async def _done(self, group: List[Row]) -> None:
+        now = time.time()
+        await self.db.run(lambda c: c.executemany(
+            "UPDATE outbox SET sent = ?, claimed_until = 0, error = NULL WHERE id = ?",
+            [(now, r[0]) for r in group],
+        ))
+        self.sent += len(group)
+        for lead_id, _, attempts, created in group:
+            if attempts:
+                logger.info(f"📨 Заявка {lead_id} доставлена с попытки {attempts + 1} через {now - created:.0f} с")
+
+    async def _failed(self, group: List[Row], error: Exception) -> None:
+        now = time.time()
+        reason = f"{type(error).__name__}: {error}"
+        await self.db.run(lambda c: c.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, next_at = ?, claimed_until = 0, error = ? WHERE id = ?",
+            [(now + backoff(r[2]), reason, r[0]) for r in group],
+        ))
+        self.failures += len(group)
+        for lead_id, _, attempts, _ in group:
+            log = logger.error if attempts + 1 >= ALERT_ATTEMPTS else logger.warning
+            log(f"⚠️ Заявка {lead_id} не доставлена (попытка {attempts + 1}): {reason}")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "failures": self.failures,
+            "pending": self.pending,
+            "oldest_pending_seconds": round(time.time() - self.oldest, 1) if self.oldest else 0.0,
+        }
+
+
+outbox = Outbox()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict
+
+# === Семплирующий профайлер event loop по запросу ===
+# Отдельный поток раз в interval снимает стек потока event loop (sys._current_frames)
+# и считает одинаковые стеки. Ничего не подключается заранее и не замедляет работу,
+# пока профиль не запрошен. Результат — свёрнутые стеки («a;b;c N»), их понимают
+# flamegraph.pl и speedscope; сверху — сводка по функциям, где loop провёл время.
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Кадры ожидания в select: loop простаивает и ждёт событий
+IDLE_FRAMES = ("selectors.py:select",)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample(thread_id: int, seconds: float, interval: float) -> Counter:
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[_collapse(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+def report(stacks: Counter, seconds: float, top: int = 25) -> str:
+    total = sum(stacks.values())
+    idle = sum(n for stack, n in stacks.items() if stack.rsplit(";", 1)[-1] in IDLE_FRAMES)
+    own: Counter = Counter()
+    for stack, n in stacks.items():
+        own[stack.rsplit(";", 1)[-1]] += n
+    lines = [f"# {total} семплов за {seconds:.1f} с, loop простаивал {100 * idle / total if total else 0:.0f}%"]
+    lines.append("# функции, в которых был loop (без простоя):")
+    busy = [(name, n) for name, n in own.most_common() if name not in IDLE_FRAMES]
+    for name, n in busy[:top]:
+        lines.append(f"#   {100 * n / total:5.1f}%  {name}")
+    lines.append("")
+    lines += [f"{stack} {n}" for stack, n in stacks.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+class LoopProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+
+    async def profile(self, seconds: float, interval_ms: float = PROFILE_INTERVAL_MS) -> str:
+        # Вызывается из event loop: его поток и профилируем
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("профиль уже снимается")
+        try:
+            seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+            interval = max(0.001, interval_ms / 1000)
+            stacks = await asyncio.to_thread(sample, threading.get_ident(), seconds, interval)
+            self.runs += 1
+            return report(stacks, seconds)
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"runs": self.runs, "running": int(self._lock.locked())}
+
+
+profiler = LoopProfiler()
@@ -1,144 +0,0 @@
-import os
-import random
-from datetime import datetime
-from openai import AsyncOpenAI
-
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# 🔍 Быстрые ответы по ключевым словам
-FAQ = {
-    "обременени": "🔐 На объекте есть обременение (ипотека), которое будет полностью погашено до выхода на сделку.",
-    "аренд": "🏢 Арендатор — ООО «Ваш Дом». Объект передан УФИЦ (ФСИН) в безвозмездное пользование, что гарантирует устойчивую загрузку.",
-    "фсин": (
-        "👥 Объект используется УФИЦ — участком, функционирующим как исправительный центр под юрисдикцией ФСИН. "
-        "Здание оборудовано по *СП 308.13330.2012*, работает круглосуточно, на территории — постоянный персонал. "
-        "Установлены системы видеонаблюдения. Порядок и безопасность обеспечены."
-    ),
-    "уфиц": "🔒 УФИЦ — это формат исправительного центра. Полное соответствие СП 308. Работа — 24/7.",
-    "женский": "👥 Это женский исправительный центр. Работа в круглосуточном режиме, постоянное присутствие персонала.",
-    "сп 308": "📘 Здание полностью соответствует СП 308.13330.2012. Готов выслать PDF-файл по запросу.",
-    "оценка": "📊 У нас есть свежая независимая оценка. При интересе отправим документ."
-}
-
-BAD_PATTERNS = ["просто смотрю", "не знаю", "пока нет", "интересуюсь"]
-
-FILE_MENTION = {
-    "сп 308": "📘 Можем отправить файл СП 308.13330.2012 по запросу.",
-    "оценка": "📊 У нас есть PDF с независимой оценкой — вышлем при интересе.",
-    "техплан": "📐 Техплан доступен, отправим по запросу."
-}
-
-# 🧾 Обновлённое описание объекта
-SUMMARY = """
-📍 *Калуга, пер. Сельский, 8а*  
-🏢 *Уникальный объект*: гостиница, переоборудованная под УФИЦ (исправительный центр), в круглосуточной эксплуатации  
-📐 *Площадь*: 1089,7 м² + 815 м² земли  
-👥 *Социальная значимость*: аренда ФСИН на 10 лет — объект эксплуатируется без перерывов  
-💰 *Цена*: 56 млн ₽ *(обсуждается при заинтересованности)*  
-📋 *Документы*: техплан, выписка ЕГРН, презентация, независимая оценка, СП 308  
-🔒 *Обременение*: будет погашено до сделки  
-🏛️ *Собственник*: ООО «Ваш Дом»
-"""
-
-STYLE_PROMPT = """
-Ты — Telegram-ассистент по продаже уникального объекта недвижимости с высоким потенциалом.  
-Общайся уверенно и по делу, но дружелюбно.  
-Рассказывай о преимуществах: стабильный арендатор (ФСИН), 10 лет гарантированной загрузки, полное соответствие требованиям СП.  
-Старайся убедить в выгоде и инициировать диалог. Заверши сообщение уточняющим вопросом.
-"""
-
-# 👥 Персонализация
-AGENT_CUES = ["я агент", "у меня клиент", "работаю с инвестором", "брокер"]
-INVESTOR_CUES = ["ищу для себя", "хочу вложить", "смотрю для покупки"]
-
-CTA_AGENT = [
-    "📎 Пришлю техплан, ЕГРН и презентацию — только напишите",
-    "📥 Готов отправить документы — если у вас есть клиент",
-    "🗂 Есть КП, оценка и презентация — пишите, всё вышлю"
-]
-
-CTA_INVESTOR = [
-    "📩 Отправим КП и документы — напишите сюда",
-    "📊 Хочу выслать вам оценку и презентацию",
-    "📥 Могу предложить материалы — стоит ли отправить?"
-]
-
-FOLLOWUP_AGENT = [
-    "🧾 Уточните, интересен ли объект для вашего клиента?",
-    "📞 С кем из вашей команды можно обсудить условия сделки?",
-    "📬 Готов передать документы — ваш клиент на связи?"
-]
-
-FOLLOWUP_INVESTOR = [
-    "💬 Готовы перейти к просмотру документов?",
-    "📊 Рассматриваете покупку в ближайшие недели?",
-    "📎 Хотите сразу посмотреть оценку и техплан?"
-]
-
-def detect_persona(text: str) -> str:
-    text = text.lower()
-    if any(cue in text for cue in AGENT_CUES):
-        return "agent"
-    if any(cue in text for cue in INVESTOR_CUES):
-        return "investor"
-    return "neutral"
-
-# 🤖 Основная функция генерации ответа
-async def get_answer(question: str, user_id: int = None) -> str:
-    q_lower = question.lower()
-
-    for keyword, reply in FAQ.items():
-        if keyword in q_lower:
-            return reply
-
-    if any(p in q_lower for p in BAD_PATTERNS):
-        return "🧐 Уточните, вы представляете клиента или просто изучаете рынок?"
-
-    persona = detect_persona(q_lower)
-
-    if persona == "agent":
-        cta = random.choice(CTA_AGENT)
-        followup = random.choice(FOLLOWUP_AGENT)
-    elif persona == "investor":
-        cta = random.choice(CTA_INVESTOR)
-        followup = random.choice(FOLLOWUP_INVESTOR)
-    else:
-        cta = random.choice(CTA_AGENT + CTA_INVESTOR)
-        followup = random.choice(FOLLOWUP_AGENT + FOLLOWUP_INVESTOR)
-
-    file_hint = ""
-    for keyword, hint in FILE_MENTION.items():
-        if keyword in q_lower:
-            file_hint = f"\n📎 {hint}"
-            break
-
-    prompt = f"""{SUMMARY}
-
-{STYLE_PROMPT}
-
-Вопрос клиента: "{question}"
-
-Ответ:  
-1. ✳️ Уникальное предложение с долгосрочной загрузкой  
-2. 💼 Социальный объект: ФСИН, 10 лет аренды, без рисков  
-3. 📎 {cta}{file_hint}  
-4. ❓ {followup}
-"""
-
-    # 🗂 Лог
-    try:
-        if user_id:
-            with open("logs/questions.log", "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.now()}] {user_id}: {question}\n")
-    except Exception:
-        pass
-
-    # 🔮 GPT-запрос
-    try:
-        response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception:
-        return "📍 Объект функционирует. Документы готовы. Уточните, вы представляете клиента?"
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+# === Предохранитель для OpenAI ===
+# closed — запросы идут как обычно; BREAKER_FAILURES ошибок за BREAKER_WINDOW секунд — open:
+# сеть не трогаем, сразу отдаём FAQ или заготовленный ответ. Через BREAKER_OPEN_SECONDS —
+# half-open: пропускаем пробный запрос; успех закрывает предохранитель, ошибка снова открывает.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "1"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BreakerOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failures: int = BREAKER_FAILURES,
+        window: float = BREAKER_WINDOW,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        probes: int = BREAKER_PROBES,
+    ):
+        self.name = name
+        self.failures = failures
+        self.window = window
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self._failed_at: Deque[float] = deque()
+        self._opened_at = 0.0
+        self._probing = 0
+        self.opened = 0
+        self.rejected = 0
+        self.transitions: Dict[str, int] = {CLOSED: 0, HALF_OPEN: 0, OPEN: 0}
+
+    def _set(self, state: str, reason: str) -> None:
+        if state == self.state:
+            return
+        icon = {CLOSED: "🟢", HALF_OPEN: "🟡", OPEN: "🔴"}[state]
+        logger.warning(f"{icon} Предохранитель {self.name}: {self.state} → {state} ({reason})")
+        self.state = state
+        self.transitions[state] += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        if state == CLOSED:
+            self._failed_at.clear()
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._set(HALF_OPEN, "пробный запрос")
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self._probing < self.probes:
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self) -> None:
+        if self.state == HALF_OPEN:
+            self._set(CLOSED, "пробный запрос успешен")
+
+    def failure(self, error: BaseException) -> None:
+        reason = type(error).__name__
+        if self.state == HALF_OPEN:
+            self._set(OPEN, f"пробный запрос: {reason}")
+            return
+        now = time.monotonic()
+        self._failed_at.append(now)
+        while self._failed_at and now - self._failed_at[0] > self.window:
+            self._failed_at.popleft()
+        if self.state == CLOSED and len(self._failed_at) >= self.failures:
+            self._set(OPEN, f"{len(self._failed_at)} ошибок за {self.window:.0f} с, последняя: {reason}")
+
+    async def call(self, fn: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        # timeout — срок на весь запрос; его истечение считается ошибкой
+        if not self.allow():
+            raise BreakerOpen(f"{self.name}: предохранитель открыт")
+        probe = self.state == HALF_OPEN
+        if probe:
+            self._probing += 1
+        try:
+            result = await (asyncio.wait_for(fn(), timeout) if timeout else fn())
+        except asyncio.CancelledError:
+            # Отмена снаружи (пользователь ушёл, воркер остановлен) — не ошибка сервиса
+            raise
+        except Exception as e:
+            self.failure(e)
+            raise
+        else:
+            self.success()
+            return result
+        finally:
+            if probe:
+                self._probing -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "state": STATE_CODES[self.state],
+            "recent_failures": len(self._failed_at),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCT = " \t\n.,!?;:…-—\"'«»()"
+
+
+def normalize_question(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    return _SPACES.sub(" ", text).strip(_EDGE_PUNCT)
+
+
+def fingerprint(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+# === LRU + TTL кэш ответов с объединением одинаковых запросов ===
+# Пока запрос по ключу в полёте, остальные ждут тот же Future, а не идут в GPT.
+# version — отпечаток SUMMARY и стилевых промптов: при его смене кэш сбрасывается.
+class AnswerCache:
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self._items: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def invalidate(self) -> None:
+        self._items.clear()
+
+    def _check_version(self, version: Optional[str]) -> None:
+        if version is not None and version != self.version:
+            self.invalidate()
+            self.version = version
+
+    def get(self, key: Hashable) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def has(self, key: Hashable, version: Optional[str] = None) -> bool:
+        # Ответ уже есть или вот-вот будет (без учёта в статистике)
+        self._check_version(version)
+        return key in self._in_flight or self.get(key) is not None
+
+    def put(self, key: Hashable, value: str) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[str]],
+        version: Optional[str] = None,
+    ) -> str:
+        self._check_version(version)
+
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили ведущий запрос, а не нас — считаем сами
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.get_or_compute(key, compute, version)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            # Ошибки не кэшируем, но ожидающим отдаём ту же ошибку
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # помечаем как полученную, если никто не ждал
+            raise
+        else:
+            if version is None or version == self.version:
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
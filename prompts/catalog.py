@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from prompts.cache import fingerprint
+from prompts.matcher import KeywordMatcher
+from prompts.tokens import GPT_MAX_INPUT_TOKENS, count_tokens
+
+# === Каталог объектов ===
+# Один JSON на объект в CATALOG_DIR, имя файла — слаг объекта (он же payload deep-link:
+# t.me/<бот>?start=<слаг>). При загрузке для каждого объекта заранее собираются системные
+# промпты, матчер ключевых слов и подписи к документам. Папка проверяется не чаще раза
+# в CATALOG_CHECK_SECONDS; новый снимок каталога подменяет старый одним присваиванием,
+# а запрос, который уже взял свой объект, дорабатывает со старым.
+CATALOG_DIR = Path(os.getenv("CATALOG_DIR", "catalog"))
+DEFAULT_PROPERTY = os.getenv("DEFAULT_PROPERTY", "")
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", "5"))
+
+PERSONAS = ("agent", "investor", "neutral")
+# Так же ограничен payload у /start
+SLUG = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Ключ в данных FSM, под которым хранится выбранный пользователем объект
+PROPERTY_KEY = "property"
+
+
+def _text(value) -> str:
+    # Длинные тексты в JSON удобнее держать списком строк
+    return "\n".join(value) if isinstance(value, list) else str(value)
+
+
+def _options(items) -> str:
+    return "\n".join(f"- {item}" for item in items)
+
+
+class Property:
+    def __init__(self, slug: str, data: dict, source: str = ""):
+        self.slug = slug
+        self.title = data["title"]
+        self.summary = _text(data["summary"])
+        self.pitch = data["pitch"]
+        self.contact_info = "\n\n" + "\n".join(data["contacts"])
+        self.fallback_answer = data["fallback_answer"]
+        agent, investor = data["agent"], data["investor"]
+        self.style = {"agent": _text(agent["style"]), "investor": _text(investor["style"])}
+        self.cta = {"agent": list(agent["cta"]), "investor": list(investor["cta"])}
+        self.followup = {"agent": list(agent["followup"]), "investor": list(investor["followup"])}
+
+        docs = data.get("documents", {})
+        self.documents_dir = Path(docs.get("dir", "templates"))
+        self.document_base_caption = docs.get("caption", "")
+        # Подстрока в имени файла -> название документа (первое совпадение)
+        self.document_titles: List[Tuple[str, str]] = [tuple(t) for t in docs.get("titles", [])]
+        self.photos_dir = Path(data.get("photos", {}).get("dir", "images"))
+
+        self.matcher = KeywordMatcher(
+            agent.get("faq", {}), investor.get("faq", {}),
+            agent.get("cues", []), investor.get("cues", []),
+            data.get("file_hints", {}),
+        )
+        # Собираются один раз: одинаковые байты в начале каждого запроса
+        # позволяют провайдеру кэшировать префикс
+        self.system_prompts = {persona: self.build_system_prompt(persona) for persona in PERSONAS}
+        self.system_tokens = {persona: count_tokens(text) for persona, text in self.system_prompts.items()}
+        self.version = fingerprint(source, *self.system_prompts.values())
+
+    def build_system_prompt(self, persona: str) -> str:
+        if persona in ("agent", "investor"):
+            style, ctas, followups = self.style[persona], self.cta[persona], self.followup[persona]
+        else:
+            style = self.style["agent"] + "\n\n" + self.style["investor"]
+            ctas = self.cta["agent"] + self.cta["investor"]
+            followups = self.followup["agent"] + self.followup["investor"]
+
+        # Варианты CTA и follow-up перечислены здесь, а не выбираются random.choice,
+        # чтобы текст префикса не менялся между запросами
+        return (
+            f"{self.summary}\n\n{style}\n\n"
+            f"Структура ответа:\n"
+            f"1. {self.pitch}\n"
+            f"2. 📄 Одно предложение из списка ниже; если к вопросу приложена пометка 📎, добавь её\n"
+            f"3. ❓ Один уточняющий вопрос из списка ниже\n\n"
+            f"Предложения:\n{_options(ctas)}\n\n"
+            f"Уточняющие вопросы:\n{_options(followups)}"
+        )
+
+    def document_caption(self, filename: str) -> str:
+        name = filename.lower()
+        title = next((t for key, t in self.document_titles if key in name), "Документ")
+        return f"📎 [{title}]\n\n{self.document_base_caption}\n\n"
+
+
+class Snapshot(NamedTuple):
+    properties: Dict[str, Property]
+    default: str
+    signature: Tuple
+    version: str
+
+
+def signature(folder: Path = CATALOG_DIR) -> Tuple:
+    if not folder.is_dir():
+        return ()
+    result = []
+    for p in sorted(folder.glob("*.json")):
+        st = p.stat()
+        result.append((p.name, st.st_size, st.st_mtime_ns))
+    return tuple(result)
+
+
+class Catalog:
+    def __init__(self, folder: Path = CATALOG_DIR, default: str = DEFAULT_PROPERTY):
+        self.folder = folder
+        self.preferred_default = default
+        self._snapshot: Optional[Snapshot] = None
+        self._checked = time.monotonic()
+        self.reloads = 0
+        self.errors = 0
+        self.load()
+        if not self._snapshot.properties:
+            raise RuntimeError(f"❌ Каталог объектов пуст: нет ни одного объекта в {folder}/*.json")
+
+    def load(self) -> None:
+        sig = signature(self.folder)
+        old = self._snapshot.properties if self._snapshot else {}
+        unchanged = set(sig) & set(self._snapshot.signature if self._snapshot else ())
+        properties: Dict[str, Property] = {}
+        for entry in sig:
+            name = entry[0]
+            slug = name[: -len(".json")]
+            if not SLUG.match(slug):
+                logger.warning(f"⚠️ Каталог: {name} — недопустимое имя, нужен слаг [A-Za-z0-9_-]")
+                continue
+            if entry in unchanged and slug in old:
+                # Файл не менялся — объект не пересобираем
+                properties[slug] = old[slug]
+                continue
+            try:
+                raw = (self.folder / name).read_text(encoding="utf-8")
+                properties[slug] = Property(slug, json.loads(raw), raw)
+            except Exception as e:
+                # Битый файл не ломает работающий объект: остаётся прежняя версия
+                self.errors += 1
+                logger.error(f"❌ Каталог: {name} не загружен: {e!r}")
+                if slug in old:
+                    properties[slug] = old[slug]
+
+        if not properties and old:
+            logger.error(f"❌ В {self.folder} не осталось объектов — оставляем прежний каталог")
+            self._snapshot = self._snapshot._replace(signature=sig)
+            return
+
+        default = self.preferred_default
+        if default not in properties:
+            if default:
+                logger.warning(f"⚠️ DEFAULT_PROPERTY={default} нет в каталоге")
+            default = min(properties) if properties else ""
+        version = fingerprint(*(p.version for _, p in sorted(properties.items())))
+        self._snapshot = Snapshot(properties, default, sig, version)
+        self.reloads += 1
+
+        for p in properties.values():
+            if old.get(p.slug) is p:
+                continue
+            tokens = "/".join(str(p.system_tokens[persona]) for persona in PERSONAS)
+            logger.info(f"🏠 Объект {p.slug}: {p.title} (промпты {tokens} токенов)")
+            for persona, count in p.system_tokens.items():
+                if count >= GPT_MAX_INPUT_TOKENS:
+                    logger.warning(
+                        f"⚠️ Системный промпт {p.slug} ({persona}) занимает {count} токенов — "
+                        f"весь бюджет GPT_MAX_INPUT_TOKENS"
+                    )
+
+    def reload(self) -> None:
+        # stat не чаще раза в несколько секунд
+        now = time.monotonic()
+        if now - self._checked < CATALOG_CHECK_SECONDS:
+            return
+        self._checked = now
+        try:
+            if signature(self.folder) != self._snapshot.signature:
+                logger.info("🔄 Файлы каталога изменились — перечитываем")
+                self.load()
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления каталога: {e}")
+
+    @property
+    def snapshot(self) -> Snapshot:
+        self.reload()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def all(self) -> List[Property]:
+        return list(self.snapshot.properties.values())
+
+    def find(self, slug: Optional[str]) -> Optional[Property]:
+        return self.snapshot.properties.get(slug) if slug else None
+
+    def get(self, slug: Optional[str] = None) -> Property:
+        # Неизвестный или удалённый объект — отвечаем по объекту по умолчанию
+        snapshot = self.snapshot
+        return snapshot.properties.get(slug) or snapshot.properties[snapshot.default]
+
+    def stats(self) -> Dict[str, int]:
+        return {"properties": len(self._snapshot.properties), "reloads": self.reloads, "errors": self.errors}
+
+
+def keep_selection(data: dict) -> dict:
+    # Что оставить в данных FSM после заявки: выбор объекта переживает сброс анкеты
+    return {PROPERTY_KEY: data[PROPERTY_KEY]} if data.get(PROPERTY_KEY) else {}
+
+
+catalog = Catalog()
@@ -1,99 +1,274 @@
+import asyncio
 import os
-import random
-from datetime import datetime
-from openai import AsyncOpenAI
-from promts.data import (
-    FAQ_AGENT, FAQ_INVESTOR, FILE_HINTS,
-    CTA_AGENT, CTA_INVESTOR,
-    FOLLOWUP_AGENT, FOLLOWUP_INVESTOR,
-    STYLE_PROMPT_AGENT, STYLE_PROMPT_INVESTOR
-)
+import time
+from typing import AsyncIterator
+from loguru import logger
+from prompts.cache import AnswerCache, normalize_question, fingerprint
+from prompts.catalog import Property, catalog
+from prompts.memory import ConversationMemory
+from prompts.routing import ModelRouter
+from prompts.retrieval import DocumentIndex
+from prompts.breaker import CircuitBreaker, BreakerOpen
+from prompts.tokens import GPT_MAX_INPUT_TOKENS, count_messages, count_tokens, truncate
+from question_log import question_log
+from quota import quota, QuotaExceeded
+from clients import get_openai
+import tracing
+import metrics
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-AGENT_CUES = ["я агент", "у меня клиент", "работаю с инвестором", "брокер"]
-INVESTOR_CUES = ["ищу для себя", "хочу вложить", "смотрю для покупки", "инвестор", "доход"]
-
-SUMMARY = (
-    "📍 *Калуга, пер. Сельский, 8а*\n"
-    "🏢 Объект: бывшая гостиница, переоборудованная под УФИЦ (участок функционирующий как исправительный центр)\n"
-    "📐 Площадь: 1089,7 м² + 815 м² земли\n"
-    "📄 Арендатор: ООО «Ваш Дом». Помещение передано ФСИН в безвозмездное пользование\n"
-    "🏛 ФСИН использует объект для размещения женского исправительного центра, обеспечивая круглосуточную эксплуатацию\n"
-    "💼 УФИЦ даёт ООО «Ваш Дом» стабильный доступ к трудовым ресурсам и загрузку здания\n"
-    "📈 Аренда: 700 тыс ₽/мес, Triple Net (NNN), договор на 10 лет с ежегодной индексацией\n"
-    "🔐 Обременение (ипотека) будет снято до выхода на сделку\n"
-    "📊 Документы: ЕГРН, техплан, оценка, СП 308 — готовы к отправке\n"
-    "💰 Цена: 56 млн ₽ (обсуждается)"
+answer_cache = AnswerCache(
+    maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
 )
 
-CONTACT_INFO = "\n\n📧 vasdom40@yandex.ru\n📞 +7 (920) 092-45-50"
+memory = ConversationMemory()
+models = ModelRouter()
+documents = DocumentIndex()
+breaker = CircuitBreaker("openai")
 
-def detect_persona(text: str) -> str:
-    text = text.lower()
-    if any(cue in text for cue in AGENT_CUES):
-        return "agent"
-    if any(cue in text for cue in INVESTOR_CUES):
-        return "investor"
-    return "neutral"
+# Общий срок на ответ GPT (с повтором в другой модели); потоку нужно больше — он длиннее
+GPT_DEADLINE = float(os.getenv("GPT_DEADLINE", "20"))
+GPT_STREAM_DEADLINE = float(os.getenv("GPT_STREAM_DEADLINE", "60"))
 
-async def get_answer(question: str, user_id: int = None) -> str:
-    q_lower = question.lower()
+def detect_persona(text: str, prop: Property = None) -> str:
+    return (prop or catalog.get()).matcher.scan(text).persona
 
-    # Автоответ
-    for kw, answer in {**FAQ_AGENT, **FAQ_INVESTOR}.items():
-        if kw in q_lower:
-            return answer + CONTACT_INFO
-
-    persona = detect_persona(q_lower)
-
-    if persona == "agent":
-        style = STYLE_PROMPT_AGENT
-        cta = random.choice(CTA_AGENT)
-        followup = random.choice(FOLLOWUP_AGENT)
-    elif persona == "investor":
-        style = STYLE_PROMPT_INVESTOR
-        cta = random.choice(CTA_INVESTOR)
-        followup = random.choice(FOLLOWUP_INVESTOR)
-    else:
-        style = STYLE_PROMPT_AGENT + "\n\n" + STYLE_PROMPT_INVESTOR
-        cta = random.choice(CTA_AGENT + CTA_INVESTOR)
-        followup = random.choice(FOLLOWUP_AGENT + FOLLOWUP_INVESTOR)
-
-    file_hint = ""
-    for key, msg in FILE_HINTS.items():
-        if key in q_lower:
-            file_hint = f"\n📎 {msg}"
+# === Промпт: статический системный префикс объекта + короткий вопрос ===
+# Префиксы, матчер и контакты берутся из каталога (prompts/catalog.py)
+GPT_MAX_OUTPUT_TOKENS = int(os.getenv("GPT_MAX_OUTPUT_TOKENS", "400"))
+QUESTION_TEMPLATE = "Вопрос клиента: \"{question}\"{hint}"
+
+def prompt_version() -> str:
+    # Меняется вместе с каталогом и бюджетом — кэш ответов сбросится сам
+    return fingerprint(catalog.version, str(GPT_MAX_OUTPUT_TOKENS), documents.version)
+
+def format_snippets(snippets) -> str:
+    if not snippets:
+        return ""
+    lines = "\n".join(f"[{s.source}, стр. {s.page}] {s.text}" for s in snippets)
+    return f"\n\nВыдержки из документов (используй, только если они относятся к вопросу):\n{lines}"
+
+def build_prompt(
+    question: str, persona: str, hint: str = None, history: list = (), snippets: list = (), prop: Property = None
+) -> list:
+    prop = prop or catalog.get()
+    system = prop.system_prompts.get(persona) or prop.system_prompts["neutral"]
+    file_hint = f"\n📎 {hint}" if hint else ""
+    history, snippets = list(history), list(snippets)
+    # Сначала выкидываются самые старые реплики истории, потом наименее релевантные выдержки,
+    # и только затем обрезается длинный вопрос, чтобы весь запрос уложился в бюджет
+    while True:
+        context = format_snippets(snippets)
+        fixed = count_messages([
+            {"content": system},
+            *history,
+            {"content": QUESTION_TEMPLATE.format(question="", hint=file_hint) + context},
+        ])
+        if fixed + count_tokens(question) <= GPT_MAX_INPUT_TOKENS:
+            break
+        if history:
+            history = history[2:]
+        elif snippets:
+            snippets.pop()
+        else:
             break
+    question = truncate(question, GPT_MAX_INPUT_TOKENS - fixed)
+    return [
+        {"role": "system", "content": system},
+        *history,
+        {"role": "user", "content": QUESTION_TEMPLATE.format(question=question, hint=file_hint) + context},
+    ]
 
-    prompt = (
-        f"{SUMMARY}\n\n{style}\n\n"
-        f"Вопрос клиента: \"{question}\"\n\n"
-        f"Ответ:\n"
-        f"1. ✳️ Уникальный инвестиционный актив с гарантированной эксплуатацией от ФСИН\n"
-        f"2. 📄 {cta}{file_hint}\n"
-        f"3. ❓ {followup}"
-    )
+def prepare(question: str, user_id: int = None, prop: Property = None):
+    # Возвращает (результат матчера, None) для ответа из FAQ
+    # или (результат матчера, (ключ кэша, сообщения, уровень модели)) для запроса в GPT
+    match = prop.matcher.scan(question)
 
-    # Логирование
+    # Автоответ
+    if match.faq:
+        memory.remember(user_id, question, match.faq, match.persona, faq=True)
+        return match, None
+
+    persona = memory.persona(user_id, match.persona)
+    # История — только для уточняющих вопросов; самостоятельный вопрос получает общий
+    # для всех пользователей ключ кэша и общий запрос в GPT
+    history = memory.messages(user_id) if memory.follow_up(user_id, question) else []
+    messages = build_prompt(question, persona, match.file_hint, history, documents.search(question), prop)
+    tier = models.choose(question, persona, len(history))
+    key = (prop.slug, normalize_question(question), persona, memory.digest(user_id) if history else "")
+    return match, (key, messages, tier)
+
+def log_question(user_id, question: str, match, started: float, source: str) -> None:
+    latency = time.monotonic() - started
+    metrics.QUESTIONS.inc(source)
+    metrics.ANSWER_SECONDS.observe(latency, source)
     if user_id:
+        question_log.log(
+            user_id, question, match.persona,
+            faq_hit=bool(match.faq), latency=latency,
+        )
+
+def record_gpt_error(tier, e: Exception) -> None:
+    metrics.OPENAI_ERRORS.inc(tier.model, type(e).__name__)
+
+async def record_gpt_usage(tier, started: float, usage, user_id=None) -> None:
+    metrics.record_openai(tier.model, started, usage)
+    models.charge(tier, usage)
+    if usage is not None:
+        tracing.annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        await quota.spend(user_id, (usage.prompt_tokens or 0) + (usage.completion_tokens or 0))
+
+async def check_quota(key, messages: list, user_id) -> None:
+    # Ответ из кэша или из уже идущего запроса квоту не тратит
+    if not answer_cache.has(key, version=prompt_version()):
+        with tracing.span("quota"):
+            await quota.acquire(user_id, count_messages(messages) + GPT_MAX_OUTPUT_TOKENS)
+
+async def get_answer(question: str, user_id: int = None, prop: Property = None) -> str:
+    # Объект берётся из каталога один раз: перезагрузка каталога посреди ответа его не меняет
+    prop = prop or catalog.get()
+    started = time.monotonic()
+    with tracing.span("prepare", property=prop.slug):
+        match, request = prepare(question, user_id, prop)
+        tracing.annotate(persona=match.persona, faq=bool(match.faq))
+    source = "faq"
+    try:
+        if match.faq:
+            return match.faq + prop.contact_info
+        key, messages, tier = request
+
+        # Запрос в GPT (одинаковые вопросы берутся из кэша или ждут уже идущий запрос)
+        async def ask_model(tier) -> str:
+            gpt_started = time.monotonic()
+            with tracing.span(f"openai.{tier.model}"):
+                try:
+                    response = await get_openai().chat.completions.create(
+                        model=tier.model,
+                        messages=messages,
+                        max_tokens=GPT_MAX_OUTPUT_TOKENS,
+                    )
+                except Exception as e:
+                    record_gpt_error(tier, e)
+                    raise
+                await record_gpt_usage(tier, gpt_started, response.usage, user_id)
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                logger.warning(f"✂️ Ответ GPT обрезан по GPT_MAX_OUTPUT_TOKENS={GPT_MAX_OUTPUT_TOKENS}")
+            return choice.message.content.strip()
+
+        async def ask_gpt() -> str:
+            deadline = time.monotonic() + GPT_DEADLINE
+            return await breaker.call(
+                lambda: models.complete(tier, ask_model, on_timeout=record_gpt_error, deadline=deadline),
+                timeout=GPT_DEADLINE,
+            )
+
+        source = "gpt"
         try:
-            os.makedirs("logs", exist_ok=True)
-            with open("logs/questions.log", "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.now()}] {user_id}: {question}\n")
-        except Exception:
-            pass
+            await check_quota(key, messages, user_id)
+            answer = await answer_cache.get_or_compute(key, ask_gpt, version=prompt_version())
+            memory.remember(user_id, question, answer, match.persona)
+            return answer + prop.contact_info
+        except QuotaExceeded as e:
+            # Сверх квоты — без GPT: заготовленный ответ с контактами
+            logger.info(f"🚦 {user_id}: {e}")
+            source = "quota"
+            return prop.fallback_answer + prop.contact_info
+        except BreakerOpen:
+            source = "breaker"
+            return prop.fallback_answer + prop.contact_info
+        except Exception as e:
+            logger.error(f"❌ Ошибка GPT для {user_id}: {e}")
+            tracing.fail(e)
+            source = "fallback"
+            return prop.fallback_answer + prop.contact_info
+    finally:
+        log_question(user_id, question, match, started, source)
 
-    # Запрос в GPT
+async def stream_answer(question: str, user_id: int = None, prop: Property = None) -> AsyncIterator[str]:
+    # Отдаёт ответ кусками по мере генерации, без контактов объекта.
+    # Ответ из FAQ, из кэша или из чужого запроса в полёте приходит одним куском.
+    prop = prop or catalog.get()
+    started = time.monotonic()
+    with tracing.span("prepare", property=prop.slug):
+        match, request = prepare(question, user_id, prop)
+        tracing.annotate(persona=match.persona, faq=bool(match.faq))
+    if match.faq:
+        log_question(user_id, question, match, started, "faq")
+        yield match.faq
+        return
+    key, messages, tier = request
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}]
+        await check_quota(key, messages, user_id)
+    except QuotaExceeded as e:
+        logger.info(f"🚦 {user_id}: {e}")
+        log_question(user_id, question, match, started, "quota")
+        yield prop.fallback_answer
+        return
+
+    deltas: asyncio.Queue = asyncio.Queue()
+    parts = []
+
+    async def stream_model(tier) -> str:
+        usage = None
+        gpt_started = time.monotonic()
+        with tracing.span(f"openai.{tier.model}", stream=True):
+            try:
+                # Таймаут уровня — на начало ответа; дальше поток ограничен таймаутом чтения клиента
+                stream = await asyncio.wait_for(get_openai().chat.completions.create(
+                    model=tier.model,
+                    messages=messages,
+                    max_tokens=GPT_MAX_OUTPUT_TOKENS,
+                    stream=True,
+                    # usage приходит последним чанком только по запросу
+                    stream_options={"include_usage": True},
+                ), tier.timeout)
+                async for chunk in stream:
+                    usage = chunk.usage or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if not parts:
+                            tracing.annotate(first_token_ms=round((time.monotonic() - gpt_started) * 1000))
+                        parts.append(delta)
+                        deltas.put_nowait(delta)
+            except Exception as e:
+                record_gpt_error(tier, e)
+                raise
+            await record_gpt_usage(tier, gpt_started, usage, user_id)
+        return "".join(parts).strip()
+
+    async def ask_gpt_stream() -> str:
+        # Переключиться на другую модель можно, только пока пользователь ничего не увидел
+        deadline = time.monotonic() + GPT_STREAM_DEADLINE
+        return await breaker.call(
+            lambda: models.complete(tier, stream_model, timeout=False, can_retry=lambda: not parts, deadline=deadline),
+            timeout=GPT_STREAM_DEADLINE,
         )
-        return response.choices[0].message.content.strip() + CONTACT_INFO
+
+    task = asyncio.create_task(
+        answer_cache.get_or_compute(key, ask_gpt_stream, version=prompt_version())
+    )
+    task.add_done_callback(lambda _: deltas.put_nowait(None))
+    streamed = False
+    source = "gpt"
+    try:
+        while (delta := await deltas.get()) is not None:
+            streamed = True
+            yield delta
+        answer = task.result()
+        memory.remember(user_id, question, answer, match.persona)
+        if not streamed:
+            yield answer
+    except BreakerOpen:
+        source = "breaker"
+        yield prop.fallback_answer
     except Exception as e:
-        print(f"[ERROR GPT]: {e}")
-        return (
-            "📍 Объект функционирует в постоянном режиме. Документы готовы. "
-            "Уточните, вы представляете клиента или рассматриваете покупку?" + CONTACT_INFO
-        )
+        logger.error(f"❌ Ошибка GPT (поток) для {user_id}: {e}")
+        tracing.fail(e)
+        source = "fallback"
+        if not streamed:
+            yield prop.fallback_answer
+    finally:
+        if not task.done():
+            task.cancel()
+        log_question(user_id, question, match, started, source)
@@ -1,81 +0,0 @@
-FAQ_AGENT = {
-    "обременени": "🔐 Обременение (ипотека) будет полностью погашено до выхода на сделку.",
-    "аренд": "📄 Арендатор — *ООО «Ваш Дом»*. Помещение передано ФСИН в безвозмездное пользование.",
-    "фсин": (
-        "👥 ФСИН не является арендатором. Объект эксплуатируется как исправительный центр (УФИЦ) "
-        "на основании соглашения о безвозмездном пользовании."
-    ),
-    "оценка": "📊 Независимая рыночная оценка получена. Готовы отправить PDF-файл.",
-    "ипотек": "🔐 Обременение (ипотека) будет полностью погашено до выхода на сделку.",
-    "капекс": "🔧 Объект функционирует, дополнительных вложений (CapEx) не требуется.",
-    "вложен": "🔧 Объект функционирует, дополнительных вложений не требуется.",
-    "срок": "⏳ Срок аренды по договору — 10 лет.",
-    "гаранти": (
-        "✅ Долгосрочный договор (10 лет) с надёжным арендатором. Объект эксплуатируется ФСИН, что гарантирует стабильную работу и доход."
-    ),
-    "индексаци": "🔄 Предусмотрена ежегодная индексация арендной платы.",
-    "nnn": (
-        "📑 Формат аренды Triple Net: коммунальные платежи, эксплуатация и ремонт полностью на арендаторе."
-    ),
-    "нетто": (
-        "📑 Формат аренды Triple Net: коммунальные платежи, эксплуатация и ремонт полностью на арендаторе."
-    ),
-    "тройной": (
-        "📑 Формат аренды Triple Net: коммунальные платежи, эксплуатация и ремонт полностью на арендаторе."
-    ),
-    "triple": (
-        "📑 Формат аренды Triple Net: коммунальные платежи, эксплуатация и ремонт полностью на арендаторе."
-    )
-}
-
-FAQ_INVESTOR = {
-    "доход": "💰 Арендная плата составляет 700 тыс ₽ в месяц (ежегодная индексация). Договор аренды на 10 лет.",
-    "безопасност": "🛡 Круглосуточный режим, охрана, системы видеонаблюдения.",
-    "фсин": "🏛 Государственная структура ФСИН использует помещение. Это повышает устойчивость эксплуатации.",
-    "окупа": "📈 Окупаемость объекта — менее 8 лет. Есть расчёты, готовы показать."
-}
-
-FILE_HINTS = {
-    "оценка": "📊 Есть PDF с оценкой. Вышлем, если интересно.",
-    "сп 308": "📘 СП 308.13330.2012 можем отправить по запросу.",
-    "техплан": "📐 Есть техплан. Пришлём по запросу."
-}
-
-CTA_AGENT = [
-    "📎 Пришлю КП, оценку и техплан — напишите, если актуально.",
-    "📥 Есть пакет документов — если у вас клиент, всё отправлю.",
-    "📈 700 тыс ₽/мес (NNN, 10 лет) — вышлю детали, если есть заинтересованный клиент."
-]
-
-CTA_INVESTOR = [
-    "📩 Отправим материалы и техплан — просто напишите.",
-    "📊 Могу выслать оценку и КП — стоит ли показать?"
-]
-
-FOLLOWUP_AGENT = [
-    "📬 Ваш клиент готов смотреть объект?",
-    "📞 С кем обсудить условия? Готов выйти на связь.",
-    "👥 У вас есть заинтересованный клиент на этот объект?"
-]
-
-FOLLOWUP_INVESTOR = [
-    "📎 Хотите посмотреть техплан и оценку?",
-    "📊 Рассматриваете покупку в ближайшее время?"
-]
-
-STYLE_PROMPT_AGENT = (
-    "Ты — Telegram-бот, помогающий агентам продавать объект недвижимости.\n"
-    "Основной арендатор — ООО «Ваш Дом». Помещение используется ФСИН по соглашению безвозмездного пользования, что обеспечивает стабильную загрузку.\n"
-    "Формат аренды — Triple Net (арендатор оплачивает коммуналку, эксплуатацию и ремонт).\n"
-    "Договор аренды на 10 лет с арендной платой 700 тыс ₽/мес (ежегодная индексация).\n"
-    "Дай понять, что отклик ждём только от агента с реальным клиентом.\n"
-    "Отвечай по делу, предлагай КП, техплан, оценку. Заверши сообщение уточняющим вопросом."
-)
-
-STYLE_PROMPT_INVESTOR = (
-    "Ты — Telegram-бот, объясняющий инвестору особенности объекта.\n"
-    "ООО «Ваш Дом» — арендатор. ФСИН использует здание по соглашению, это обеспечивает стабильную загрузку.\n"
-    "Отметь высокую доходность: аренда 700 тыс ₽/мес с ежегодной индексацией, договор на 10 лет.\n"
-    "Добавь, что формат Triple Net — все расходы на арендаторе.\n"
-    "Отвечай уверенно, кратко и завершай вовлекающим вопросом."
-)
@@ -0,0 +1,111 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+FAQ = "faq"
+AGENT_CUE = "agent"
+INVESTOR_CUE = "investor"
+FILE_HINT = "file_hint"
+
+
+class Match(NamedTuple):
+    faq: Optional[str]
+    persona: str
+    file_hint: Optional[str]
+
+
+# === Единый матчер по всем ключевым словам ===
+# Все ключи складываются в префиксное дерево, а дерево — в одно регулярное
+# выражение с просмотром вперёд: движок re проходит текст один раз и в каждой
+# позиции идёт по дереву, так что стоимость почти не зависит от числа ключей.
+# В каждой позиции находится самый длинный ключ; ключи, которые являются его
+# префиксами, учтены заранее в _outputs.
+#
+# Правила приоритета:
+# - персона: признак агента важнее признака инвестора, иначе "neutral";
+# - FAQ: побеждает ключ, стоящий раньше в таблицах (сначала FAQ_AGENT, потом
+#   новые ключи FAQ_INVESTOR). Если ключ есть в обеих таблицах, ответ берётся
+#   из таблицы определённой персоны, а для "neutral" — из FAQ_INVESTOR;
+# - подсказка о файле: побеждает ключ, стоящий раньше в FILE_HINTS.
+class KeywordMatcher:
+    def __init__(
+        self,
+        faq_agent: Dict[str, str],
+        faq_investor: Dict[str, str],
+        agent_cues: Sequence[str],
+        investor_cues: Sequence[str],
+        file_hints: Dict[str, str],
+    ):
+        patterns: Dict[str, List[Tuple[str, int]]] = {}
+
+        # ранг FAQ -> {персона: ответ}
+        self._faq: List[Dict[str, str]] = []
+        faq_rank: Dict[str, int] = {}
+        for persona, table in ((AGENT_CUE, faq_agent), (INVESTOR_CUE, faq_investor)):
+            for kw, answer in table.items():
+                kw = kw.lower()
+                if kw not in faq_rank:
+                    faq_rank[kw] = len(self._faq)
+                    self._faq.append({})
+                    patterns.setdefault(kw, []).append((FAQ, faq_rank[kw]))
+                self._faq[faq_rank[kw]][persona] = answer
+
+        for cue in agent_cues:
+            patterns.setdefault(cue.lower(), []).append((AGENT_CUE, 0))
+        for cue in investor_cues:
+            patterns.setdefault(cue.lower(), []).append((INVESTOR_CUE, 0))
+
+        self._hints: List[str] = []
+        for kw, hint in file_hints.items():
+            patterns.setdefault(kw.lower(), []).append((FILE_HINT, len(self._hints)))
+            self._hints.append(hint)
+
+        self._outputs: Dict[str, Tuple[Tuple[str, int], ...]] = {
+            kw: tuple(out for p, outs in patterns.items() if kw.startswith(p) for out in outs)
+            for kw in patterns
+        }
+
+        trie: dict = {}
+        for kw in patterns:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[""] = True
+        self._regex = re.compile(f"(?=({_trie_to_regex(trie)}))") if patterns else None
+
+    def scan(self, text: str) -> Match:
+        faq_rank = hint_rank = None
+        agent = investor = False
+        if self._regex is not None:
+            outputs = self._outputs
+            for found in self._regex.findall(text.lower()):
+                for kind, rank in outputs[found]:
+                    if kind == FAQ:
+                        if faq_rank is None or rank < faq_rank:
+                            faq_rank = rank
+                    elif kind == FILE_HINT:
+                        if hint_rank is None or rank < hint_rank:
+                            hint_rank = rank
+                    elif kind == AGENT_CUE:
+                        agent = True
+                    else:
+                        investor = True
+
+        persona = AGENT_CUE if agent else INVESTOR_CUE if investor else "neutral"
+        faq = None
+        if faq_rank is not None:
+            answers = self._faq[faq_rank]
+            faq = answers.get(persona) or answers.get(INVESTOR_CUE) or answers[AGENT_CUE]
+        hint = self._hints[hint_rank] if hint_rank is not None else None
+        return Match(faq, persona, hint)
+
+
+def _trie_to_regex(node: dict) -> str:
+    terminal = "" in node
+    branches = [re.escape(ch) + _trie_to_regex(child) for ch, child in node.items() if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if terminal:
+        # Жадный необязательный хвост: сначала пробуем более длинный ключ
+        return (body if len(branches) > 1 else "(?:" + body + ")") + "?"
+    return body
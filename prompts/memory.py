@@ -0,0 +1,168 @@
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from prompts.cache import fingerprint
+
+# === Память диалога ===
+# На пользователя: последние MEMORY_TURNS пар «вопрос — ответ» целиком и короткая сводка
+# более старых. Размер промпта не растёт с длиной диалога, память на пользователя ограничена.
+# Хранится в памяти процесса: при нескольких воркерах контекст живёт в том, который отвечал.
+MEMORY_TURNS = int(os.getenv("MEMORY_TURNS", "3"))
+MEMORY_TTL = float(os.getenv("MEMORY_TTL", "1800"))
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", "10000"))
+MEMORY_TURN_CHARS = int(os.getenv("MEMORY_TURN_CHARS", "600"))
+MEMORY_SUMMARY_LINES = int(os.getenv("MEMORY_SUMMARY_LINES", "6"))
+SUMMARY_LINE_CHARS = 160
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s")
+# Вопрос ссылается на сказанное раньше: начинается с союза или содержит местоимение-отсылку.
+# Только такие вопросы получают историю в промпт и отпечаток истории в ключ кэша —
+# самостоятельные вопросы остаются общими для всех пользователей
+_FOLLOW_UP = re.compile(
+    r"^\W*(а|и|но|тогда|ещё|еще)\b"
+    r"|\b(это|этот|эта|эти|этого|этой|этим|этом|он|она|оно|они|его|её|ее|их|ему|ей|им|ним|ней|них"
+    r"|там|туда|тут|такой|такая|такое|такие|тот|та|те|того|выше|ранее|подробнее)\b",
+    re.IGNORECASE,
+)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END.split(text.strip(), 1)[0]
+
+
+class Conversation:
+    __slots__ = ("turns", "summary", "persona", "updated", "size", "digest")
+
+    def __init__(self, turns: int):
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=turns)
+        self.summary: Deque[str] = deque(maxlen=MEMORY_SUMMARY_LINES)
+        self.persona = "neutral"
+        self.updated = time.monotonic()
+        self.size = 0
+        # Отпечаток ответов GPT в диалоге; ответы из FAQ одинаковы для всех и его не меняют
+        self.digest = ""
+
+    def fold(self, question: str, answer: str) -> None:
+        # Выжимка без GPT: первое предложение вопроса и ответа
+        line = f"Клиент: {_first_sentence(question)} — Бот: {_first_sentence(answer)}"
+        self.summary.append(_clip(line, SUMMARY_LINE_CHARS))
+
+    def measure(self) -> int:
+        self.size = sum(len(q) + len(a) for q, a in self.turns) + sum(len(s) for s in self.summary)
+        return self.size
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        turns: int = MEMORY_TURNS,
+        ttl: float = MEMORY_TTL,
+        max_users: int = MEMORY_MAX_USERS,
+    ):
+        self.turns = turns
+        self.ttl = ttl
+        self.max_users = max_users
+        # Порядок — по последней активности: просроченные всегда в начале
+        self._users: "OrderedDict[int, Conversation]" = OrderedDict()
+        self.chars = 0
+        self.evicted = 0
+        self.folded = 0
+
+    def _drop(self, user_id: int) -> None:
+        conv = self._users.pop(user_id)
+        self.chars -= conv.size
+        self.evicted += 1
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        while self._users:
+            user_id, conv = next(iter(self._users.items()))
+            if conv.updated >= deadline:
+                break
+            self._drop(user_id)
+
+    def get(self, user_id: Optional[int]) -> Optional[Conversation]:
+        if not user_id or self.turns <= 0:
+            return None
+        self._expire()
+        return self._users.get(user_id)
+
+    def remember(self, user_id: Optional[int], question: str, answer: str, persona: str, faq: bool = False) -> None:
+        if not user_id or self.turns <= 0:
+            return
+        self._expire()
+        conv = self._users.get(user_id)
+        if conv is None:
+            conv = self._users[user_id] = Conversation(self.turns)
+            while len(self._users) > self.max_users:
+                self._drop(next(iter(self._users)))
+        else:
+            self._users.move_to_end(user_id)
+
+        if len(conv.turns) == conv.turns.maxlen:
+            conv.fold(*conv.turns[0])
+            self.folded += 1
+        conv.turns.append((_clip(question, MEMORY_TURN_CHARS), _clip(answer, MEMORY_TURN_CHARS)))
+        if not faq:
+            conv.digest = fingerprint(conv.digest, *conv.turns[-1])
+        if persona != "neutral":
+            conv.persona = persona
+        conv.updated = time.monotonic()
+        self.chars -= conv.size
+        self.chars += conv.measure()
+
+    def forget(self, user_id: Optional[int]) -> None:
+        # Например, пользователь перешёл к другому объекту: прежний диалог к нему не относится
+        conv = self._users.pop(user_id, None)
+        if conv is not None:
+            self.chars -= conv.size
+
+    def persona(self, user_id: Optional[int], detected: str) -> str:
+        # Персона из первых сообщений сохраняется на уточняющих вопросах без признаков
+        if detected != "neutral":
+            return detected
+        conv = self.get(user_id)
+        return conv.persona if conv else detected
+
+    def messages(self, user_id: Optional[int]) -> List[Dict[str, str]]:
+        conv = self.get(user_id)
+        if conv is None:
+            return []
+        messages = []
+        if conv.summary:
+            messages.append({"role": "user", "content": "Ранее в диалоге:\n" + "\n".join(conv.summary)})
+            messages.append({"role": "assistant", "content": "Учту."})
+        for question, answer in conv.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def follow_up(self, user_id: Optional[int], question: str) -> bool:
+        return bool(_FOLLOW_UP.search(question)) and self.get(user_id) is not None
+
+    def digest(self, user_id: Optional[int]) -> str:
+        # Часть ключа кэша для уточняющих вопросов: один и тот же вопрос в разном контексте — разные ответы
+        conv = self.get(user_id)
+        if conv is None:
+            return ""
+        # В диалоге пока только ответы из FAQ — отпечаток самой истории, чтобы уточнения
+        # к разным вопросам FAQ не делили один ответ
+        return conv.digest or fingerprint(*conv.summary, *(part for turn in conv.turns for part in turn))
+
+    def stats(self) -> Dict[str, int]:
+        users = len(self._users)
+        return {
+            "users": users,
+            "chars": self.chars,
+            "avg_chars": self.chars // users if users else 0,
+            "evicted": self.evicted,
+            "folded": self.folded,
+        }
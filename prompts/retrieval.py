@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from loguru import logger
+
+# === Поиск по PDF из templates/ ===
+# Индекс — производный файл рядом с PDF, в git его нет. Собирается при деплое
+# (python -m prompts.retrieval) или при старте в фоне: воркер сверяет хэши PDF
+# с заголовком и пересобирает индекс, если его нет или какой-либо PDF изменился.
+# Сканы без текстового слоя в индекс не попадают: для них нужен OCR или текстовая версия.
+# Формат — один файл: заголовок JSON (словарь терминов, хэши PDF, источники фрагментов)
+# и массивы uint32 с постингами, длинами фрагментов и смещениями текста. Массивы читаются
+# через mmap, так что в памяти процесса остаётся только словарь.
+DOCS_GLOB = os.getenv("RETRIEVAL_DOCS", "templates/*.pdf")
+INDEX_PATH = Path(os.getenv("RETRIEVAL_INDEX_PATH", "templates/retrieval.idx"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Фрагмент попадает в промпт, только если он заметно релевантен: СП 308 большой,
+# и случайные совпадения по одному слову там находятся почти на любой вопрос
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "8"))
+RETRIEVAL_MIN_COVERAGE = float(os.getenv("RETRIEVAL_MIN_COVERAGE", "0.6"))
+SNIPPET_CHARS = int(os.getenv("RETRIEVAL_SNIPPET_CHARS", "500"))
+
+FORMAT_VERSION = 1
+MAGIC = b"TGBM25\x00\x01"
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 30
+# Страница, с которой извлечено меньше символов, считается сканом без текстового слоя
+MIN_PAGE_CHARS = 100
+STEM_CHARS = 6
+K1, B = 1.2, 0.75
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "к", "ко", "о", "об", "от", "до", "из", "за", "для", "при",
+    "не", "ни", "но", "а", "или", "что", "как", "это", "то", "же", "ли", "бы", "вы", "мы", "он", "она",
+    "они", "его", "ее", "их", "так", "уже", "есть", "был", "была", "быть", "также", "который", "которые",
+    "можно", "нужно", "если", "там", "тут", "где", "когда", "какой", "какая", "какие", "сколько",
+}
+
+
+def terms(text: str) -> List[str]:
+    # Грубый стемминг для русского — префикс фиксированной длины (как ключи FAQ)
+    return [
+        w[:STEM_CHARS]
+        for w in _WORD.findall(text.lower())
+        if len(w) > 2 and w not in _STOPWORDS and not w.isdigit()
+    ]
+
+
+def source_hashes(pattern: str = DOCS_GLOB) -> Dict[str, str]:
+    hashes = {}
+    for path in sorted(Path().glob(pattern)):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        hashes[str(path)] = h.hexdigest()
+    return hashes
+
+
+def extract_pages(path: str) -> List[str]:
+    # pypdf нужен только для сборки: поиск по готовому индексу работает и без него
+    from pypdf import PdfReader
+
+    return [page.extract_text() or "" for page in PdfReader(path).pages]
+
+
+def chunk_pages(pages: List[str]):
+    for page_no, text in enumerate(pages, start=1):
+        words = text.split()
+        step = CHUNK_WORDS - CHUNK_OVERLAP
+        for start in range(0, max(len(words) - CHUNK_OVERLAP, 1), step):
+            chunk = " ".join(words[start:start + CHUNK_WORDS])
+            if chunk:
+                yield page_no, chunk
+
+
+def _page_ranges(pages: List[int]) -> str:
+    # [1, 2, 3, 7] -> "1-3, 7"
+    ranges = []
+    for n in pages:
+        if ranges and ranges[-1][1] == n - 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ", ".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def build_index(index_path: Path = INDEX_PATH, pattern: str = DOCS_GLOB) -> dict:
+    hashes = source_hashes(pattern)
+    chunks: List[str] = []
+    sources: List[list] = []
+    for path in hashes:
+        pages = extract_pages(path)
+        # Скан отдаёт пустую страницу или пару строк штампа — по сути тоже пустую
+        empty = [n for n, text in enumerate(pages, start=1) if len(text.strip()) < MIN_PAGE_CHARS]
+        if empty and len(empty) == len(pages):
+            chars = sum(len(text.strip()) for text in pages)
+            logger.warning(f"⚠️ {Path(path).name}: текста почти нет ({chars} символов на {len(pages)} стр., скан?) — "
+                           f"поиск по нему ничего не найдёт, нужен OCR или текстовая версия")
+        elif empty:
+            logger.warning(f"⚠️ {Path(path).name}: нет текста на страницах {_page_ranges(empty)} из {len(pages)}")
+        for page_no, chunk in chunk_pages(pages):
+            chunks.append(chunk)
+            sources.append([Path(path).name, page_no])
+
+    postings: Dict[str, Dict[int, int]] = {}
+    lengths = array("I")
+    for doc_id, chunk in enumerate(chunks):
+        chunk_terms = terms(chunk)
+        lengths.append(len(chunk_terms))
+        for term in chunk_terms:
+            tf = postings.setdefault(term, {})
+            tf[doc_id] = tf.get(doc_id, 0) + 1
+
+    # Постинги: для каждого термина подряд пары (doc_id, tf)
+    vocab = {}
+    flat = array("I")
+    for term in sorted(postings):
+        docs = postings[term]
+        vocab[term] = [len(flat) // 2, len(docs)]
+        for doc_id in sorted(docs):
+            flat.append(doc_id)
+            flat.append(docs[doc_id])
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    for chunk in chunks:
+        blob += chunk.encode("utf-8")
+        offsets.append(len(blob))
+
+    header = {
+        "version": FORMAT_VERSION,
+        "hashes": hashes,
+        "docs": len(chunks),
+        "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        "sources": sources,
+        "vocab": vocab,
+        "sections": {"postings": len(flat), "lengths": len(lengths), "offsets": len(offsets)},
+    }
+    raw = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # Массивы выравниваются по 4 байта, чтобы memoryview.cast("I") работал без копий
+    pad = (-(len(MAGIC) + 4 + len(raw))) % 4
+
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    # Временный файл у каждого свой: воркеры, пересобирающие индекс одновременно,
+    # не пишут в один и тот же .tmp, а последний os.replace просто побеждает
+    with tempfile.NamedTemporaryFile(
+        dir=index_path.parent, prefix=f"{index_path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        tmp = f.name
+        try:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(raw) + pad))
+            f.write(raw + b" " * pad)
+            for section in (flat, lengths, offsets):
+                if sys.byteorder != "little":
+                    section.byteswap()
+                f.write(section.tobytes())
+            f.write(blob)
+        except BaseException:
+            f.close()
+            os.unlink(tmp)
+            raise
+    os.replace(tmp, index_path)
+    logger.info(f"📚 Индекс документов собран: {len(chunks)} фрагментов, {len(vocab)} терминов → {index_path}")
+    return header
+
+
+class Snippet(NamedTuple):
+    source: str
+    page: int
+    score: float
+    text: str
+
+
+class DocumentIndex:
+    def __init__(self, path: Path = INDEX_PATH):
+        self.path = path
+        self.header: Optional[dict] = None
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._postings = self._lengths = self._offsets = None
+        self._text_start = 0
+        self._missing = False
+
+    @property
+    def version(self) -> str:
+        if not self.header:
+            return ""
+        return hashlib.sha256("".join(sorted(self.header["hashes"].values())).encode()).hexdigest()[:16]
+
+    def open(self) -> bool:
+        if self.header is not None:
+            return True
+        if self._missing or not self.path.exists():
+            self._missing = True
+            return False
+        f = open(self.path, "rb")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            f.close()
+            logger.warning(f"⚠️ {self.path} не похож на индекс документов — пропускаем")
+            self._missing = True
+            return False
+        (size,) = struct.unpack_from("<I", mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(mm[start:start + size])
+        pos = start + size
+        view = memoryview(mm)
+        sections = []
+        for name in ("postings", "lengths", "offsets"):
+            count = header["sections"][name]
+            sections.append(view[pos:pos + count * 4].cast("I"))
+            pos += count * 4
+        self._postings, self._lengths, self._offsets = sections
+        self._text_start = pos
+        self._file, self._mmap, self.header = f, mm, header
+        return True
+
+    def close(self) -> None:
+        if self._mmap is None:
+            return
+        for section in (self._postings, self._lengths, self._offsets):
+            section.release()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = self._file = self.header = None
+        self._postings = self._lengths = self._offsets = None
+
+    def read_header(self) -> Optional[dict]:
+        try:
+            with open(self.path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                (size,) = struct.unpack("<I", f.read(4))
+                return json.loads(f.read(size))
+        except (OSError, ValueError):
+            return None
+
+    def rebuild_if_stale(self) -> bool:
+        # Пересборка только при изменении хэша какого-либо PDF. Открытый mmap не трогает:
+        # новый файл подменяет старый атомарно, переоткрытие — в refresh()
+        hashes = source_hashes()
+        header = self.read_header()
+        if not hashes or (header and header.get("version") == FORMAT_VERSION and header["hashes"] == hashes):
+            return False
+        try:
+            import pypdf  # noqa: F401
+        except ImportError:
+            state = "устарел" if header else "не найден"
+            logger.warning(f"⚠️ Индекс документов {state}, а pypdf не установлен — пересобрать нельзя")
+            return False
+        build_index(self.path)
+        return True
+
+    async def refresh(self) -> None:
+        try:
+            rebuilt = await asyncio.to_thread(self.rebuild_if_stale)
+        except Exception as e:
+            logger.error(f"❌ Не удалось обновить индекс документов: {e}")
+            return
+        if rebuilt:
+            self.close()
+            self._missing = False
+            self.open()
+
+    def text(self, doc_id: int) -> str:
+        start = self._text_start + self._offsets[doc_id]
+        end = self._text_start + self._offsets[doc_id + 1]
+        return self._mmap[start:end].decode("utf-8")
+
+    def search(
+        self,
+        query: str,
+        k: int = RETRIEVAL_TOP_K,
+        min_score: float = RETRIEVAL_MIN_SCORE,
+        min_coverage: float = RETRIEVAL_MIN_COVERAGE,
+    ) -> List[Snippet]:
+        query_terms = set(terms(query))
+        if k <= 0 or not query_terms or not self.open():
+            return []
+        header = self.header
+        n, avgdl = header["docs"], header["avgdl"] or 1.0
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in query_terms:
+            entry = header["vocab"].get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            postings = self._postings[offset * 2:(offset + df) * 2]
+            for i in range(0, len(postings), 2):
+                doc_id, tf = postings[i], postings[i + 1]
+                norm = K1 * (1 - B + B * self._lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+                matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        # Доля слов вопроса, найденных во фрагменте
+        need = min_coverage * len(query_terms)
+        candidates = ((d, s) for d, s in scores.items() if s >= min_score and matched[d] >= need)
+        result = []
+        for doc_id, score in heapq.nlargest(k, candidates, key=lambda item: item[1]):
+            source, page = header["sources"][doc_id]
+            text = self.text(doc_id)
+            if len(text) > SNIPPET_CHARS:
+                text = text[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+            result.append(Snippet(source, page, round(score, 2), text))
+        return result
+
+
+if __name__ == "__main__":
+    build_index()
+    if len(sys.argv) > 1:
+        for snippet in DocumentIndex().search(" ".join(sys.argv[1:]), min_score=0, min_coverage=0):
+            print(f"[{snippet.source}, стр. {snippet.page}] {snippet.score}\n{snippet.text}\n")
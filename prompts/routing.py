@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+# === Маршрутизация между моделями ===
+# Два уровня: fast (дешёвая и быстрая модель) и strong (для сложных вопросов).
+# Конфиг — JSON из MODEL_TIERS_PATH или переменной MODEL_TIERS; файл перечитывается
+# при изменении, так что модели и пороги меняются без правки кода и перезапуска.
+MODEL_TIERS_PATH = os.getenv("MODEL_TIERS_PATH", "models.json")
+RELOAD_CHECK_SECONDS = 5.0
+LATENCY_WINDOW = 200
+# Замеры старше этого не учитываются: уровень, отстранённый из-за всплеска задержек,
+# возвращается, когда всплеск уходит из окна (новых замеров у него без трафика нет)
+LATENCY_MAX_AGE = float(os.getenv("MODEL_LATENCY_MAX_AGE", "300"))
+P95_CACHE_SECONDS = 1.0
+
+DEFAULT_CONFIG = {
+    "tiers": {
+        "fast": {"model": "gpt-4o-mini", "timeout": 15, "max_p95": 8, "price_in": 0.15, "price_out": 0.6},
+        "strong": {"model": "gpt-4o", "timeout": 30, "max_p95": 20, "price_in": 2.5, "price_out": 10},
+    },
+    # Очки сложности, начиная с которых вопрос уходит в strong
+    "strong_score": 2,
+    "long_question_chars": 200,
+    "strong_personas": ["investor"],
+    "complex_words": ["почему", "сравни", "рассчита", "посчита", "объясни", "риск", "налог", "доходност", "окупаемост"],
+}
+
+
+class Tier(NamedTuple):
+    name: str
+    model: str
+    timeout: float
+    max_p95: float
+    price_in: float  # $ за 1M входных токенов
+    price_out: float  # $ за 1M выходных токенов
+
+
+class TierStats:
+    def __init__(self, max_age: float = LATENCY_MAX_AGE):
+        self.max_age = max_age
+        # (time.monotonic(), задержка)
+        self.latencies: Deque[Tuple[float, float]] = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.cost = 0.0
+        self._p95: Optional[Tuple[float, float]] = None  # (когда посчитан, значение)
+
+    def observe(self, latency: float) -> None:
+        self.latencies.append((time.monotonic(), latency))
+        self._p95 = None
+
+    def _expire(self, now: float) -> None:
+        while self.latencies and now - self.latencies[0][0] > self.max_age:
+            self.latencies.popleft()
+
+    def percentile(self, p: float) -> float:
+        self._expire(time.monotonic())
+        if not self.latencies:
+            return 0.0
+        values = sorted(latency for _, latency in self.latencies)
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+    @property
+    def p95(self) -> float:
+        # Пересчёт не чаще раза в секунду, даже без новых замеров — чтобы старые выпадали
+        now = time.monotonic()
+        if self._p95 is None or now - self._p95[0] > P95_CACHE_SECONDS:
+            self._p95 = (now, self.percentile(95))
+        return self._p95[1]
+
+
+def _load_config() -> dict:
+    raw = os.getenv("MODEL_TIERS")
+    if not raw and os.path.exists(MODEL_TIERS_PATH):
+        with open(MODEL_TIERS_PATH, encoding="utf-8") as f:
+            raw = f.read()
+    config = dict(DEFAULT_CONFIG)
+    if raw:
+        config.update(json.loads(raw))
+    return config
+
+
+class ModelRouter:
+    def __init__(self):
+        self.tiers: Dict[str, Tier] = {}
+        self.stats_by_tier: Dict[str, TierStats] = {}
+        self._mtime: Optional[float] = None
+        self._checked = time.monotonic()
+        if os.path.exists(MODEL_TIERS_PATH):
+            self._mtime = os.path.getmtime(MODEL_TIERS_PATH)
+        self.apply(_load_config())
+
+    def apply(self, config: dict) -> None:
+        tiers = {
+            name: Tier(name, t["model"], float(t["timeout"]), float(t["max_p95"]),
+                       float(t.get("price_in", 0)), float(t.get("price_out", 0)))
+            for name, t in config["tiers"].items()
+        }
+        if set(tiers) != {"fast", "strong"}:
+            raise ValueError("❌ В конфиге моделей нужны уровни fast и strong")
+        self.tiers = tiers
+        for name in tiers:
+            self.stats_by_tier.setdefault(name, TierStats())
+        self.strong_score = int(config["strong_score"])
+        self.long_chars = int(config["long_question_chars"])
+        self.strong_personas = set(config["strong_personas"])
+        words = sorted(config["complex_words"], key=len, reverse=True)
+        self.complex_re = re.compile("|".join(map(re.escape, words))) if words else None
+        logger.info("🧭 Модели: " + ", ".join(f"{t.name}={t.model}" for t in tiers.values()))
+
+    def reload(self) -> None:
+        # stat не чаще раза в несколько секунд; битый файл не ломает работающий конфиг
+        now = time.monotonic()
+        if now - self._checked < RELOAD_CHECK_SECONDS:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(MODEL_TIERS_PATH)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            self.apply(_load_config())
+        except Exception as e:
+            logger.error(f"❌ Конфиг моделей не применён: {e}")
+
+    def score(self, question: str, persona: str, history: int = 0) -> int:
+        text = question.lower()
+        score = 0
+        if len(text) > self.long_chars:
+            score += 1
+        if text.count("?") > 1:
+            score += 1
+        if self.complex_re is not None and self.complex_re.search(text):
+            score += 1
+        if persona in self.strong_personas:
+            score += 1
+        if history:
+            score += 1
+        return score
+
+    def choose(self, question: str, persona: str, history: int = 0) -> Tier:
+        self.reload()
+        preferred = "strong" if self.score(question, persona, history) >= self.strong_score else "fast"
+        other = "fast" if preferred == "strong" else "strong"
+        tier = self.tiers[preferred]
+        # Если выбранный уровень сейчас тормозит, а другой в норме — идём в другой
+        if self.stats_by_tier[preferred].p95 > tier.max_p95:
+            alt = self.tiers[other]
+            if self.stats_by_tier[other].p95 <= alt.max_p95:
+                return alt
+        return tier
+
+    def other(self, tier: Tier) -> Tier:
+        return self.tiers["fast" if tier.name == "strong" else "strong"]
+
+    def charge(self, tier: Tier, usage) -> None:
+        if usage is None:
+            return
+        stats = self.stats_by_tier[tier.name]
+        tokens_in = getattr(usage, "prompt_tokens", 0) or 0
+        tokens_out = getattr(usage, "completion_tokens", 0) or 0
+        stats.tokens_in += tokens_in
+        stats.tokens_out += tokens_out
+        stats.cost += (tokens_in * tier.price_in + tokens_out * tier.price_out) / 1_000_000
+
+    async def complete(
+        self,
+        tier: Tier,
+        request: Callable[[Tier], Awaitable[T]],
+        timeout: bool = True,
+        can_retry: Callable[[], bool] = lambda: True,
+        on_timeout: Optional[Callable[[Tier, Exception], None]] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        # Запрос в выбранный уровень; при таймауте или ошибке — один повтор в другом.
+        # deadline (time.monotonic()) ограничивает обе попытки вместе
+        attempts: List[Tier] = [tier, self.other(tier)]
+        for i, current in enumerate(attempts):
+            limit = current.timeout
+            if deadline is not None:
+                limit = min(limit, deadline - time.monotonic())
+                if limit <= 0:
+                    raise asyncio.TimeoutError()
+            stats = self.stats_by_tier[current.name]
+            stats.calls += 1
+            started = time.monotonic()
+            try:
+                if timeout:
+                    result = await asyncio.wait_for(request(current), limit)
+                else:
+                    result = await request(current)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Таймаут тоже попадает в окно задержек, иначе зависший уровень выглядел бы быстрым
+                stats.observe(time.monotonic() - started)
+                if isinstance(e, asyncio.TimeoutError):
+                    stats.timeouts += 1
+                    if on_timeout is not None:
+                        on_timeout(current, e)
+                else:
+                    stats.errors += 1
+                if i + 1 == len(attempts) or not can_retry():
+                    raise
+                stats.fallbacks += 1
+                logger.warning(f"↪️ {current.model} не ответила ({type(e).__name__}), пробуем {attempts[i + 1].model}")
+                continue
+            stats.observe(time.monotonic() - started)
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        result: Dict[str, float] = {}
+        for name, s in self.stats_by_tier.items():
+            result.update({
+                f"{name}_calls": s.calls,
+                f"{name}_errors": s.errors,
+                f"{name}_timeouts": s.timeouts,
+                f"{name}_fallbacks": s.fallbacks,
+                f"{name}_p50_ms": round(s.percentile(50) * 1000, 1),
+                f"{name}_p95_ms": round(s.p95 * 1000, 1),
+                f"{name}_tokens_in": s.tokens_in,
+                f"{name}_tokens_out": s.tokens_out,
+                f"{name}_cost_usd": round(s.cost, 6),
+            })
+        return result
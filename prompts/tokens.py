@@ -0,0 +1,48 @@
+import math
+import os
+
+from loguru import logger
+
+# === Подсчёт токенов ===
+# Точный счёт через tiktoken, если он установлен (pip install tiktoken).
+# Без него — оценка по байтам UTF-8: на кириллице она слегка завышает,
+# для бюджета это безопасная сторона.
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+BYTES_PER_TOKEN = 4
+# Бюджет на весь запрос: системный промпт, история, выдержки и вопрос
+GPT_MAX_INPUT_TOKENS = int(os.getenv("GPT_MAX_INPUT_TOKENS", "3000"))
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+except Exception:
+    _encoding = None
+    logger.info("ℹ️ tiktoken недоступен — токены считаются приблизительно")
+
+# Служебные токены на каждое сообщение и на начало ответа (формат chat completions)
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def count_messages(messages) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages) + REPLY_OVERHEAD
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens])
+    # Обрезаем по байтам и не оставляем половину многобайтового символа
+    return text.encode("utf-8")[: max_tokens * BYTES_PER_TOKEN].decode("utf-8", errors="ignore")
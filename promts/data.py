@@ -1,54 +0,0 @@
-FAQ_AGENT = {
-    "обременени": "🔐 Обременение (ипотека) будет полностью погашено до выхода на сделку.",
-    "аренд": "📄 Арендатор — *ООО «Ваш Дом»*. ФСИН использует помещение в рамках соглашения об исправительном центре.",
-    "фсин": (
-        "👥 УФИЦ — женский исправительный центр, функционирующий в здании, переданном ФСИН в безвозмездное пользование. "
-        "Фактическая эксплуатация — без прямой аренды."
-    ),
-    "оценка": "📈 Независимая рыночная оценка уже получена. Готовы выслать файл."
-}
-
-FAQ_INVESTOR = {
-    "доход": "💰 Объект приносит стабильный доход благодаря аренде ФСИН.",
-    "безопасност": "🛡 Полный контроль доступа, круглосуточное наблюдение.",
-    "фсин": "🏩 Арендатор — государственная структура. Это снижает риски.",
-    "окупа": "📈 Объект с окупаемостью ниже 8 лет. Можем выслать расчёты."
-}
-
-FILE_HINTS = {
-    "оценка": "📈 Есть PDF с оценкой. Вышлем, если интересно.",
-    "сп 308": "📘 СП 308.13330.2012 можем отправить по запросу.",
-    "техплан": "📐 Есть техплан. Пришлём по запросу."
-}
-
-CTA_AGENT = [
-    "📎 Пришлю КП, оценку и техплан — напишите, если актуально.",
-    "📅 Есть пакет документов — если у вас клиент, всё отправлю."
-]
-
-CTA_INVESTOR = [
-    "📩 Отправим материалы и техплан — просто напишите.",
-    "📈 Могу выслать оценку и КП — стоит ли показать?"
-]
-
-FOLLOWUP_AGENT = [
-    "📬 Ваш клиент готов смотреть объект?",
-    "📞 С кем обсудить условия? Готов выйти на связь."
-]
-
-FOLLOWUP_INVESTOR = [
-    "📎 Хотите посмотреть техплан и оценку?",
-    "📈 Рассматриваете покупку в ближайшее время?"
-]
-
-STYLE_PROMPT_AGENT = (
-    "Ты — Telegram-бот, помогающий агентам продавать объект."
-    " Предлагай КП, техплан и оценку, акцентируя выгоды для клиента."
-    " Отвечай деловым языком, завершай вопросом."
-)
-
-STYLE_PROMPT_INVESTOR = (
-    "Ты — Telegram-ассистент для инвестора."
-    " Объясни доходность, безопасность, стабильность арендатора (ФСИН)."
-    " Отвечай кратко, уверенно и завершай вопросом."
-)
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+# === Настройки ===
+QUESTION_LOG_PATH = Path(os.getenv("QUESTION_LOG_PATH", "logs/questions.jsonl"))
+QUESTION_LOG_MAX_BYTES = int(os.getenv("QUESTION_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+QUESTION_LOG_ROTATE_SECONDS = int(os.getenv("QUESTION_LOG_ROTATE_SECONDS", "86400"))
+QUESTION_LOG_BACKUPS = int(os.getenv("QUESTION_LOG_BACKUPS", "7"))
+
+
+# === Неблокирующий журнал вопросов ===
+# Обработчики только кладут запись в очередь; фоновая задача пишет пачками
+# в отдельном потоке. Если очередь переполнена — запись отбрасывается.
+class QuestionLog:
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = QUESTION_LOG_MAX_BYTES,
+        rotate_seconds: int = QUESTION_LOG_ROTATE_SECONDS,
+        backups: int = QUESTION_LOG_BACKUPS,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.written = 0
+        self.dropped = 0
+
+    def log(self, user_id, question: str, persona: str, faq_hit: bool, latency: float) -> None:
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "user_id": user_id,
+            "persona": persona,
+            "faq_hit": faq_hit,
+            "latency_ms": round(latency * 1000, 1),
+            "question": question,
+        }
+        if self._task is None and not self._closing:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="question-log")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if self._task is None:
+            return
+        # Писатель сам допишет очередь до конца и завершится
+        self._closing = True
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Журнал вопросов не успел дописаться: {self._queue.qsize()} записей")
+        self._task = None
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                if deadline is None:
+                    item = await self._queue.get()
+                    deadline = time.monotonic() + self.flush_interval
+                elif self._closing:
+                    if self._queue.empty():
+                        break
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    break
+                batch.append(item)
+            if not batch:
+                continue
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.error(f"❌ Не удалось записать журнал вопросов: {e}")
+
+    def _write(self, batch: List[dict]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch).encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._maybe_rotate(len(data))
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self.written += len(batch)
+
+    def _maybe_rotate(self, incoming: int) -> None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+        if not st.st_size:
+            return
+        # По времени ротируем на границе периода (для суток — в полночь UTC),
+        # поэтому рестарты процесса расписание не сбивают
+        period = self.rotate_seconds
+        too_old = period > 0 and int(st.st_mtime // period) != int(time.time() // period)
+        too_big = st.st_size + incoming > self.max_bytes
+        if not (too_big or too_old):
+            return
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        try:
+            os.replace(self.path, self.path.with_name(f"{self.path.stem}-{stamp}{self.path.suffix}"))
+        except FileNotFoundError:
+            # Другой воркер ротировал журнал раньше нас — пишем в его новый файл
+            return
+
+        old = sorted(self.path.parent.glob(f"{self.path.stem}-*{self.path.suffix}"))
+        for stale in old[: max(0, len(old) - self.backups)]:
+            stale.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+question_log = QuestionLog(QUESTION_LOG_PATH)
@@ -0,0 +1,253 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from storage import SQLiteDB, redis_url, shared_db
+
+# === Квоты на вопросы к GPT ===
+# Ведро на пользователя и общее ведро — отдельно по запросам и по токенам (в минуту).
+# 0 отключает соответствующее ведро. Ёмкость — запас на короткий всплеск.
+QUOTA_USER_RPM = float(os.getenv("QUOTA_USER_RPM", "6"))
+QUOTA_USER_BURST = float(os.getenv("QUOTA_USER_BURST", "10"))
+QUOTA_USER_TPM = float(os.getenv("QUOTA_USER_TPM", "4000"))
+QUOTA_USER_TOKEN_BURST = float(os.getenv("QUOTA_USER_TOKEN_BURST", "12000"))
+QUOTA_GLOBAL_RPM = float(os.getenv("QUOTA_GLOBAL_RPM", "300"))
+QUOTA_GLOBAL_TPM = float(os.getenv("QUOTA_GLOBAL_TPM", "150000"))
+QUOTA_MAX_BUCKETS = int(os.getenv("QUOTA_MAX_BUCKETS", "50000"))
+# Ведро, к которому не обращались столько секунд, заведомо полное — его можно забыть
+QUOTA_IDLE_SECONDS = float(os.getenv("QUOTA_IDLE_SECONDS", "3600"))
+
+USER, GLOBAL = "user", "global"
+
+# ключ -> (скорость в секунду, ёмкость)
+Limits = Dict[str, Tuple[float, float]]
+# ключ -> (токены, время обновления)
+State = Dict[str, Tuple[float, float]]
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, scope: str, key: str):
+        super().__init__(f"квота {scope} исчерпана ({key})")
+        self.scope = scope
+        self.key = key
+
+
+def refill(state: Optional[Tuple[float, float]], rate: float, capacity: float, now: float) -> float:
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def apply(state: State, limits: Limits, costs: Dict[str, float], need: Dict[str, float], now: float):
+    # Атомарная проверка нескольких вёдер: или списываем со всех, или ни с одного.
+    # need — сколько должно быть в ведре для пропуска, costs — сколько списать.
+    # Возвращает (ключ исчерпанного ведра или None, новое состояние)
+    tokens = {key: refill(state.get(key), rate, capacity, now) for key, (rate, capacity) in limits.items()}
+    for key, amount in need.items():
+        if key in tokens and tokens[key] < min(amount, limits[key][1]):
+            return key, {}
+    return None, {key: (tokens[key] - costs.get(key, 0.0), now) for key in tokens}
+
+
+# === Хранилища вёдер ===
+# В памяти процесса (LRU с вытеснением) или, если настроено, в общем хранилище —
+# тогда квоты общие для всех воркеров.
+class MemoryBuckets:
+    def __init__(self, max_buckets: int = QUOTA_MAX_BUCKETS, idle: float = QUOTA_IDLE_SECONDS):
+        self.max_buckets = max_buckets
+        self.idle = idle
+        self._state: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.evicted = 0
+
+    async def update(self, limits: Limits, costs: Dict[str, float], need: Dict[str, float]) -> Optional[str]:
+        now = time.time()
+        failed, changed = apply({k: self._state[k] for k in limits if k in self._state}, limits, costs, need, now)
+        for key, value in changed.items():
+            self._state[key] = value
+            self._state.move_to_end(key)
+        self._evict(now)
+        return failed
+
+    def _evict(self, now: float) -> None:
+        while self._state:
+            key, (_, updated) = next(iter(self._state.items()))
+            if len(self._state) <= self.max_buckets and now - updated < self.idle:
+                break
+            del self._state[key]
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+
+class SQLiteBuckets:
+    def __init__(self, db: SQLiteDB, idle: float = QUOTA_IDLE_SECONDS):
+        self.db = db
+        self.idle = idle
+        self._last_purge = 0.0
+        db.call(lambda c: c.execute(
+            "CREATE TABLE IF NOT EXISTS quota_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        ))
+
+    async def update(self, limits: Limits, costs: Dict[str, float], need: Dict[str, float]) -> Optional[str]:
+        keys = list(limits)
+
+        def run(c) -> Optional[str]:
+            now = time.time()
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                rows = c.execute(
+                    f"SELECT key, tokens, updated FROM quota_buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+                ).fetchall()
+                failed, changed = apply({k: (t, u) for k, t, u in rows}, limits, costs, need, now)
+                c.executemany(
+                    "INSERT OR REPLACE INTO quota_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(k, t, u) for k, (t, u) in changed.items()],
+                )
+                if now - self._last_purge > 300:
+                    self._last_purge = now
+                    c.execute("DELETE FROM quota_buckets WHERE updated < ?", (now - self.idle,))
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+            return failed
+
+        return await self.db.run(run)
+
+
+# Та же логика, что в apply(), одним скриптом — атомарно для всех воркеров
+_REDIS_APPLY = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+for i, key in ipairs(KEYS) do
+  local base = 1 + (i - 1) * 4
+  local rate, capacity = tonumber(ARGV[base + 1]), tonumber(ARGV[base + 2])
+  local state = redis.call('hmget', key, 't', 'u')
+  local t = capacity
+  if state[1] then
+    t = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+  end
+  tokens[i] = t
+  local need = tonumber(ARGV[base + 4])
+  if need >= 0 and t < math.min(need, capacity) then return key end
+end
+for i, key in ipairs(KEYS) do
+  local base = 1 + (i - 1) * 4
+  local rate, capacity, cost = tonumber(ARGV[base + 1]), tonumber(ARGV[base + 2]), tonumber(ARGV[base + 3])
+  redis.call('hset', key, 't', tostring(tokens[i] - cost), 'u', tostring(now))
+  redis.call('pexpire', key, math.ceil(ARGV[#ARGV] * 1000))
+end
+return false
+"""
+
+
+class RedisBuckets:
+    def __init__(self, url: str, idle: float = QUOTA_IDLE_SECONDS):
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(url)
+        self.idle = idle
+
+    async def update(self, limits: Limits, costs: Dict[str, float], need: Dict[str, float]) -> Optional[str]:
+        keys = list(limits)
+        args: List[float] = [time.time()]
+        for key in keys:
+            rate, capacity = limits[key]
+            args += [rate, capacity, costs.get(key, 0.0), need.get(key, -1)]
+        args.append(self.idle)
+        failed = await self._redis.eval(_REDIS_APPLY, len(keys), *(f"quota:{k}" for k in keys), *args)
+        if not failed:
+            return None
+        failed = failed.decode() if isinstance(failed, bytes) else failed
+        return failed[len("quota:"):]
+
+
+class Quota:
+    def __init__(
+        self,
+        user_rpm: float = QUOTA_USER_RPM,
+        user_burst: float = QUOTA_USER_BURST,
+        user_tpm: float = QUOTA_USER_TPM,
+        user_token_burst: float = QUOTA_USER_TOKEN_BURST,
+        global_rpm: float = QUOTA_GLOBAL_RPM,
+        global_tpm: float = QUOTA_GLOBAL_TPM,
+    ):
+        self.user_requests = (user_rpm / 60, user_burst) if user_rpm > 0 else None
+        self.user_tokens = (user_tpm / 60, user_token_burst) if user_tpm > 0 else None
+        # Общие вёдра вмещают минуту лимита
+        self.global_requests = (global_rpm / 60, global_rpm) if global_rpm > 0 else None
+        self.global_tokens = (global_tpm / 60, global_tpm) if global_tpm > 0 else None
+        self.memory = MemoryBuckets()
+        self.shared = None
+        db = shared_db()
+        if db is not None:
+            self.shared = SQLiteBuckets(db)
+        elif redis_url():
+            self.shared = RedisBuckets(redis_url())
+        self.allowed = 0
+        self.limited = {USER: 0, GLOBAL: 0}
+        self.shared_errors = 0
+
+    def _limits(self, user_id) -> Tuple[Limits, Limits]:
+        requests: Limits = {}
+        tokens: Limits = {}
+        if user_id:
+            if self.user_requests:
+                requests[f"u:{user_id}:req"] = self.user_requests
+            if self.user_tokens:
+                tokens[f"u:{user_id}:tok"] = self.user_tokens
+        if self.global_requests:
+            requests["g:req"] = self.global_requests
+        if self.global_tokens:
+            tokens["g:tok"] = self.global_tokens
+        return requests, tokens
+
+    async def _update(self, limits: Limits, costs: Dict[str, float], need: Dict[str, float]) -> Optional[str]:
+        if not limits:
+            return None
+        if self.shared is not None:
+            try:
+                return await self.shared.update(limits, costs, need)
+            except Exception as e:
+                # Общее хранилище недоступно — считаем в памяти процесса, а не режем всех
+                self.shared_errors += 1
+                logger.warning(f"⚠️ Квоты через хранилище недоступны: {e}")
+        return await self.memory.update(limits, costs, need)
+
+    async def acquire(self, user_id, tokens: float) -> None:
+        # Перед запросом к GPT: списывается один запрос, а на токены — только проверка,
+        # что в ведре есть запас на оценку запроса. Фактические токены списывает spend()
+        requests, token_limits = self._limits(user_id)
+        costs = {key: 1.0 for key in requests}
+        need = {**costs, **{key: tokens for key in token_limits}}
+        failed = await self._update({**requests, **token_limits}, costs, need)
+        if failed is None:
+            self.allowed += 1
+            return
+        scope = GLOBAL if failed.startswith("g:") else USER
+        self.limited[scope] += 1
+        raise QuotaExceeded(scope, failed)
+
+    async def spend(self, user_id, tokens: float) -> None:
+        # Ведро может уйти в минус: следующий вопрос подождёт, пока долг не погасится
+        _, token_limits = self._limits(user_id)
+        if tokens > 0:
+            await self._update(token_limits, {key: tokens for key in token_limits}, {})
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "limited_user": self.limited[USER],
+            "limited_global": self.limited[GLOBAL],
+            "memory_buckets": len(self.memory),
+            "evicted": self.memory.evicted,
+            "shared_errors": self.shared_errors,
+        }
+
+
+quota = Quota()
@@ -0,0 +1,263 @@
+import asyncio
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendDocument, SendMediaGroup, SendPhoto, SendVideo, TelegramMethod
+from loguru import logger
+
+import tracing
+
+# === Приоритеты ===
+HIGH, NORMAL, BULK = 0, 1, 2
+BULK_METHODS = (SendMediaGroup, SendDocument, SendPhoto, SendVideo)
+
+# === Лимиты Telegram (с запасом) ===
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "25"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = float(os.getenv("TG_CHAT_BURST", "3"))
+TG_GROUP_RATE = float(os.getenv("TG_GROUP_RATE", str(20 / 60)))
+TG_GROUP_BURST = float(os.getenv("TG_GROUP_BURST", "5"))
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "3"))
+
+ChatId = Union[int, str]
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        self._refill(now)
+        # Запрос дороже ёмкости ждёт полного ведра и уводит баланс в минус
+        need = min(cost, self.capacity)
+        return 0.0 if self.tokens >= need else (need - self.tokens) / self.rate
+
+    def take(self, cost: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= cost
+
+    def penalize(self, seconds: float, now: float) -> None:
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "chat_id", "cost", "future")
+
+    def __init__(self, priority: int, seq: int, chat_id: ChatId, cost: float, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.cost = cost
+        self.future = future
+
+
+# === Ограничитель исходящих запросов ===
+# Подключается middleware к сессии Bot, поэтому через него идут все
+# answer/answer_document/answer_media_group/send_message/edit_text.
+# Три вида вёдер: общее, на чат и дополнительное на группу. Очередь ожидания
+# разбита по приоритетам: заявки в TG_CHAT_LEAD — HIGH, альбомы и документы — BULK.
+# Общие токены всегда достаются самому приоритетному готовому запросу.
+class OutboundLimiter(BaseRequestMiddleware):
+    def __init__(
+        self,
+        lead_chat_id: Optional[ChatId] = None,
+        global_rate: float = TG_GLOBAL_RATE,
+        chat_rate: float = TG_CHAT_RATE,
+        chat_burst: float = TG_CHAT_BURST,
+        group_rate: float = TG_GROUP_RATE,
+        group_burst: float = TG_GROUP_BURST,
+        max_retries: int = TG_MAX_RETRIES,
+    ):
+        self.lead_chat_id = lead_chat_id
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[ChatId, TokenBucket] = {}
+        self._groups: Dict[ChatId, TokenBucket] = {}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_gc = time.monotonic()
+        self.retries = 0
+        self.waited = 0
+
+    # --- middleware ---
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Any,
+        method: TelegramMethod,
+    ) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = self.priority(chat_id, method)
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, priority, cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    f"⏳ Telegram просит подождать {e.retry_after} с "
+                    f"({type(method).__name__} → {chat_id}), попытка {attempt}"
+                )
+                self.penalize(chat_id, e.retry_after)
+
+    def priority(self, chat_id: ChatId, method: TelegramMethod) -> int:
+        if self.lead_chat_id is not None and chat_id == self.lead_chat_id:
+            return HIGH
+        if isinstance(method, BULK_METHODS):
+            return BULK
+        return NORMAL
+
+    # --- вёдра ---
+    @staticmethod
+    def _is_group(chat_id: ChatId) -> bool:
+        return isinstance(chat_id, str) or chat_id < 0
+
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _group_bucket(self, chat_id: ChatId) -> Optional[TokenBucket]:
+        if not self._is_group(chat_id):
+            return None
+        bucket = self._groups.get(chat_id)
+        if bucket is None:
+            bucket = self._groups[chat_id] = TokenBucket(self.group_rate, self.group_burst)
+        return bucket
+
+    # Ведро личного чата списывает 1 за вызов (альбом — одно сообщение для пользователя),
+    # общее и групповое — по числу элементов
+    def _chat_wait(self, chat_id: ChatId, cost: float, now: float) -> float:
+        wait = self._chat_bucket(chat_id).wait_time(1, now)
+        group = self._group_bucket(chat_id)
+        if group is not None:
+            wait = max(wait, group.wait_time(cost, now))
+        return wait
+
+    def _take(self, chat_id: ChatId, cost: float, now: float) -> None:
+        self._global.take(cost, now)
+        self._chat_bucket(chat_id).take(1, now)
+        group = self._group_bucket(chat_id)
+        if group is not None:
+            group.take(cost, now)
+
+    def penalize(self, chat_id: ChatId, seconds: float) -> None:
+        now = time.monotonic()
+        self._chat_bucket(chat_id).penalize(seconds, now)
+        group = self._group_bucket(chat_id)
+        if group is not None:
+            group.penalize(seconds, now)
+
+    # --- очередь ожидания ---
+    async def acquire(self, chat_id: ChatId, priority: int = NORMAL, cost: float = 1) -> None:
+        now = time.monotonic()
+        self._gc()
+        # Быстрый путь: никто не ждёт и все вёдра готовы
+        if (
+            not self._waiters
+            and self._chat_wait(chat_id, cost, now) == 0
+            and self._global.wait_time(cost, now) == 0
+        ):
+            self._take(chat_id, cost, now)
+            return
+
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="outbound-limiter")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(_Waiter(priority, next(self._seq), chat_id, cost, future))
+        self._wake.set()
+        self.waited += 1
+        with tracing.span("ratelimit", priority=priority):
+            await future
+
+    async def _run(self) -> None:
+        while True:
+            self._waiters = [w for w in self._waiters if not w.future.done()]
+            if not self._waiters:
+                self._gc()
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            now = time.monotonic()
+            next_wake = 1.0
+            granted = False
+            for w in sorted(self._waiters, key=lambda w: (w.priority, w.seq)):
+                chat_wait = self._chat_wait(w.chat_id, w.cost, now)
+                if chat_wait > 0:
+                    next_wake = min(next_wake, chat_wait)
+                    continue
+                global_wait = self._global.wait_time(w.cost, now)
+                if global_wait > 0:
+                    # Менее приоритетные запросы не обгоняют этот за общими токенами
+                    next_wake = min(next_wake, global_wait)
+                    break
+                self._take(w.chat_id, w.cost, now)
+                w.future.set_result(None)
+                granted = True
+                break
+
+            if granted:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), next_wake)
+            except asyncio.TimeoutError:
+                pass
+
+    def _gc(self) -> None:
+        now = time.monotonic()
+        if now - self._last_gc < 60:
+            return
+        self._last_gc = now
+        for buckets in (self._chats, self._groups):
+            for chat_id in [c for c, b in buckets.items() if b.idle(now)]:
+                del buckets[chat_id]
+
+    def stats(self) -> Dict[str, int]:
+        lanes = {HIGH: 0, NORMAL: 0, BULK: 0}
+        for w in self._waiters:
+            if not w.future.done():
+                lanes[w.priority] += 1
+        return {
+            "waiting_high": lanes[HIGH],
+            "waiting_normal": lanes[NORMAL],
+            "waiting_bulk": lanes[BULK],
+            "chats": len(self._chats),
+            "waited_total": self.waited,
+            "retries": self.retries,
+        }
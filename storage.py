@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from loguru import logger
+
+import tracing
+
+# === Настройки ===
+# sqlite:///data/state.db — общий файл для всех воркеров на одной машине (WAL)
+# redis://host:6379/0     — общий Redis для нескольких машин (нужен пакет redis)
+# memory://               — только для одного процесса
+SHARED_STORAGE_URL = os.getenv("SHARED_STORAGE_URL", "sqlite:///data/state.db")
+FSM_TTL = int(os.getenv("FSM_TTL", "86400"))
+
+T = TypeVar("T")
+
+
+# === SQLite в отдельном потоке ===
+# Одно соединение на процесс; запросы выполняются в пуле потоков под замком,
+# чтобы не блокировать event loop. WAL позволяет читать и писать из разных процессов.
+class SQLiteDB:
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        with self._lock:
+            return fn(self._conn)
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        # В трассировке — вместе с ожиданием замка и свободного потока
+        with tracing.span("sqlite"):
+            return await asyncio.to_thread(self.call, fn)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_databases: Dict[str, SQLiteDB] = {}
+
+
+def sqlite_path(url: str = SHARED_STORAGE_URL) -> Optional[str]:
+    return url[len("sqlite:///"):] if url.startswith("sqlite:///") else None
+
+
+def redis_url(url: str = SHARED_STORAGE_URL) -> Optional[str]:
+    return url if url.startswith(("redis://", "rediss://")) else None
+
+
+def open_db(path: str) -> SQLiteDB:
+    # Одно соединение на файл в процессе; закрываются все вместе в close_shared()
+    db = _databases.get(path)
+    if db is None:
+        db = _databases[path] = SQLiteDB(path)
+    return db
+
+
+def shared_db() -> Optional[SQLiteDB]:
+    # Общая SQLite-база процесса, если хранилище настроено на SQLite
+    path = sqlite_path()
+    return open_db(path) if path is not None else None
+
+
+# === FSM-хранилище в SQLite ===
+class SQLiteStorage(BaseStorage):
+    def __init__(self, db: SQLiteDB, ttl: int = FSM_TTL, key_builder: Optional[KeyBuilder] = None):
+        self.db = db
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._last_purge = 0.0
+        db.call(lambda c: c.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', expires REAL NOT NULL)"
+        ))
+
+    async def _maybe_purge(self) -> None:
+        # Брошенные анкеты удаляются по TTL
+        now = time.time()
+        if now - self._last_purge < 300:
+            return
+        self._last_purge = now
+        deleted = await self.db.run(lambda c: c.execute("DELETE FROM fsm WHERE expires < ?", (now,)).rowcount)
+        if deleted:
+            logger.info(f"🧹 Удалено просроченных FSM-записей: {deleted}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self.key_builder.build(key)
+        value = state.state if isinstance(state, State) else state
+        now = time.time()
+        expires = now + self.ttl
+        # Просроченная, но ещё не удалённая запись считается отсутствующей: её данные
+        # не должны пережить TTL и попасть в новую анкету
+        await self.db.run(lambda c: c.execute(
+            "INSERT INTO fsm (key, state, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+            "data = CASE WHEN fsm.expires < ? THEN '{}' ELSE fsm.data END, expires = excluded.expires",
+            (k, value, expires, now),
+        ))
+        await self._maybe_purge()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        k = self.key_builder.build(key)
+        row = await self.db.run(lambda c: c.execute(
+            "SELECT state FROM fsm WHERE key = ? AND expires >= ?", (k, time.time())
+        ).fetchone())
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self.key_builder.build(key)
+        payload = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        expires = now + self.ttl
+        await self.db.run(lambda c: c.execute(
+            "INSERT INTO fsm (key, data, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data, "
+            "state = CASE WHEN fsm.expires < ? THEN NULL ELSE fsm.state END, expires = excluded.expires",
+            (k, payload, expires, now),
+        ))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        k = self.key_builder.build(key)
+        row = await self.db.run(lambda c: c.execute(
+            "SELECT data FROM fsm WHERE key = ? AND expires >= ?", (k, time.time())
+        ).fetchone())
+        return json.loads(row[0]) if row else {}
+
+    async def close(self) -> None:
+        pass
+
+
+def build_storage() -> BaseStorage:
+    if redis_url():
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        logger.info("🗄 FSM-хранилище: Redis")
+        return RedisStorage.from_url(redis_url(), state_ttl=FSM_TTL, data_ttl=FSM_TTL)
+    db = shared_db()
+    if db is not None:
+        logger.info(f"🗄 FSM-хранилище: SQLite ({db.path})")
+        return SQLiteStorage(db)
+    logger.warning("⚠️ FSM-хранилище в памяти — запускайте только один воркер")
+    return MemoryStorage()
+
+
+def close_shared() -> None:
+    for db in _databases.values():
+        db.close()
+    _databases.clear()
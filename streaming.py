@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from contextlib import suppress
+from typing import AsyncIterator, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+from loguru import logger
+
+# Telegram спокойно переносит ~1 правку в секунду в личке и ~20 в минуту в группе
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_EDIT_INTERVAL_GROUP = float(os.getenv("STREAM_EDIT_INTERVAL_GROUP", "3.0"))
+# Ответ, который готов сразу (FAQ, кэш, квота, предохранитель), приходит одним куском
+# за это время — он уходит одним сообщением, без заготовки и правки
+STREAM_READY_MS = float(os.getenv("STREAM_READY_MS", "50"))
+PLACEHOLDER = "⏳ Готовлю ответ..."
+CURSOR = " ▌"
+MAX_LEN = 4096
+
+
+async def _edit(message: Message, text: str, parse_mode: Optional[str]) -> bool:
+    try:
+        await message.edit_text(text, parse_mode=parse_mode)
+        return True
+    except TelegramBadRequest as e:
+        if "not modified" in str(e):
+            return True
+        if parse_mode is not None:
+            # Незакрытая разметка и т.п. — повторим простым текстом
+            logger.warning(f"⚠️ Markdown не принят, отправляем как текст: {e}")
+            return await _edit(message, text, None)
+        raise
+
+
+async def _answer(msg: Message, text: str, parse_mode: Optional[str]) -> Message:
+    try:
+        return await msg.answer(text, parse_mode=parse_mode)
+    except TelegramBadRequest as e:
+        if parse_mode is None:
+            raise
+        logger.warning(f"⚠️ Markdown не принят, отправляем как текст: {e}")
+        return await _answer(msg, text, None)
+
+
+async def _pump(chunks: AsyncIterator[str], queue: asyncio.Queue) -> None:
+    # Генератор ответа целиком идёт в своей задаче, а stream_reply читает очередь
+    # с таймаутом, не прерывая сам генератор. В конце — None или исключение
+    try:
+        async for chunk in chunks:
+            queue.put_nowait(chunk)
+    except Exception as e:
+        queue.put_nowait(e)
+    else:
+        queue.put_nowait(None)
+
+
+async def _next(queue: asyncio.Queue, timeout: Optional[float] = None) -> Optional[str]:
+    item = await (queue.get() if timeout is None else asyncio.wait_for(queue.get(), timeout))
+    if isinstance(item, Exception):
+        raise item
+    return item
+
+
+async def stream_reply(msg: Message, chunks: AsyncIterator[str], suffix: str = "") -> Message:
+    queue: asyncio.Queue = asyncio.Queue()
+    pump = asyncio.create_task(_pump(chunks, queue))
+    placeholder = None
+    try:
+        # Готовый ответ: первый кусок пришёл сразу, и за ним поток закончился
+        ready: List[Optional[str]] = []
+        wait = STREAM_READY_MS / 1000
+        try:
+            ready.append(await _next(queue, wait))
+            if ready[0] is not None:
+                ready.append(await _next(queue, wait))
+        except asyncio.TimeoutError:
+            pass
+        if ready and ready[-1] is None:
+            return await _send(msg, "".join(ready[:-1]).strip() + suffix)
+
+        placeholder = await msg.answer(PLACEHOLDER, parse_mode=None)
+        interval = STREAM_EDIT_INTERVAL_GROUP if msg.chat.id < 0 else STREAM_EDIT_INTERVAL
+        text = "".join(ready)
+        shown = ""
+        last_edit = time.monotonic()
+        while (chunk := await _next(queue)) is not None:
+            text += chunk
+            now = time.monotonic()
+            if now - last_edit >= interval and text.strip() and text != shown:
+                # Промежуточные правки — без разметки: Markdown может быть оборван на середине
+                partial = text.strip()[: MAX_LEN - len(CURSOR)] + CURSOR
+                await _edit(placeholder, partial, None)
+                shown = text
+                last_edit = now
+    except asyncio.CancelledError:
+        # Ответ вытеснен новым сообщением — убираем недописанную заготовку
+        if placeholder is not None:
+            with suppress(Exception):
+                await placeholder.delete()
+        raise
+    finally:
+        if not pump.done():
+            pump.cancel()
+
+    final = text.strip() + suffix
+    head, tail = final[:MAX_LEN], final[MAX_LEN:]
+    await _edit(placeholder, head, "Markdown")
+    await _send_tail(msg, tail)
+    return placeholder
+
+
+async def _send(msg: Message, text: str) -> Message:
+    sent = await _answer(msg, text[:MAX_LEN], "Markdown")
+    await _send_tail(msg, text[MAX_LEN:])
+    return sent
+
+
+async def _send_tail(msg: Message, tail: str) -> None:
+    while tail:
+        await msg.answer(tail[:MAX_LEN], parse_mode=None)
+        tail = tail[MAX_LEN:]
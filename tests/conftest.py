@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# Модули читают окружение при импорте: без общего файла data/state.db и без ключей
+os.environ.setdefault("SHARED_STORAGE_URL", "memory://")
+os.chdir(ROOT)
@@ -0,0 +1,26 @@
+import io
+import json
+
+from PIL import Image
+
+import assets
+
+
+def test_photo_variant_and_manifest_are_written_whole(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "VARIANTS_DIR", tmp_path / "images")
+    monkeypatch.setattr(assets, "MANIFEST_PATH", tmp_path / "assets.json")
+    source = tmp_path / "plot.png"
+    out = io.BytesIO()
+    Image.effect_noise((2000, 1500), 64).convert("RGB").save(out, "PNG")
+    source.write_bytes(out.getvalue())
+
+    first = assets._photo(source)
+    assert first.path.parent == tmp_path / "images"
+    assert first.size < source.stat().st_size
+    # Второй раз вариант берётся с диска
+    assert assets._photo(source) == first
+
+    assets.save_manifests({"plot": assets.Manifest([], [first], ())})
+    saved = json.loads((tmp_path / "assets.json").read_text(encoding="utf-8"))
+    assert saved["plot"]["photos"][0]["sha256"] == first.sha256
+    assert not list(tmp_path.rglob("*.tmp"))
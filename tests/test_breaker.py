@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from prompts import breaker
+from prompts.breaker import CLOSED, HALF_OPEN, OPEN, BreakerOpen, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_opens_after_failures_within_window(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker.time, "monotonic", clock)
+    cb = CircuitBreaker("test", failures=3, window=60, open_seconds=30)
+    cb.failure(TimeoutError())
+    cb.failure(TimeoutError())
+    # Старые ошибки выпадают из окна и не считаются
+    clock.now += 61
+    cb.failure(TimeoutError())
+    assert cb.state == CLOSED
+    cb.failure(TimeoutError())
+    cb.failure(TimeoutError())
+    assert cb.state == OPEN
+    assert not cb.allow()
+    assert cb.stats()["rejected"] == 1
+
+
+def test_half_open_probe_closes_or_reopens(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker.time, "monotonic", clock)
+    cb = CircuitBreaker("test", failures=1, window=60, open_seconds=30)
+    cb.failure(TimeoutError())
+    assert cb.state == OPEN
+
+    clock.now += 30
+    assert cb.allow()
+    assert cb.state == HALF_OPEN
+    cb.failure(TimeoutError())
+    assert cb.state == OPEN
+
+    clock.now += 30
+    assert cb.allow()
+    cb.success()
+    assert cb.state == CLOSED
+    assert cb.transitions == {CLOSED: 1, HALF_OPEN: 2, OPEN: 2}
+
+
+def test_call_limits_probes_and_ignores_cancellation():
+    cb = CircuitBreaker("test", failures=1, window=60, open_seconds=0, probes=1)
+
+    async def fail():
+        raise RuntimeError("500")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cb.call(fail)
+        assert cb.state == OPEN
+
+        gate = asyncio.Event()
+
+        async def probe():
+            await gate.wait()
+            return "ok"
+
+        first = asyncio.create_task(cb.call(probe))
+        await asyncio.sleep(0)
+        assert cb.state == HALF_OPEN
+        # Пока идёт пробный запрос, остальные сразу получают отказ
+        with pytest.raises(BreakerOpen):
+            await cb.call(probe)
+        gate.set()
+        assert await first == "ok"
+        assert cb.state == CLOSED
+
+        # Отмена снаружи не считается ошибкой сервиса
+        hung = asyncio.create_task(cb.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        hung.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await hung
+        assert cb.state == CLOSED
+
+        # Истёкший срок — ошибка
+        with pytest.raises(asyncio.TimeoutError):
+            await cb.call(lambda: asyncio.sleep(10), timeout=0.01)
+        assert cb.state == OPEN
+
+    asyncio.run(run())
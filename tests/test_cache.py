@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from prompts.cache import AnswerCache, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question("  Сколько  стоит ЁЛКА?! ") == "сколько стоит елка"
+
+
+def test_concurrent_misses_share_one_call():
+    cache = AnswerCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "ответ"
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        assert results == ["ответ"] * 5
+        assert await cache.get_or_compute("k", compute) == "ответ"
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_waiter_recomputes_when_leader_is_cancelled():
+    cache = AnswerCache()
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def slow():
+            gate.set()
+            await asyncio.sleep(10)
+            return "не дождались"
+
+        async def fast():
+            return "сами посчитали"
+
+        leader = asyncio.create_task(cache.get_or_compute("k", slow))
+        await gate.wait()
+        waiter = asyncio.create_task(cache.get_or_compute("k", fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await waiter == "сами посчитали"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(run())
+
+
+def test_errors_reach_waiters_and_are_not_cached():
+    cache = AnswerCache()
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("GPT недоступен")
+
+    async def run():
+        results = await asyncio.gather(
+            cache.get_or_compute("k", broken), cache.get_or_compute("k", broken), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+        async def ok():
+            return "ответ"
+
+        assert await cache.get_or_compute("k", ok) == "ответ"
+
+    asyncio.run(run())
+
+
+def test_version_change_invalidates():
+    cache = AnswerCache()
+
+    async def run():
+        async def old():
+            return "старый"
+
+        async def new():
+            return "новый"
+
+        assert await cache.get_or_compute("k", old, version="v1") == "старый"
+        assert await cache.get_or_compute("k", new, version="v1") == "старый"
+        assert await cache.get_or_compute("k", new, version="v2") == "новый"
+
+    asyncio.run(run())
+
+
+def test_answer_computed_under_old_version_is_not_stored():
+    cache = AnswerCache()
+
+    async def run():
+        async def compute():
+            # Пока шёл запрос, данные объекта обновились
+            cache._check_version("v2")
+            return "по старым данным"
+
+        assert await cache.get_or_compute("k", compute, version="v1") == "по старым данным"
+        assert cache.get("k") is None
+
+    asyncio.run(run())
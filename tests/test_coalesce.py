@@ -0,0 +1,53 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from coalesce import MessageCoalescer
+
+
+def message(user_id: int, text: str):
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id), text=text)
+
+
+def test_stop_answers_open_windows_at_once():
+    answers = []
+
+    async def reply(msg, text, context):
+        await asyncio.sleep(0.01)
+        answers.append((msg.from_user.id, text, context))
+
+    coalescer = MessageCoalescer(reply, window_ms=10_000)
+
+    async def run():
+        coalescer.submit(message(1, "Сколько стоит?"), "plot")
+        coalescer.submit(message(1, "И где это?"), "plot")
+        coalescer.submit(message(2, "Пришлите КП"))
+        started = time.monotonic()
+        await coalescer.stop()
+        assert time.monotonic() - started < 1
+        # После остановки сообщение не ждёт окна
+        coalescer.submit(message(3, "Ещё вопрос"))
+        await coalescer.stop()
+
+    asyncio.run(run())
+    assert sorted(answers) == [
+        (1, "Сколько стоит?\nИ где это?", "plot"),
+        (2, "Пришлите КП", None),
+        (3, "Ещё вопрос", None),
+    ]
+    assert coalescer.stats()["users"] == 0
+
+
+def test_stop_cancels_answers_that_run_too_long():
+    async def reply(msg, text, context):
+        await asyncio.sleep(10)
+
+    coalescer = MessageCoalescer(reply, window_ms=10_000)
+
+    async def run():
+        coalescer.submit(message(1, "Вопрос"))
+        started = time.monotonic()
+        await coalescer.stop(timeout=0.05)
+        assert time.monotonic() - started < 1
+
+    asyncio.run(run())
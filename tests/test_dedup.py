@@ -0,0 +1,33 @@
+import asyncio
+
+from dedup import UpdateDeduplicator, UpdateWindow
+
+
+def test_window_drops_repeats():
+    window = UpdateWindow(64)
+    assert window.add(1000)
+    assert not window.add(1000)
+    assert window.add(999)
+    assert not window.add(999)
+
+
+def test_window_restarts_after_backward_jump():
+    # Telegram начал нумерацию заново с меньшего значения
+    window = UpdateWindow(64)
+    assert window.add(10_000_000)
+    assert window.add(5_000)
+    assert window.add(5_001)
+    assert not window.add(5_001)
+    assert window.add(5_002)
+
+
+def test_unmark_allows_redelivery():
+    dedup = UpdateDeduplicator(64)
+
+    async def run():
+        assert not await dedup.is_duplicate(42)
+        await dedup.unmark(42)
+        assert not await dedup.is_duplicate(42)
+        assert await dedup.is_duplicate(42)
+
+    asyncio.run(run())
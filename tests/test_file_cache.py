@@ -0,0 +1,53 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import file_cache
+from file_cache import FileIdCache
+
+
+def test_put_is_flushed_in_background(tmp_path):
+    path = tmp_path / "file_ids.json"
+    cache = FileIdCache(path, flush_interval=60)
+
+    async def run():
+        cache.put("1:document:abc", "F1", Path("a.pdf"))
+        cache.put("1:photo:def", "F2", Path("b.jpg"))
+        await asyncio.sleep(0)
+        # Запись ждёт интервала, а не идёт прямо в обработчике
+        assert not path.exists()
+        await cache.stop()
+
+    asyncio.run(run())
+    assert set(json.loads(path.read_text(encoding="utf-8"))) == {"1:document:abc", "1:photo:def"}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_put_outside_loop_writes_at_once(tmp_path):
+    path = tmp_path / "file_ids.json"
+    FileIdCache(path).put("1:document:abc", "F1", Path("a.pdf"))
+    assert json.loads(path.read_text(encoding="utf-8"))["1:document:abc"]["file_id"] == "F1"
+
+
+def test_concurrent_misses_upload_once(tmp_path, monkeypatch):
+    cache = FileIdCache(tmp_path / "file_ids.json", flush_interval=60)
+    monkeypatch.setattr(file_cache, "file_cache", cache)
+    asset = SimpleNamespace(name="kp.pdf", path=Path("kp.pdf"), sha256="abc", caption=None, upload=lambda: "UPLOAD")
+    sent = []
+
+    async def answer_document(document, caption=None):
+        sent.append(document)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(document=SimpleNamespace(file_id="F1"))
+
+    msg = SimpleNamespace(bot=SimpleNamespace(id=1), answer_document=answer_document)
+
+    async def run():
+        await asyncio.gather(*(file_cache.send_document(msg, asset) for _ in range(5)))
+        await cache.stop()
+
+    asyncio.run(run())
+    # Файл загружен один раз, остальные отправили его file_id
+    assert sent == ["UPLOAD"] + ["F1"] * 4
+    assert cache.stats() == {"ids": 1, "uploading": 0, "upload_waits": 4}
@@ -0,0 +1,49 @@
+from prompts.matcher import KeywordMatcher
+
+
+def make_matcher():
+    return KeywordMatcher(
+        faq_agent={"комиссия": "агенту: 3%", "цена": "агенту: цена"},
+        faq_investor={"цена": "инвестору: цена", "цена за сотку": "инвестору: за сотку", "доходность": "12%"},
+        agent_cues=["мой клиент", "агент"],
+        investor_cues=["инвест"],
+        file_hints={"кп": "presentation", "фото": "photos", "фото участка": "photos-plot"},
+    )
+
+
+def test_persona_agent_beats_investor():
+    m = make_matcher()
+    assert m.scan("Я агент, мой клиент хочет инвестировать").persona == "agent"
+    assert m.scan("Хочу инвестировать").persona == "investor"
+    assert m.scan("Добрый день").persona == "neutral"
+
+
+def test_faq_answer_comes_from_persona_table():
+    m = make_matcher()
+    assert m.scan("Какая цена? Я агент").faq == "агенту: цена"
+    assert m.scan("Какая цена? Хочу инвестировать").faq == "инвестору: цена"
+    # Нейтральному собеседнику — ответ для инвестора, если он есть
+    assert m.scan("Какая цена?").faq == "инвестору: цена"
+    assert m.scan("А комиссия?").faq == "агенту: 3%"
+
+
+def test_earlier_faq_key_wins():
+    m = make_matcher()
+    # "цена" (из FAQ_AGENT) раньше в таблицах, чем "доходность"
+    assert m.scan("доходность и цена").faq == "инвестору: цена"
+
+
+def test_longest_key_and_its_prefixes_both_count():
+    m = make_matcher()
+    # "цена за сотку" содержит "цена": побеждает ранний ключ, а не длинный
+    assert m.scan("цена за сотку").faq == "инвестору: цена"
+    # Префикс "фото" стоит в FILE_HINTS раньше "фото участка"
+    assert m.scan("пришлите фото участка").file_hint == "photos"
+    assert m.scan("скиньте кп").file_hint == "presentation"
+
+
+def test_case_insensitive_and_empty():
+    m = make_matcher()
+    assert m.scan("ЦЕНА").faq == "инвестору: цена"
+    empty = KeywordMatcher({}, {}, [], [], {})
+    assert empty.scan("цена") == (None, "neutral", None)
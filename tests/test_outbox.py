@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import outbox as outbox_module
+from outbox import CLAIM_SECONDS, DIGEST_SEPARATOR, MESSAGE_LIMIT, Outbox, backoff, digest_chunks
+
+
+def add(box: Outbox, text: str, created: float) -> int:
+    return box.db.call(lambda c: c.execute(
+        "INSERT INTO outbox (text, created, next_at) VALUES (?, ?, ?)", (text, created, created)
+    ).lastrowid)
+
+
+def claim(box: Outbox, now: float):
+    return box.db.call(lambda c: box._claim(c, now))
+
+
+def test_claimed_rows_go_to_one_worker_until_claim_expires(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    first, second = Outbox(path), Outbox(path)
+    now = time.time()
+    add(first, "заявка 1", now)
+    add(first, "заявка 2", now)
+
+    assert [r[1] for r in claim(first, now)] == ["заявка 1", "заявка 2"]
+    assert claim(second, now + 1) == []
+    # Воркер пропал посреди отправки — записи возвращаются в очередь
+    assert len(claim(second, now + CLAIM_SECONDS + 1)) == 2
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(outbox_module.random, "uniform", lambda a, b: 1.0)
+    delays = [backoff(n) for n in range(12)]
+    assert delays[0] == outbox_module.OUTBOX_BACKOFF_BASE
+    assert delays == sorted(delays)
+    assert delays[-1] == outbox_module.OUTBOX_BACKOFF_MAX
+
+
+def test_failed_send_is_retried_later(tmp_path, monkeypatch):
+    box = Outbox(str(tmp_path / "outbox.db"))
+    add(box, "заявка", time.time())
+    sent = []
+
+    async def broken(text):
+        raise ConnectionError("Telegram недоступен")
+
+    async def ok(text):
+        sent.append(text)
+
+    async def run():
+        monkeypatch.setattr(box, "_send", broken)
+        assert await box.deliver_due() == 0
+        # Следующая попытка — только после задержки
+        assert await box.deliver_due() == 0
+        box.db.call(lambda c: c.execute("UPDATE outbox SET next_at = 0"))
+        monkeypatch.setattr(box, "_send", ok)
+        assert await box.deliver_due() == 1
+
+    asyncio.run(run())
+    assert sent == ["заявка"]
+    attempts, error, delivered = box.db.call(lambda c: c.execute(
+        "SELECT attempts, error, sent FROM outbox"
+    ).fetchone())
+    assert attempts == 1 and error is None and delivered
+    assert box.stats()["failures"] == 1
+
+
+def test_digest_waits_for_oldest_lead_then_sends_one_message(tmp_path, monkeypatch):
+    box = Outbox(str(tmp_path / "outbox.db"), digest_seconds=60)
+    now = time.time()
+    add(box, "заявка 1", now - 10)
+    add(box, "заявка 2", now)
+    assert claim(box, now) == []
+
+    box.db.call(lambda c: c.execute("UPDATE outbox SET created = created - 60"))
+    sent = []
+
+    async def capture(text):
+        sent.append(text)
+
+    monkeypatch.setattr(box, "_send", capture)
+    assert asyncio.run(box.deliver_due()) == 2
+    assert sent == [f"📦 Заявок: 2{DIGEST_SEPARATOR}заявка 1{DIGEST_SEPARATOR}заявка 2"]
+
+
+def test_digest_chunks_respect_message_limit():
+    rows = [(i, "x" * 1500, 0, 0.0) for i in range(5)]
+    chunks = digest_chunks(rows)
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    for chunk in chunks:
+        assert sum(len(r[1]) + len(DIGEST_SEPARATOR) for r in chunk) <= MESSAGE_LIMIT
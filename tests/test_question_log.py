@@ -0,0 +1,23 @@
+import json
+
+import question_log
+from question_log import QuestionLog
+
+
+def test_rotation_lost_to_another_worker_keeps_batch(tmp_path, monkeypatch):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"old": true}\n', encoding="utf-8")
+    log = QuestionLog(path, max_bytes=10, rotate_seconds=0)
+    replace = question_log.os.replace
+
+    def rotated_elsewhere(src, dst):
+        # Пока мы решали, ротировать ли, другой воркер уже переименовал файл
+        replace(src, tmp_path / "questions-other.jsonl")
+        replace(src, dst)
+
+    monkeypatch.setattr(question_log.os, "replace", rotated_elsewhere)
+    log._write([{"question": "Сколько стоит?"}])
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [{"question": "Сколько стоит?"}]
+    assert log.written == 1
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from quota import GLOBAL, USER, MemoryBuckets, Quota, QuotaExceeded, SQLiteBuckets, apply, refill
+from storage import SQLiteDB
+
+
+def test_refill_is_capped():
+    assert refill(None, 1.0, 5.0, 100.0) == 5.0
+    assert refill((1.0, 100.0), 1.0, 5.0, 102.0) == 3.0
+    assert refill((1.0, 100.0), 1.0, 5.0, 200.0) == 5.0
+
+
+def test_apply_takes_from_all_buckets_or_none():
+    limits = {"a": (1.0, 5.0), "b": (1.0, 5.0)}
+    state = {"a": (5.0, 100.0), "b": (0.5, 100.0)}
+    failed, changed = apply(state, limits, {"a": 1.0, "b": 1.0}, {"a": 1.0, "b": 1.0}, 100.0)
+    assert failed == "b" and changed == {}
+
+    failed, changed = apply(state, limits, {"a": 1.0, "b": 1.0}, {"a": 1.0, "b": 1.0}, 101.0)
+    assert failed is None
+    assert changed == {"a": (4.0, 101.0), "b": (0.5, 101.0)}
+
+
+def test_apply_lets_oversized_request_through_a_full_bucket():
+    # Запрос больше ёмкости проходит, когда ведро полное, и уводит его в минус
+    failed, changed = apply({}, {"t": (1.0, 10.0)}, {"t": 30.0}, {"t": 30.0}, 0.0)
+    assert failed is None and changed["t"][0] == -20.0
+
+
+def memory_quota(**limits) -> Quota:
+    quota = Quota(**limits)
+    quota.shared = None
+    return quota
+
+
+def test_acquire_limits_user_then_global():
+    quota = memory_quota(user_rpm=1, user_burst=2, user_tpm=0, global_rpm=3, global_tpm=0)
+
+    async def run():
+        await quota.acquire(1, 100)
+        await quota.acquire(1, 100)
+        with pytest.raises(QuotaExceeded) as e:
+            await quota.acquire(1, 100)
+        assert e.value.scope == USER
+        await quota.acquire(2, 100)
+        with pytest.raises(QuotaExceeded) as e:
+            await quota.acquire(3, 100)
+        assert e.value.scope == GLOBAL
+
+    asyncio.run(run())
+    assert quota.stats()["allowed"] == 3
+    assert quota.limited == {USER: 1, GLOBAL: 1}
+
+
+def test_spend_charges_actual_tokens():
+    quota = memory_quota(user_rpm=0, user_tpm=60, user_token_burst=1000, global_rpm=0, global_tpm=0)
+
+    async def run():
+        await quota.acquire(1, 500)
+        # Ответ вышел длиннее оценки — долг погашается, прежде чем пустят снова
+        await quota.spend(1, 1500)
+        with pytest.raises(QuotaExceeded):
+            await quota.acquire(1, 10)
+        # Пользователь без id не ограничивается пользовательскими вёдрами
+        await quota.acquire(None, 10)
+
+    asyncio.run(run())
+
+
+def test_sqlite_buckets_match_memory(tmp_path):
+    limits = {"k": (0.001, 2.0)}
+    memory, sqlite = MemoryBuckets(), SQLiteBuckets(SQLiteDB(tmp_path / "quota.db"))
+
+    async def run(buckets):
+        return [await buckets.update(limits, {"k": 1.0}, {"k": 1.0}) for _ in range(3)]
+
+    assert asyncio.run(run(memory)) == asyncio.run(run(sqlite)) == [None, None, "k"]
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from ratelimit import OutboundLimiter
+
+
+def test_album_charges_private_chat_once_and_global_per_item():
+    limiter = OutboundLimiter(global_rate=25, chat_rate=1, chat_burst=3)
+
+    async def run():
+        await limiter.acquire(42, cost=10)
+        # Второй альбом подряд не ждёт: для пользователя это одно сообщение
+        await limiter.acquire(42, cost=10)
+
+    asyncio.run(run())
+    assert limiter.waited == 0
+    assert limiter._chats[42].tokens == pytest.approx(1, abs=0.1)
+    assert limiter._global.tokens == pytest.approx(5, abs=0.5)
+
+
+def test_album_charges_group_bucket_per_item():
+    limiter = OutboundLimiter(global_rate=25, chat_rate=1, chat_burst=3, group_rate=1, group_burst=5)
+
+    async def run():
+        await limiter.acquire(-100, cost=4)
+
+    asyncio.run(run())
+    assert limiter._chats[-100].tokens == pytest.approx(2, abs=0.1)
+    assert limiter._groups[-100].tokens == pytest.approx(1, abs=0.1)
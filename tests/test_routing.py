@@ -0,0 +1,26 @@
+from prompts import routing
+from prompts.routing import ModelRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_sidelined_tier_recovers(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(routing.time, "monotonic", clock)
+    router = ModelRouter()
+    fast = router.tiers["fast"]
+    # Всплеск: fast отвечает дольше своего max_p95, strong в норме
+    for _ in range(50):
+        router.stats_by_tier["fast"].observe(fast.max_p95 * 2)
+    router.stats_by_tier["strong"].observe(1.0)
+    assert router.choose("Сколько стоит?", "neutral").name == "strong"
+
+    # Трафика у fast больше нет, но всплеск устаревает — fast снова основной
+    clock.now += routing.LATENCY_MAX_AGE + routing.P95_CACHE_SECONDS + 1
+    assert router.choose("Сколько стоит?", "neutral").name == "fast"
@@ -0,0 +1,39 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from storage import SQLiteDB, SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+
+def test_expired_row_does_not_leak_into_new_form(tmp_path):
+    storage = SQLiteStorage(SQLiteDB(tmp_path / "fsm.db"), ttl=60)
+
+    async def run():
+        await storage.set_state(KEY, "Form:phone")
+        await storage.set_data(KEY, {"name": "Иван"})
+        # Запись просрочена, но очистка её ещё не удалила
+        await storage.db.run(lambda c: c.execute("UPDATE fsm SET expires = 0"))
+        await storage.set_state(KEY, "Form:name")
+        assert await storage.get_data(KEY) == {}
+
+        await storage.db.run(lambda c: c.execute("UPDATE fsm SET expires = 0"))
+        await storage.update_data(KEY, {"phone": "+7"})
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {"phone": "+7"}
+
+    asyncio.run(run())
+
+
+def test_live_row_keeps_data_between_steps(tmp_path):
+    storage = SQLiteStorage(SQLiteDB(tmp_path / "fsm.db"), ttl=60)
+
+    async def run():
+        await storage.set_data(KEY, {"name": "Иван"})
+        await storage.set_state(KEY, "Form:phone")
+        await storage.update_data(KEY, {"phone": "+7"})
+        assert await storage.get_state(KEY) == "Form:phone"
+        assert await storage.get_data(KEY) == {"name": "Иван", "phone": "+7"}
+
+    asyncio.run(run())
@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import streaming
+from streaming import PLACEHOLDER, stream_reply
+
+
+class Chat:
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(id=1)
+
+    async def answer(self, text, parse_mode=None):
+        self.calls.append(("answer", text))
+        return SimpleNamespace(edit_text=self.edit_text, delete=self.delete)
+
+    async def edit_text(self, text, parse_mode=None):
+        self.calls.append(("edit", text))
+
+    async def delete(self):
+        self.calls.append(("delete", None))
+
+
+def test_ready_answer_is_sent_as_one_message():
+    chat = Chat()
+
+    async def faq():
+        yield "Цена — 2 млн"
+
+    asyncio.run(stream_reply(chat, faq(), suffix="\n📞"))
+    assert chat.calls == [("answer", "Цена — 2 млн\n📞")]
+
+
+def test_slow_answer_streams_into_placeholder(monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_EDIT_INTERVAL", 0)
+    chat = Chat()
+
+    async def gpt():
+        await asyncio.sleep(0.1)
+        yield "Участок "
+        await asyncio.sleep(0.01)
+        yield "у реки"
+
+    asyncio.run(stream_reply(chat, gpt(), suffix="\n📞"))
+    assert chat.calls[0] == ("answer", PLACEHOLDER)
+    assert chat.calls[-1] == ("edit", "Участок у реки\n📞")
+
+
+def test_errors_from_answer_reach_caller():
+    chat = Chat()
+
+    async def broken():
+        raise RuntimeError("GPT упал")
+        yield
+
+    with pytest.raises(RuntimeError, match="GPT упал"):
+        asyncio.run(stream_reply(chat, broken()))
+    assert chat.calls == []
+
+
+def test_cancel_removes_placeholder():
+    chat = Chat()
+
+    async def hang():
+        await asyncio.sleep(10)
+        yield "никогда"
+
+    async def run():
+        task = asyncio.create_task(stream_reply(chat, hang()))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert chat.calls == [("answer", PLACEHOLDER), ("delete", None)]
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+from aiogram import types
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import webhook
+from dedup import UpdateDeduplicator
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", None)
+    monkeypatch.setattr(webhook, "dedup", UpdateDeduplicator(64))
+    monkeypatch.setattr(webhook, "parse_update", lambda body: types.Update(update_id=int(body)))
+    app = FastAPI()
+    app.include_router(webhook.api_router)
+    return TestClient(app)
+
+
+def post(client, update_id: int):
+    return client.post(webhook.WEBHOOK_PATH, content=str(update_id))
+
+
+def test_failed_handler_keeps_mark(client, monkeypatch):
+    async def broken(update):
+        raise RuntimeError("обработчик упал")
+
+    monkeypatch.setattr(webhook, "WEBHOOK_MODE", "inline")
+    monkeypatch.setattr(webhook, "feed", broken)
+    # Обработчик уже мог отправить заявку или ответ — повтор не нужен
+    assert post(client, 1).status_code == 200
+    assert post(client, 1).json() == {"ok": True, "duplicate": True}
+
+
+def test_failure_before_dispatch_asks_for_redelivery(client, monkeypatch):
+    async def submit(update):
+        raise OSError("очередь недоступна")
+
+    monkeypatch.setattr(webhook, "WEBHOOK_MODE", "queue")
+    monkeypatch.setattr(webhook, "pool", SimpleNamespace(running=True, submit=submit))
+    assert post(client, 2).status_code == 500
+    # Повторная доставка снова идёт в обработку, а не отсеивается как дубль
+    assert post(client, 2).status_code == 500
+
+
+def test_unparsable_body_is_acknowledged(client, monkeypatch):
+    def broken(body):
+        raise ValueError("не JSON")
+
+    monkeypatch.setattr(webhook, "parse_update", broken)
+    response = client.post(webhook.WEBHOOK_PATH, content=b"{")
+    assert response.status_code == 200 and response.json()["ok"] is False
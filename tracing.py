@@ -0,0 +1,301 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from loguru import logger
+
+import metrics
+
+# === Трассировка обновлений ===
+# Каждое обновление — дерево этапов (span) с общим trace id: разбор JSON, дедупликация,
+# ожидание в очереди, feed_update, обработчик, SQLite, ограничитель, запросы к Telegram
+# и OpenAI. Текущий этап лежит в contextvar, поэтому вложенность получается сама,
+# а в пул обработчиков контекст уезжает вместе с обновлением.
+# Время этапов всех обновлений идёт в гистограмму bot_span_seconds; дерево целиком
+# сохраняется в кольцевой буфер, только если обновление медленнее TRACE_SLOW_MS или упало.
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))  # 0 — трассировка выключена
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))
+# Потолок этапов на одно обновление (потоковый ответ — это десятки правок сообщения)
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "300"))
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+def _describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+
+class Span:
+    __slots__ = ("name", "trace", "start", "end", "attrs", "children", "error")
+
+    def __init__(self, name: str, trace: "Trace", attrs: Dict[str, Any], start: Optional[float] = None):
+        self.name = name
+        self.trace = trace
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.children: List[Span] = []
+        self.error: Optional[str] = None
+
+    @property
+    def seconds(self) -> float:
+        return (time.perf_counter() if self.end is None else self.end) - self.start
+
+    def child(self, name: str, attrs: Dict[str, Any], start: Optional[float] = None) -> Optional["Span"]:
+        trace = self.trace
+        if trace.spans >= TRACE_MAX_SPANS:
+            trace.dropped += 1
+            return None
+        trace.spans += 1
+        span = Span(name, trace, attrs, start)
+        self.children.append(span)
+        return span
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        if error is not None and self.error is None:
+            self.error = _describe(error)
+        metrics.SPAN_SECONDS.observe(self.end - self.start, self.name)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "name": self.name,
+            "at_ms": round((self.start - origin) * 1000, 1),
+            "ms": round(self.seconds * 1000, 1),
+        }
+        if self.end is None:
+            # Например, ответ из фоновой задачи, начатой этим обновлением
+            result["running"] = True
+        if self.attrs:
+            result["attrs"] = self.attrs
+        if self.error:
+            result["error"] = self.error
+        if self.children:
+            result["children"] = [c.to_dict(origin) for c in self.children]
+        return result
+
+
+class Trace:
+    __slots__ = ("id", "root", "wall", "spans", "dropped", "queued")
+
+    def __init__(self, name: str, trace_id: Optional[str], attrs: Dict[str, Any]):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.wall = time.time()
+        self.spans = 1
+        self.dropped = 0
+        # Время постановки в очередь пула, если обработку доделывает воркер
+        self.queued: Optional[float] = None
+        self.root = Span(name, self, attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            "trace_id": self.id,
+            "name": root.name,
+            "at": datetime.fromtimestamp(self.wall, timezone.utc).isoformat(timespec="milliseconds"),
+            "ms": round(root.seconds * 1000, 1),
+            "error": root.error,
+            "attrs": root.attrs,
+            "dropped_spans": self.dropped,
+            "spans": [c.to_dict(root.start) for c in root.children],
+        }
+
+
+def render(trace: Trace) -> str:
+    # Дерево этапов текстом: начало от старта обновления, длительность, атрибуты
+    root = trace.root
+    attrs = " ".join(f"{k}={v}" for k, v in root.attrs.items())
+    error = f" ❌ {root.error}" if root.error else ""
+    lines = [f"{root.name} {trace.id} {root.seconds * 1000:.1f} мс{error} {attrs}".rstrip()]
+
+    def walk(span: Span, depth: int) -> None:
+        at = (span.start - root.start) * 1000
+        attrs = " ".join(f"{k}={v}" for k, v in span.attrs.items())
+        mark = " …" if span.end is None else ""
+        error = f" ❌ {span.error}" if span.error else ""
+        lines.append(f"{'  ' * depth}{span.name:<{max(1, 34 - 2 * depth)}} "
+                     f"+{at:8.1f} {span.seconds * 1000:9.1f} мс{mark}{error} {attrs}".rstrip())
+        for child in span.children:
+            walk(child, depth + 1)
+
+    for child in root.children:
+        walk(child, 1)
+    if trace.dropped:
+        lines.append(f"  … ещё {trace.dropped} этапов не записано (TRACE_MAX_SPANS)")
+    return "\n".join(lines)
+
+
+class Tracer:
+    def __init__(self, slow_ms: float = TRACE_SLOW_MS, size: int = TRACE_BUFFER):
+        self.enabled = slow_ms > 0
+        self.slow = slow_ms / 1000
+        self._slow: Deque[Trace] = deque(maxlen=size)
+        self.started = 0
+        self.captured = 0
+        self.dropped_spans = 0
+
+    def start(self, name: str, trace_id: Optional[str] = None, **attrs: Any) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        self.started += 1
+        return Trace(name, trace_id, attrs)
+
+    def finish(self, trace: Optional[Trace], error: Optional[BaseException] = None) -> None:
+        if trace is None or trace.root.end is not None:
+            return
+        root = trace.root
+        if isinstance(error, asyncio.CancelledError):
+            # Отмена — штатный путь (например, ответ вытеснен новым сообщением), не ошибка
+            root.attrs["cancelled"] = True
+            error = None
+        root.close(error)
+        self.dropped_spans += trace.dropped
+        if root.seconds < self.slow and root.error is None:
+            return
+        self._slow.append(trace)
+        self.captured += 1
+        stages = sorted(root.children, key=lambda s: s.seconds, reverse=True)[:3]
+        top = ", ".join(f"{s.name} {s.seconds * 1000:.0f}" for s in stages)
+        logger.debug(f"🐢 {root.name} {trace.id}: {root.seconds * 1000:.0f} мс ({top}){' — ' + root.error if root.error else ''}")
+
+    def recent(self, limit: int = 20, min_ms: float = 0) -> List[Trace]:
+        result = []
+        for trace in reversed(self._slow):
+            if len(result) >= limit:
+                break
+            if trace.root.seconds * 1000 >= min_ms:
+                result.append(trace)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": int(self.enabled),
+            "started": self.started,
+            "captured": self.captured,
+            "buffered": len(self._slow),
+            "dropped_spans": self.dropped_spans,
+        }
+
+
+tracer = Tracer()
+
+
+# === API для кода приложения ===
+# Без активной трассировки все функции ничего не делают
+def current_trace() -> Optional[Trace]:
+    span = _current.get()
+    return span.trace if span is not None else None
+
+
+def trace_id() -> Optional[str]:
+    trace = current_trace()
+    return trace.id if trace is not None else None
+
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None, **attrs: Any) -> Iterator[Optional[Trace]]:
+    # Новая трассировка; завершается на выходе, если её не передали воркеру через hand_off()
+    current = tracer.start(name, trace_id, **attrs)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current.root)
+    try:
+        yield current
+    except BaseException as e:
+        tracer.finish(current, e)
+        raise
+    else:
+        if current.queued is None:
+            tracer.finish(current)
+    finally:
+        _current.reset(token)
+
+
+def hand_off(current: Optional[Trace]) -> None:
+    # Обновление ушло в очередь: трассировку завершит воркер в resume()
+    if current is not None:
+        current.queued = time.perf_counter()
+
+
+@contextmanager
+def resume() -> Iterator[Optional[Trace]]:
+    # В воркере пула: контекст скопирован при постановке в очередь, текущий этап — корень
+    current = current_trace()
+    if current is None or current.queued is None:
+        yield current
+        return
+    waited = current.root.child("queue", {}, start=current.queued)
+    if waited is not None:
+        waited.close()
+    # Контекст скопирован внутри этапа submit — обработка идёт от корня
+    token = _current.set(current.root)
+    try:
+        yield current
+    except BaseException as e:
+        tracer.finish(current, e)
+        raise
+    else:
+        tracer.finish(current)
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    parent = _current.get()
+    child = parent.child(name, attrs) if parent is not None else None
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.close(e)
+        raise
+    else:
+        child.close()
+    finally:
+        _current.reset(token)
+
+
+def annotate(**attrs: Any) -> None:
+    span = _current.get()
+    if span is not None:
+        span.attrs.update(attrs)
+
+
+def fail(error: BaseException) -> None:
+    # Ошибка, которую перехватили и не пробросили, — трассировка всё равно попадёт в буфер
+    span = _current.get()
+    if span is not None and span.trace.root.error is None:
+        span.trace.root.error = _describe(error)
+
+
+# === Middleware ===
+class HandlerSpans(BaseMiddleware):
+    # Как HandlerMetrics — inner-middleware на router.message
+    async def __call__(self, handler, event, data):
+        callback = data.get("handler")
+        name = getattr(getattr(callback, "callback", None), "__name__", "unknown")
+        with span(f"handler.{name}"):
+            return await handler(event, data)
+
+
+class TelegramSpans(BaseRequestMiddleware):
+    # Регистрируется последним, то есть внутри ограничителя: сам HTTP-запрос,
+    # ожидание токенов видно отдельным этапом ratelimit
+    async def __call__(self, make_request, bot, method):
+        with span(f"telegram.{type(method).__name__}"):
+            return await make_request(bot, method)
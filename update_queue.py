@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from aiogram import types
+from loguru import logger
+
+
+class QueueFull(Exception):
+    pass
+
+
+def chat_key(update: types.Update) -> Any:
+    # Обновления одного чата обрабатываются строго по порядку
+    event = update.event
+    chat = getattr(event, "chat", None)
+    if chat is None and getattr(event, "message", None) is not None:
+        chat = event.message.chat
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return f"user:{user.id}"
+    return f"update:{update.update_id}"
+
+
+# === Пул обработчиков обновлений ===
+# Каждый чат — своя очередь; в общую очередь _ready кладётся ключ чата, у которого
+# есть необработанные обновления и который сейчас никем не обрабатывается.
+# Так разные чаты идут параллельно, а один чат — последовательно.
+# Вместе с обновлением в очередь кладётся контекст (contextvars) того, кто его поставил:
+# обработка в воркере продолжает его трассировку.
+class UpdatePool:
+    def __init__(
+        self,
+        process: Callable[[types.Update], Awaitable[Any]],
+        workers: int = 8,
+        maxsize: int = 1000,
+        put_timeout: float = 2.0,
+    ):
+        self._process = process
+        self.workers = workers
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self._pending: Dict[Any, Deque[Tuple[types.Update, contextvars.Context]]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(maxsize)
+        self._depth = 0
+        self._in_flight = 0
+        self._rejected = 0
+        self._processed = 0
+        self._tasks: List[asyncio.Task] = []
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"update-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"⚙️ Пул обработки обновлений запущен: {self.workers} воркеров, очередь {self.maxsize}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Остановка пула: не обработано {self._depth} обновлений")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, update: types.Update) -> None:
+        # Backpressure: ждём свободного места не дольше put_timeout,
+        # потом отказываем — Telegram повторит доставку позже
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.put_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise QueueFull(f"очередь заполнена ({self.maxsize})")
+
+        key = chat_key(update)
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((update, contextvars.copy_context()))
+        self._depth += 1
+        self._idle.clear()
+
+        if self._depth == self.maxsize // 2:
+            logger.warning(f"⚠️ Очередь обновлений заполнена наполовину: {self._depth}/{self.maxsize}")
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._pending[key]
+            update, context = queue.popleft()
+            self._in_flight += 1
+            try:
+                await asyncio.create_task(self._process(update), context=context)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self._in_flight -= 1
+                self._depth -= 1
+                self._processed += 1
+                self._slots.release()
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                if self._depth == 0:
+                    self._idle.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self._depth,
+            "capacity": self.maxsize,
+            "in_flight": self._in_flight,
+            "chats": len(self._pending),
+            "workers": self.workers,
+            "processed": self._processed,
+            "rejected": self._rejected,
+        }
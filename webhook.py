@@ -1,53 +1,166 @@
+import hmac
 import os
-from aiogram import Bot, Dispatcher, types
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
-from fastapi import APIRouter, Request
+import random
+import time
+from aiogram import Dispatcher, types
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
 from loguru import logger
 
 from handler import router as main_router
 from form import router as form_router
+from update_queue import UpdatePool, QueueFull
+import clients
+from clients import get_bot
+from storage import build_storage
+from dedup import UpdateDeduplicator
+import metrics
+from prompts.core import breaker
+from prompts.cache import fingerprint
+from lease import Lease
+import tracing
 
 # === Переменные окружения ===
 WEBHOOK_PATH = "/webhook/agent"
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
-TOKEN = os.getenv("AGENT_BOT_TOKEN")
+# queue — ответ Telegram сразу, обработка в пуле воркеров; inline — обработка внутри запроса
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "queue")
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (передаётся в set_webhook)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Доля обновлений, которые пишутся в лог на уровне INFO (остальные — только DEBUG)
+LOG_UPDATE_SAMPLE = float(os.getenv("LOG_UPDATE_SAMPLE", "0.01"))
 
-if not TOKEN:
-    raise EnvironmentError("❌ Переменная окружения AGENT_BOT_TOKEN не найдена")
-if not WEBHOOK_URL:
-    raise EnvironmentError("❌ Переменная WEBHOOK_URL не задана")
-
-# === Инициализация бота ===
-bot = Bot(
-    token=TOKEN,
-    default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
-)
-dp = Dispatcher(storage=MemoryStorage())
+# === Инициализация диспетчера (Bot — общий, из clients) ===
+dp = Dispatcher(storage=build_storage())
 dp.include_router(main_router)
 dp.include_router(form_router)
 
+async def feed(update: types.Update):
+    started = time.monotonic()
+    try:
+        with tracing.span("feed"):
+            return await dp.feed_update(get_bot(), update)
+    finally:
+        metrics.FEED_UPDATE_SECONDS.observe(time.monotonic() - started)
+
+async def feed_queued(update: types.Update):
+    # Трассировка приехала из webhook вместе с обновлением и завершается здесь
+    with tracing.resume():
+        return await feed(update)
+
+dedup = UpdateDeduplicator()
+pool = UpdatePool(
+    feed_queued,
+    workers=UPDATE_WORKERS,
+    maxsize=UPDATE_QUEUE_SIZE,
+)
+
 # === FastAPI роутер ===
 api_router = APIRouter()
 
+OK_BODY = b'{"ok":true}'
+DUPLICATE_BODY = b'{"ok":true,"duplicate":true}'
+
+def parse_update(body: bytes) -> types.Update:
+    # Один проход: байты сразу в модель, уже привязанную к боту,
+    # чтобы feed_update не пересобирал Update через model_dump
+    return types.Update.model_validate_json(body, context={"bot": get_bot()})
+
+def describe_update(update: types.Update) -> str:
+    message = update.message
+    return f"{update.update_id}: {message.text if message and message.text else 'нет текста'}"
+
+def secret_ok(request: Request) -> bool:
+    if not WEBHOOK_SECRET:
+        return True
+    received = request.headers.get("x-telegram-bot-api-secret-token", "")
+    return hmac.compare_digest(received.encode(), WEBHOOK_SECRET.encode())
+
 @api_router.post(WEBHOOK_PATH)
 async def telegram_webhook(request: Request):
-    try:
-        payload = await request.json()
-        update = types.Update.model_validate(payload)
-        logger.info(f"📩 Обновление от Telegram: {payload.get('message', {}).get('text', 'нет текста')}")
-        await dp.feed_update(bot, update)
-        return {"ok": True}
-    except Exception as e:
-        logger.error(f"❌ Ошибка в webhook обработке: {e}")
-        return {"ok": False, "error": str(e)}
+    # Чужой трафик отсекается до чтения и разбора тела
+    if not secret_ok(request):
+        metrics.WEBHOOK_ERRORS.inc("secret")
+        return Response(status_code=401)
+    with tracing.trace("update") as trace:
+        update = marked = None
+        dispatched = False
+        try:
+            with tracing.span("parse"):
+                update = parse_update(await request.body())
+            tracing.annotate(update_id=update.update_id)
+            if LOG_UPDATE_SAMPLE and random.random() < LOG_UPDATE_SAMPLE:
+                logger.info("📩 Обновление от Telegram {}", describe_update(update))
+            else:
+                logger.opt(lazy=True).debug("📩 Обновление от Telegram {}", lambda: describe_update(update))
+            with tracing.span("dedup"):
+                duplicate = await dedup.is_duplicate(update.update_id)
+            if duplicate:
+                tracing.annotate(duplicate=True)
+                return Response(DUPLICATE_BODY, media_type="application/json")
+            marked = update.update_id
+            if WEBHOOK_MODE == "queue" and pool.running:
+                with tracing.span("submit"):
+                    await pool.submit(update)
+                # Между постановкой в очередь и этой строкой нет await: воркер ещё не начал
+                tracing.hand_off(trace)
+            else:
+                dispatched = True
+                await feed(update)
+            return Response(OK_BODY, media_type="application/json")
+        except QueueFull as e:
+            tracing.fail(e)
+            # Telegram повторит доставку после 503 — повтор не должен отсеяться как дубль
+            await dedup.unmark(marked)
+            metrics.WEBHOOK_ERRORS.inc("queue_full")
+            logger.warning(f"⚠️ Обновление отклонено: {e}")
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=503)
+        except Exception as e:
+            tracing.fail(e)
+            metrics.WEBHOOK_ERRORS.inc("error")
+            logger.error(f"❌ Ошибка в webhook обработке ({tracing.trace_id()}): {e}")
+            if update is not None and not dispatched:
+                # Сбой до обработки (дедупликация, постановка в очередь) — 500 и снятая
+                # отметка: Telegram доставит обновление снова
+                if marked is not None:
+                    await dedup.unmark(marked)
+                return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+            # Упал обработчик — отметка остаётся и Telegram получает 200: заявка, ответы
+            # и запросы к GPT уже могли уйти, повтор задублировал бы их. Тело, которое
+            # не разобралось, повтор тоже не исправит
+            return {"ok": False, "error": str(e)}
+
+@api_router.get("/webhook/queue")
+async def queue_stats():
+    outbound = clients.limiter.stats() if clients.limiter else {}
+    return {"mode": WEBHOOK_MODE, **pool.stats(), **dedup.stats(), "outbound": outbound, "openai": breaker.state}
 
-@dp.startup()
-async def on_startup():
+# === Регистрация webhook ===
+# Один воркер (кто взял аренду) сверяет webhook с настройками и вызывает set_webhook,
+# только если изменились URL или секрет. Накопившиеся обновления не сбрасываются:
+# пока воркеры перезапускаются, Telegram держит их у себя и доставит после.
+async def register_webhook() -> None:
+    if not WEBHOOK_URL:
+        logger.error("❌ Переменная WEBHOOK_URL не задана — webhook не регистрируем")
+        return
+    url = WEBHOOK_URL + WEBHOOK_PATH
+    wanted = fingerprint(url, WEBHOOK_SECRET or "")
+    lease = Lease("webhook")
     try:
-        webhook_url = WEBHOOK_URL + WEBHOOK_PATH
-        await bot.set_webhook(url=webhook_url, drop_pending_updates=True)
-        logger.info(f"✅ Webhook установлен: {webhook_url}")
+        if not await lease.acquire():
+            logger.info("⏭ Webhook регистрирует другой воркер")
+            return
+        bot = get_bot()
+        info = await bot.get_webhook_info()
+        if info.url == url and await lease.get_value() == wanted:
+            logger.info(f"✅ Webhook уже установлен: {url}")
+            return
+        await bot.set_webhook(url=url, secret_token=WEBHOOK_SECRET)
+        await lease.set_value(wanted)
+        logger.info(f"✅ Webhook установлен: {url}")
     except Exception as e:
         logger.error(f"❌ Не удалось установить webhook: {e}")
+    finally:
+        await lease.release()